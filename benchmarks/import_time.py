@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""Measure start up time of the package and the CLI, and which heavy dependencies
+they import.
+
+Each case runs in a fresh interpreter, the time of an empty one is subtracted. A case
+that imports a dependency it should not, e.g. selenium for `--help` or a cache hit,
+fails the run. Save a run with --output and compare a later one to it with --compare,
+like benchmarks/suite.py.
+
+usage: python benchmarks/import_time.py [--runs N] [--output FILE] [--compare FILE]
+                                        [--tolerance FRACTION]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from mock_site import FIXTURES
+from suite import compare, summary
+from vehicle_history_reports.cache import ReportCache
+
+SCRIPT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "scripts",
+    "vin_scrapper.py",
+)
+
+HEAVY = ("bs4", "loguru", "lxml", "orjson", "psutil", "requests", "selenium")
+
+# Runs a script or `-c` code, then reports the heavy modules it imported.
+PROBE = f"""
+import atexit, json, runpy, sys
+atexit.register(lambda: sys.stderr.write(
+    "\\nIMPORTED " + json.dumps([m for m in {HEAVY!r} if m in sys.modules]) + "\\n"
+))
+sys.argv = sys.argv[1:]
+if sys.argv[0] == "-c":
+    exec(sys.argv[1])
+else:
+    runpy.run_path(sys.argv[0], run_name="__main__")
+"""
+
+
+def cases(cache_file):
+    """Name, command line and dependencies allowed of each case"""
+    vin_number = "JN8AZ2NC3G9400704"
+    result_page = os.path.join(FIXTURES, "result.html")
+    return [
+        ("python", ["-c", "pass"], ()),
+        ("import vehicle_history_reports", ["-c", "import vehicle_history_reports"], ()),
+        (
+            "import VehicleHistoryReports",
+            [
+                "-c",
+                "from vehicle_history_reports.vehicle_history_reports import "
+                "VehicleHistoryReports",
+            ],
+            (),
+        ),
+        (
+            "import server",
+            ["-c", "import vehicle_history_reports.server"],
+            (),
+        ),
+        ("vin_scrapper.py --help", [SCRIPT, "--help"], ()),
+        (
+            "vin_scrapper.py cache hit",
+            [SCRIPT, "--vin-numbers", vin_number, "--cache", "--cache-file", cache_file],
+            (),
+        ),
+        (
+            "ReportParser.parse",
+            [
+                "-c",
+                "from vehicle_history_reports import ReportParser\n"
+                f"ReportParser.parse(open({result_page!r}).read())",
+            ],
+            ("bs4", "loguru", "lxml"),
+        ),
+    ]
+
+
+def run(argv):
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-c", PROBE] + argv,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    elapsed = time.perf_counter() - start
+    imported = [
+        line.split(" ", 1)[1]
+        for line in process.stderr.splitlines()
+        if line.startswith("IMPORTED ")
+    ]
+    if process.returncode or not imported:
+        raise SystemExit(f"{' '.join(argv)} failed:\n{process.stderr}")
+    return elapsed, json.loads(imported[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", default=10, type=int, help="Runs per case.")
+    parser.add_argument("--output", "-o", help="Save the results as JSON here.")
+    parser.add_argument("--compare", help="Results of an earlier run to compare to.")
+    parser.add_argument(
+        "--tolerance",
+        default=0.2,
+        type=float,
+        help="Slow down counted as a regression, default [0.2].",
+    )
+    args = parser.parse_args()
+
+    report = {}
+    unwanted = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_file = os.path.join(tmp_dir, "reports.sqlite")
+        with open(os.path.join(FIXTURES, "result.json")) as data_file, ReportCache(
+            cache_file
+        ) as cache:
+            cache.set("JN8AZ2NC3G9400704", json.load(data_file))
+
+        interpreter = None
+        for name, argv, allowed in cases(cache_file):
+            runs = [run(argv) for _ in range(args.runs)]
+            seconds = [elapsed for elapsed, _ in runs]
+            imported = runs[-1][1]
+            if interpreter is None:
+                interpreter = statistics.median(seconds)
+            report[name] = {
+                "seconds": summary(seconds),
+                "startup_seconds": {
+                    "median": max(0.0, statistics.median(seconds) - interpreter)
+                },
+                "imported": imported,
+            }
+            extra = sorted(set(imported) - set(allowed))
+            if extra:
+                unwanted.append(name)
+            print(
+                f"{name:>32}: {report[name]['startup_seconds']['median'] * 1000:8.1f}ms"
+                f"  imports {', '.join(imported) or '-'}"
+                + (f"  UNWANTED {', '.join(extra)}" if extra else "")
+            )
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=4, sort_keys=True)
+    regressions = []
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(report, json.load(baseline_file), args.tolerance)
+    if unwanted or regressions:
+        print(
+            f"{len(unwanted)} cases with unwanted imports, {len(regressions)} regressions"
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
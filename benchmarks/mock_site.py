@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""Local stand-in for the VIN decoder site, serving recorded pages from fixtures/.
+
+The decoder page is `search.html`, searching for a VIN (`?vin=<VIN>`, or a form
+POST) serves `<VIN>.html` if there is one and else `result.html`. VINs starting with
+"0", which no manufacturer is assigned, get `not_found.html`.
+
+To stand in for a site that pushes back, --capacity answers searches beyond that many
+a second with "429 Too Many Requests", and --failure-rate fails that share of them
+with "503 Service Unavailable".
+
+usage: python benchmarks/mock_site.py [--port PORT] [--delay SECONDS]
+                                      [--capacity N] [--failure-rate FRACTION]
+"""
+
+import argparse
+import os
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+PATH = "/vin-decoder/"
+
+
+class MockSiteHandler(BaseHTTPRequestHandler):
+    def _page(self, vin_number):
+        if not vin_number:
+            return "search.html"
+        if vin_number.startswith("0"):
+            return "not_found.html"
+        if os.path.exists(os.path.join(self.server.fixtures, f"{vin_number}.html")):
+            return f"{vin_number}.html"
+        return "result.html"
+
+    def _send_page(self, vin_number):
+        if vin_number:
+            status = self.server.admit()
+            if status != 200:
+                return self.send_error(status)
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        with open(
+            os.path.join(self.server.fixtures, self._page(vin_number)), "rb"
+        ) as page:
+            content = page.read()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if not url.path.startswith(PATH):
+            return self.send_error(404)
+        self._send_page(parse_qs(url.query).get("vin", [""])[0])
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(length).decode("utf-8"))
+        self._send_page(form.get("vin", [""])[0])
+
+    def log_message(self, *args):
+        pass
+
+
+class MockSiteServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Many workers connect at once, do not make them wait for a SYN retry.
+    request_queue_size = 128
+    capacity = None
+    failure_rate = 0
+
+    def server_activate(self):
+        super().server_activate()
+        self.searches = deque()
+        self.statuses = {}
+        self._lock = threading.Lock()
+
+    def admit(self):
+        """HTTP status to answer a search with, counted in `statuses`"""
+        now = time.monotonic()
+        with self._lock:
+            while self.searches and self.searches[0] <= now - 1:
+                self.searches.popleft()
+            if self.capacity is not None and len(self.searches) >= self.capacity:
+                status = 429
+            else:
+                self.searches.append(now)
+                status = 503 if random.random() < self.failure_rate else 200
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+        return status
+
+
+class MockSite:
+    def __init__(self, port=0, fixtures=FIXTURES, delay=0, capacity=None, failure_rate=0):
+        """Serve the fixtures on localhost from a background thread.
+
+        Args:
+            port (int, optional): Port to listen on, any free one by default
+            fixtures (str, optional): Directory with the recorded pages
+            delay (float, optional): Seconds to wait before serving each page, to
+                stand in for the network
+            capacity (int, optional): Searches served a second, the ones beyond get
+                429, unlimited by default
+            failure_rate (float, optional): Share of searches failed with 503
+        """
+        self.server = MockSiteServer(("127.0.0.1", port), MockSiteHandler)
+        self.server.fixtures = fixtures
+        self.server.delay = delay
+        self.server.capacity = capacity
+        self.server.failure_rate = failure_rate
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}{PATH}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", default=8080, type=int, help="default [8080].")
+    parser.add_argument("--delay", default=0, type=float, help="default [0].")
+    parser.add_argument("--capacity", type=int, help="default [unlimited].")
+    parser.add_argument("--failure-rate", default=0, type=float, help="default [0].")
+    args = parser.parse_args()
+
+    site = MockSite(
+        args.port,
+        delay=args.delay,
+        capacity=args.capacity,
+        failure_rate=args.failure_rate,
+    )
+    print(f"Serving {FIXTURES} on {site.url}")
+    try:
+        site.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        site.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
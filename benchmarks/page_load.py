@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Compare page load time and bytes transferred of a stock and a lean Firefox.
+
+Every run starts a fresh browser so that each load is a cold one, only the page load
+itself is timed.
+
+usage: python benchmarks/page_load.py [--url URL] [--runs RUNS] [--no-headless]
+"""
+
+import argparse
+import json
+import statistics
+import time
+
+from vehicle_history_reports import FirefoxSettings, VehicleHistoryReports, quit_driver
+from vehicle_history_reports.parser import URL
+
+# Number of requests made by the page and bytes transferred over the network.
+TRANSFERRED = """
+var entries = performance.getEntriesByType("navigation")
+    .concat(performance.getEntriesByType("resource"));
+return [entries.length, entries.reduce(function (total, entry) {
+    return total + (entry.transferSize || 0);
+}, 0)];
+"""
+
+
+def load(settings, url, headless):
+    driver = VehicleHistoryReports.new_driver(headless=headless, settings=settings)
+    try:
+        start = time.monotonic()
+        driver.get(url)
+        elapsed = time.monotonic() - start
+        # Resources still loading after an eager return count towards the bytes.
+        time.sleep(2)
+        requests, transferred = driver.execute_script(TRANSFERRED)
+    finally:
+        quit_driver(driver)
+    return {"seconds": elapsed, "requests": requests, "bytes": transferred}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default=URL, help=f"Page to load, default [{URL}].")
+    parser.add_argument("--runs", default=3, type=int, help="Loads per profile.")
+    parser.add_argument("--no-headless", dest="headless", action="store_false")
+    args = parser.parse_args()
+
+    report = {}
+    for name, settings in (
+        ("stock", FirefoxSettings.stock()),
+        ("lean", FirefoxSettings()),
+    ):
+        runs = [load(settings, args.url, args.headless) for _ in range(args.runs)]
+        report[name] = {
+            key: statistics.median(run[key] for run in runs)
+            for key in ("seconds", "requests", "bytes")
+        }
+        print(
+            f"{name:>6}: {report[name]['seconds']:6.2f}s "
+            f"{report[name]['requests']:5.0f} requests "
+            f"{report[name]['bytes'] / 1024:9.1f} KiB"
+        )
+    print(json.dumps(report, indent=4, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
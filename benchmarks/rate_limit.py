@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Benchmark adaptive rate limiting against a mock site that pushes back.
+
+The mock site serves --capacity searches a second and answers the ones beyond with
+429, and fails --failure-rate of them with 503. Lookups over plain HTTP run without
+a limiter and with a `RateLimiter` starting at --rate, reporting the VINs found a
+second, the share of lookups that failed and where the limiter settled. Save a run
+with --output and compare a later one to it with --compare, like benchmarks/suite.py.
+
+usage: python benchmarks/rate_limit.py [--workers N] [--vins N] [--capacity N]
+                                       [--failure-rate FRACTION] [--rate N]
+                                       [--increase N] [--delay SECONDS]
+                                       [--output FILE] [--compare FILE]
+                                       [--tolerance FRACTION]
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from loguru import logger
+
+from mock_site import MockSite
+from suite import compare, vin_numbers
+from vehicle_history_reports import FetchBackend, iter_reports
+from vehicle_history_reports.rate_limit import RateLimiter
+
+
+def bench(site, workers, count, rate_limiter=None):
+    site.server.statuses.clear()
+    with FetchBackend(url=site.url, pool_size=workers) as fetch:
+        start = time.perf_counter()
+        results = list(
+            iter_reports(
+                vin_numbers(count),
+                workers=workers,
+                fetch=fetch,
+                url=site.url,
+                rate_limiter=rate_limiter,
+            )
+        )
+        elapsed = time.perf_counter() - start
+    found = sum(result["status"] == "ok" for result in results)
+    report = {
+        "vins": count,
+        "seconds": elapsed,
+        "vins_per_second": found / elapsed,
+        "failed_share": 1 - found / count,
+        "responses": {str(status): n for status, n in site.server.statuses.items()},
+    }
+    if rate_limiter is not None:
+        report["final_rate"] = max(rate_limiter.rates().values())
+    name = "adaptive" if rate_limiter is not None else "unlimited"
+    print(
+        f"{name:>10}: {report['vins_per_second']:8.2f} VINs/s found"
+        f"  {report['failed_share']:6.1%} failed"
+        f"  responses {report['responses']}"
+        + (f"  settled at {report['final_rate']:.1f}/s" if rate_limiter else "")
+    )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default=8, type=int, help="default [8].")
+    parser.add_argument("--vins", default=300, type=int, help="Lookups per run.")
+    parser.add_argument(
+        "--capacity", default=20, type=int, help="Searches a second, default [20]."
+    )
+    parser.add_argument(
+        "--failure-rate", default=0.0, type=float, help="Share failed, default [0]."
+    )
+    parser.add_argument(
+        "--rate", default=5.0, type=float, help="Lookups a second to start at."
+    )
+    parser.add_argument(
+        "--increase",
+        default=0.2,
+        type=float,
+        help="Lookups a second added per success, default [0.2].",
+    )
+    parser.add_argument(
+        "--delay", default=0.02, type=float, help="Seconds the mock site takes per page."
+    )
+    parser.add_argument("--output", "-o", help="Save the results as JSON here.")
+    parser.add_argument("--compare", help="Results of an earlier run to compare to.")
+    parser.add_argument(
+        "--tolerance",
+        default=0.2,
+        type=float,
+        help="Slow down counted as a regression, default [0.2].",
+    )
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+
+    report = {"args": vars(args)}
+    with MockSite(
+        delay=args.delay, capacity=args.capacity, failure_rate=args.failure_rate
+    ) as site:
+        report["unlimited"] = bench(site, args.workers, args.vins)
+        # Let the site's one second window drain before the next run.
+        time.sleep(1)
+        report["adaptive"] = bench(
+            site,
+            args.workers,
+            args.vins,
+            RateLimiter(rate=args.rate, increase=args.increase),
+        )
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=4, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(report, json.load(baseline_file), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regressions over {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
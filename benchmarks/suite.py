@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""Benchmark extraction and lookups offline, against the recorded pages in fixtures/.
+
+parse: parse and extract time per page, checked against the recorded output.
+fetch: end-to-end lookups over plain HTTP from the local mock site.
+browser: end-to-end lookups with headless Firefox from the local mock site.
+
+Lookups report per-VIN latency, throughput and peak RSS (including browsers) at each
+number of workers. Save a run with --output and compare a later one to it with
+--compare, which exits with status 1 if a median, p95, throughput or peak RSS got
+worse than --tolerance allows.
+
+usage: python benchmarks/suite.py [--backends {parse,fetch,browser} ...]
+                                  [--workers N ...] [--vins N] [--repeat N]
+                                  [--delay SECONDS] [--output FILE]
+                                  [--compare FILE] [--tolerance FRACTION]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import threading
+import time
+
+import psutil
+from loguru import logger
+
+from mock_site import FIXTURES, MockSite
+from vehicle_history_reports import FetchBackend, ReportParser, iter_reports
+from vehicle_history_reports.parser import HTML_PARSER
+from vehicle_history_reports.vin import check_digit
+
+SAMPLE_VIN = "JN8AZ2NC3G9400704"
+
+# A recall or complaint, repeated to make a page with many of them.
+ISSUE = """<tbody>
+<tr><td>Date</td><td>2017-05-01</td></tr>
+<tr><td>Component</td><td>AIR BAGS</td></tr>
+</tbody>
+"""
+
+# Metrics where more is better, everything else is a duration or a size.
+HIGHER_IS_BETTER = ("vins_per_second",)
+# Measurements compared between runs, the others are too noisy or not timings.
+COMPARED = ("/median", "/p95", "/vins_per_second", "/peak_rss_bytes")
+
+
+class PeakRSS:
+    def __init__(self, interval=0.05):
+        """Sample the resident memory of this process and all its children, e.g.
+        geckodriver and Firefox, in a background thread while in a `with` block.
+
+        Args:
+            interval (float, optional): Seconds between samples
+        """
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _rss(self):
+        process = psutil.Process()
+        rss = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return rss
+
+    def _sample(self):
+        while True:
+            self.peak = max(self.peak, self._rss())
+            if self._stop.wait(self.interval):
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def summary(values):
+    values = sorted(values)
+    return {
+        "median": statistics.median(values),
+        "p95": values[min(len(values) - 1, int(0.95 * len(values)))],
+        "mean": statistics.mean(values),
+        "min": values[0],
+        "max": values[-1],
+    }
+
+
+def vin_numbers(count):
+    """Distinct valid VINs based on the sample one, varying its serial number"""
+    vin_numbers = [f"{SAMPLE_VIN[:11]}{serial:06d}" for serial in range(count)]
+    return [f"{vin[:8]}{check_digit(vin)}{vin[9:]}" for vin in vin_numbers]
+
+
+def pages(fixtures, issues):
+    with open(os.path.join(fixtures, "result.html")) as page:
+        result = page.read()
+    many_issues = result
+    for section in ("recalls", "complaints"):
+        start = f'<div id="{section}">\n<table>\n'
+        many_issues = many_issues.replace(start, start + ISSUE * issues)
+    return {"result.html": result, f"result.html + {issues} issues": many_issues}
+
+
+def bench_parse(fixtures, repeat, issues):
+    with open(os.path.join(fixtures, "result.json")) as expected_file:
+        expected = json.load(expected_file)
+    report = {}
+    for name, html in pages(fixtures, issues).items():
+        parse_times, extract_times = [], []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            page_source = ReportParser(html).page_source
+            parsed = time.perf_counter()
+            data = ReportParser.parse(page_source)
+            parse_times.append(parsed - start)
+            extract_times.append(time.perf_counter() - parsed)
+        if name == "result.html" and data != expected:
+            raise SystemExit("Extraction of result.html no longer matches result.json")
+        report[name] = {
+            "bytes": len(html.encode("utf-8")),
+            "parse_seconds": summary(parse_times),
+            "extract_seconds": summary(extract_times),
+        }
+        print(
+            f"{name:>28}: parse {report[name]['parse_seconds']['median'] * 1000:8.2f}ms"
+            f"  extract {report[name]['extract_seconds']['median'] * 1000:8.2f}ms"
+        )
+    return report
+
+
+def bench_lookups(site, backend, workers, count):
+    lookup_args = {"workers": workers, "url": site.url}
+    fetch = None
+    if backend == "fetch":
+        fetch = lookup_args["fetch"] = FetchBackend(url=site.url, pool_size=workers)
+    try:
+        with PeakRSS() as rss:
+            start = time.perf_counter()
+            results = list(iter_reports(vin_numbers(count), **lookup_args))
+            elapsed = time.perf_counter() - start
+    finally:
+        if fetch is not None:
+            fetch.close()
+    failed = [result for result in results if result["status"] != "ok"]
+    if failed:
+        logger.warning("{} lookups failed, e.g. {}", len(failed), failed[0]["error"])
+    stages = sorted({stage for result in results for stage in result["timings"]})
+    report = {
+        "vins": count,
+        "errors": len(failed),
+        "seconds": elapsed,
+        "vins_per_second": count / elapsed,
+        "latency_seconds": summary(result["timings"]["lookup"] for result in results),
+        "stage_seconds": {
+            stage: statistics.median(
+                result["timings"][stage]
+                for result in results
+                if stage in result["timings"]
+            )
+            for stage in stages
+        },
+        "peak_rss_bytes": rss.peak,
+    }
+    print(
+        f"{backend:>8} x{workers:<3}: {report['vins_per_second']:8.2f} VINs/s"
+        f"  p50 {report['latency_seconds']['median'] * 1000:8.2f}ms"
+        f"  p95 {report['latency_seconds']['p95'] * 1000:8.2f}ms"
+        f"  peak RSS {rss.peak / 2 ** 20:8.1f}MB"
+    )
+    return report
+
+
+def flatten(report, prefix=""):
+    for key, value in report.items():
+        if isinstance(value, dict):
+            yield from flatten(value, f"{prefix}{key}/")
+        elif isinstance(value, (int, float)):
+            yield f"{prefix}{key}", value
+
+
+def compare(report, baseline, tolerance):
+    """Print how each measurement changed since the baseline run.
+
+    Returns:
+        list: Measurements that got worse by more than `tolerance`
+    """
+    before = dict(flatten(baseline))
+    regressions = []
+    for key, value in flatten(report):
+        compared = key.endswith(COMPARED) or "/stage_seconds/" in key
+        if not compared or not before.get(key):
+            continue
+        change = value / before[key] - 1
+        worse = -change if key.endswith(HIGHER_IS_BETTER) else change
+        flag = ""
+        if worse > tolerance:
+            flag = "  REGRESSION"
+            regressions.append(key)
+        print(f"{key:<70} {before[key]:>12.6g} -> {value:<12.6g} {change:+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        choices=("parse", "fetch", "browser"),
+        default=["parse", "fetch"],
+        help="What to benchmark, default [parse fetch].",
+    )
+    parser.add_argument(
+        "--workers",
+        nargs="+",
+        type=int,
+        default=[1, 4, 16],
+        help="Concurrent lookups to measure, default [1 4 16].",
+    )
+    parser.add_argument("--vins", default=50, type=int, help="Lookups per run.")
+    parser.add_argument("--repeat", default=50, type=int, help="Parses per page.")
+    parser.add_argument(
+        "--issues", default=500, type=int, help="Recalls and complaints of the big page."
+    )
+    parser.add_argument(
+        "--delay", default=0, type=float, help="Seconds the mock site takes per page."
+    )
+    parser.add_argument("--fixtures", default=FIXTURES, help="Recorded pages.")
+    parser.add_argument("--output", "-o", help="Save the results as JSON here.")
+    parser.add_argument("--compare", help="Results of an earlier run to compare to.")
+    parser.add_argument(
+        "--tolerance",
+        default=0.2,
+        type=float,
+        help="Slow down counted as a regression, default [0.2].",
+    )
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    report = {
+        "meta": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "html_parser": HTML_PARSER,
+            "args": vars(args),
+        }
+    }
+    if "parse" in args.backends:
+        report["parse"] = bench_parse(args.fixtures, args.repeat, args.issues)
+    lookups = [backend for backend in args.backends if backend != "parse"]
+    if lookups:
+        report["lookups"] = {}
+        with MockSite(fixtures=args.fixtures, delay=args.delay) as site:
+            for backend in lookups:
+                report["lookups"][backend] = {
+                    str(workers): bench_lookups(site, backend, workers, args.vins)
+                    for workers in args.workers
+                }
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=4, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(report, json.load(baseline_file), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regressions over {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,133 @@
 #!/usr/bin/env python3
 import argparse
 import json
+import os
 import pathlib
 import sys
+import time
 
-from vehicle_history_reports import VehicleHistoryReports
+from vehicle_history_reports import ReportCache, iter_reports
+from vehicle_history_reports.journal import Journal, iter_job, read_job_file
+from vehicle_history_reports.cache import DEFAULT_CACHE_FILE
+from vehicle_history_reports.vin import normalize
+
+
+def run_queue(args, exporter, **lookup_args):
+    """Add the VINs to the --queue, or with --work look them up from it and export
+    the results this worker recorded.
+
+    Returns:
+        dict: What was done, and the number of jobs in each state of the queue
+    """
+    from vehicle_history_reports.work_queue import WorkQueue, work, worker_name
+
+    with WorkQueue(args["queue"]) as work_queue:
+        if args.get("work"):
+            started = time.time()
+            output = {"finished": work(work_queue, wait=args.get("wait"), **lookup_args)}
+            if exporter is not None:
+                # Other workers export their own results, and earlier runs did already.
+                for result in work_queue.results(worker_name(), since=started):
+                    exporter.write(result["vin"], result["data"])
+        else:
+            vin_numbers = (
+                read_job_file(args["job_file"])
+                if args.get("job_file")
+                else args.get("vin_numbers")
+            )
+            added, rejected = work_queue.enqueue(
+                vin_numbers, check_digit=args.get("check_digit")
+            )
+            output = {"queued": added, "rejected": [str(err) for err in rejected]}
+        output["jobs"] = work_queue.counts()
+        output["dead_letters"] = work_queue.dead_letters()
+    return output
 
 
 def main():
     parser = argparse.ArgumentParser(
         description="Web scrapping tool for Vehicle information by VIN number"
     )
-    parser.add_argument(
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument(
         "--vin-numbers",
         "-v",
         dest="vin_numbers",
         default=[],
-        required=True,
         type=str,
         nargs="+",
         help="A list of VIN numbers.",
     )
+    source.add_argument(
+        "--job-file",
+        dest="job_file",
+        help="File with the VIN numbers to look up, one per line. Finished VINs are "
+        "recorded in a journal so that an interrupted job can be resumed.",
+    )
+    source.add_argument(
+        "--from-html",
+        dest="from_html",
+        help="Extract vehicle info from a directory of saved result pages instead, "
+        "output is keyed by file name.",
+    )
+    source.add_argument(
+        "--serve",
+        dest="serve",
+        nargs="?",
+        const="127.0.0.1:8000",
+        metavar="HOST:PORT",
+        help="Keep running and serve lookups over HTTP instead, on GET /vin/<vin>, "
+        "POST /batch, GET /health and GET /metrics, default [127.0.0.1:8000].",
+    )
+    source.add_argument(
+        "--work",
+        dest="work",
+        action="store_true",
+        help="Take VINs from the --queue work queue and record their results in it, "
+        "until it is drained. Run on as many nodes as needed.",
+    )
+    parser.add_argument(
+        "--queue",
+        dest="queue",
+        help="SQLite work queue on storage shared by the worker nodes. With "
+        "--vin-numbers or --job-file, add the VINs to it instead of looking them up.",
+    )
+    parser.add_argument(
+        "--wait",
+        dest="wait",
+        action="store_true",
+        help="Keep waiting for new VINs with --work once the queue is drained.",
+    )
+    parser.add_argument(
+        "--resume",
+        dest="resume",
+        action="store_true",
+        help="Continue the --job-file job, skipping the VINs its journal has as done.",
+    )
+    parser.add_argument(
+        "--journal",
+        dest="journal",
+        help="Journal of the --job-file job, default [<job file>.journal].",
+    )
+    parser.add_argument(
+        "--queue-size",
+        dest="queue_size",
+        default=100,
+        type=int,
+        help="Lookups allowed to wait when serving, default [100].",
+    )
     parser.add_argument(
         "--no-headless",
         dest="headless",
         action="store_false",
         help="Do not open browser in headless mode.",
     )
+    parser.add_argument(
+        "--no-lean",
+        dest="lean",
+        action="store_false",
+        help="Load pages in full, do not block images, fonts, ads and trackers.",
+    )
     parser.add_argument(
         "--no-json-output",
         "-j",
@@ -34,6 +135,34 @@ def main():
         action="store_false",
         help="Output as json.",
     )
+    parser.add_argument(
+        "--output-format",
+        dest="output_format",
+        default="json",
+        choices=["json", "ndjson"],
+        help="json: one array once every VIN is done, ndjson: one line per VIN as "
+        "soon as it is done, default [json].",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        dest="output",
+        help="File to write the output to, default [stdout].",
+    )
+    parser.add_argument(
+        "--export",
+        dest="export",
+        help="Also export the reports into normalized tables (vehicles, attributes, "
+        "recalls, complaints, images) here, a database file for sqlite or a "
+        "directory for csv and parquet.",
+    )
+    parser.add_argument(
+        "--export-format",
+        dest="export_format",
+        default="sqlite",
+        choices=["sqlite", "csv", "parquet"],
+        help="Format to --export in, parquet needs pyarrow, default [sqlite].",
+    )
     parser.add_argument("--host", dest="host", help="Proxy address. [Optional]")
     parser.add_argument("--port", dest="port", help="Proxy port. [Optional]")
     parser.add_argument(
@@ -42,6 +171,104 @@ def main():
     parser.add_argument(
         "--password", dest="password", help="Password to access proxy. [Optional]"
     )
+    parser.add_argument(
+        "--proxy-file",
+        dest="proxy_file",
+        help="File with proxies to rotate over, one 'host:port[:username:password] "
+        "[weight]' per line. [Optional]",
+    )
+    parser.add_argument(
+        "--proxy-strategy",
+        dest="proxy_strategy",
+        default="round-robin",
+        choices=["round-robin", "weighted"],
+        help="How to pick from --proxy-file proxies, default [round-robin].",
+    )
+    parser.add_argument(
+        "--max-uses",
+        dest="max_uses",
+        default=50,
+        type=int,
+        help="Restart the browser after this many VIN lookups, default [50].",
+    )
+    parser.add_argument(
+        "--workers",
+        "-w",
+        dest="workers",
+        default=None,
+        type=int,
+        help="Number of VINs to look up concurrently, default [1], or processes "
+        "to parse --from-html pages with, default [number of CPUs].",
+    )
+    parser.add_argument(
+        "--fetch",
+        dest="fetch",
+        action="store_true",
+        help="Look up VINs over plain HTTP first, only start a browser for pages "
+        "that need JavaScript.",
+    )
+    parser.add_argument(
+        "--rate",
+        dest="rate",
+        type=float,
+        help="Lookups per second to start at, then adapt to how the site copes: ramp "
+        "up while lookups succeed, back off when they fail. Not limited by default.",
+    )
+    parser.add_argument(
+        "--max-rate",
+        dest="max_rate",
+        type=float,
+        help="Never go above this many lookups per second with --rate.",
+    )
+    parser.add_argument(
+        "--proxy-rate",
+        dest="proxy_rate",
+        type=float,
+        help="Lookups per second to start at through each proxy with --rate.",
+    )
+    parser.add_argument(
+        "--no-check-digit",
+        dest="check_digit",
+        action="store_false",
+        help="Do not reject VINs with a wrong check digit, e.g. for VINs from outside "
+        "North America. Invalid and repeated VINs are never looked up.",
+    )
+    parser.add_argument(
+        "--cache",
+        dest="cache",
+        action="store_true",
+        default=False,
+        help="Serve VINs from and store them in the local cache.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        dest="cache",
+        action="store_false",
+        help="Do not use the local cache. [Default]",
+    )
+    parser.add_argument(
+        "--refresh",
+        dest="refresh",
+        action="store_true",
+        help="Look up VINs again even if cached, and update the cache.",
+    )
+    parser.add_argument(
+        "--cache-file",
+        dest="cache_file",
+        default=DEFAULT_CACHE_FILE,
+        help=f"Cache file to use, default [{DEFAULT_CACHE_FILE}].",
+    )
+    parser.add_argument(
+        "--reap-orphans",
+        dest="reap_orphans",
+        action="store_true",
+        help="Terminate geckodriver processes left behind by crashed sessions first.",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        dest="metrics_file",
+        help="Write per-stage timings and counters here in the Prometheus text format.",
+    )
     parser.add_argument(
         "--loglevel",
         dest="log_level",
@@ -50,27 +277,164 @@ def main():
     )
     args = vars(parser.parse_args())
     data = []
+    # Set once the results were written out line by line, nothing is left to dump.
+    streamed = False
+
+    proxy = {key: args.get(key) for key in ("host", "port", "username", "password")}
+    if args.get("proxy_file"):
+        from vehicle_history_reports import ProxyPool
+
+        proxy = {
+            "proxy_pool": ProxyPool.from_file(
+                args["proxy_file"], strategy=args.get("proxy_strategy")
+            )
+        }
+
+    cache = None
+    if args.get("cache") or args.get("refresh"):
+        cache = ReportCache(args.get("cache_file"))
+
+    fetch = None
+    if args.get("fetch"):
+        from vehicle_history_reports import FetchBackend
+
+        fetch = FetchBackend(
+            pool_size=args.get("workers") or 1,
+            **{key: args.get(key) for key in ("host", "port", "username", "password")},
+        )
+
+    rate_limiter = None
+    if args.get("rate"):
+        from vehicle_history_reports import RateLimiter
 
+        rate_limiter = RateLimiter(
+            rate=args["rate"],
+            max_rate=args.get("max_rate"),
+            proxy_rate=args.get("proxy_rate"),
+        )
+
+    settings = None
+    if not args.get("lean"):
+        from vehicle_history_reports import FirefoxSettings
+
+        settings = FirefoxSettings.stock()
+
+    exporter = None
     try:
-        for vin_number in args.get("vin_numbers", [None]):
-            if not vin_number:
+        if args.get("export"):
+            from vehicle_history_reports.export import EXPORTERS
+
+            exporter = EXPORTERS[args["export_format"]](args["export"])
+        if args.get("reap_orphans"):
+            from vehicle_history_reports import reap_orphans
+
+            reap_orphans()
+        if args.get("from_html"):
+            from vehicle_history_reports import parse_directory
+
+            data = parse_directory(args.get("from_html"), workers=args.get("workers"))
+            if exporter is not None:
+                for name, vehicle_data in data.items():
+                    exporter.write(name, vehicle_data)
+            return
+        if args.get("work") and not args.get("queue"):
+            raise RuntimeError("--work takes VINs from a --queue.")
+        if args.get("serve"):
+            from vehicle_history_reports.server import serve
+
+            serve(
+                args.get("serve"),
+                workers=args.get("workers") or 1,
+                queue_size=args.get("queue_size"),
+                headless=args.get("headless"),
+                max_uses=args.get("max_uses"),
+                settings=settings,
+                cache=cache,
+                fetch=fetch,
+                check_digit=args.get("check_digit"),
+                rate_limiter=rate_limiter,
+                log_level=args.get("log_level"),
+                **proxy,
+            )
+            return
+        lookup_args = dict(
+            workers=args.get("workers") or 1,
+            headless=args.get("headless"),
+            max_uses=args.get("max_uses"),
+            settings=settings,
+            cache=cache,
+            refresh=args.get("refresh"),
+            fetch=fetch,
+            check_digit=args.get("check_digit"),
+            rate_limiter=rate_limiter,
+            log_level=args.get("log_level"),
+            **proxy,
+        )
+        if args.get("queue"):
+            data = run_queue(args, exporter, **lookup_args)
+            return
+        journal = None
+        if args.get("job_file"):
+            journal_file = args.get("journal") or f"{args['job_file']}.journal"
+            if os.path.exists(journal_file) and not args.get("resume"):
+                raise RuntimeError(
+                    f"Journal {journal_file} exists, use --resume to continue the job."
+                )
+            journal = Journal(journal_file)
+            results = iter_job(read_job_file(args["job_file"]), journal, **lookup_args)
+        else:
+            if not all(args.get("vin_numbers", [None])):
                 raise RuntimeError("Missing VIN Number.")
-            vin_decoder = VehicleHistoryReports(vin_number=vin_number, **args)
-            vin_decoder.open_site(headless=args.get("headless"))
-            vin_decoder.navigate_site()
-            vin_decoder.get_vehicle_details()
-            vin_decoder.get_recent_recalls()
-            vin_decoder.get_recent_complaints()
-            vin_decoder.get_image_links()
-            data.append(vin_decoder.data_structure)
-            vin_decoder.close_session()
+            results = iter_reports(args.get("vin_numbers"), **lookup_args)
+        if exporter is not None:
+            from vehicle_history_reports.export import export_results
+
+            results = export_results(results, exporter)
+        if args.get("output_format") == "ndjson":
+            streamed = True
+            output = open(args["output"], "a") if args.get("output") else sys.stdout
+            try:
+                for result in results:
+                    output.write(json.dumps(result, sort_keys=True) + "\n")
+                    output.flush()
+            finally:
+                if output is not sys.stdout:
+                    output.close()
+            return
+        if journal is not None:
+            # Include the VINs done by earlier runs of the job.
+            for _ in results:
+                pass
+            recorded = journal.results()
+            vin_numbers = dict.fromkeys(map(normalize, read_job_file(args["job_file"])))
+            results = [recorded.get(vin, {}) for vin in vin_numbers]
+        data = [result["data"] for result in results if result.get("status") == "ok"]
     except Exception as err:
         print(err)
-        vin_decoder.close_session()
     finally:
-        return json.dumps(data, indent=4, sort_keys=True) if args.get("no_json") else data
+        if exporter is not None:
+            exporter.close()
+        if cache is not None:
+            cache.close()
+        if fetch is not None:
+            fetch.close()
+        if args.get("metrics_file"):
+            from vehicle_history_reports.metrics import METRICS
+
+            METRICS.dump(args["metrics_file"])
+        if streamed:
+            return None
+        output = (
+            json.dumps(data, indent=4, sort_keys=True) if args.get("no_json") else data
+        )
+        if args.get("output"):
+            with open(args["output"], "w") as output_file:
+                output_file.write(str(output))
+            return None
+        return output
 
 
 if __name__ == "__main__":
     test = main()
-    print(test)
+    if test is not None:
+        print(test)
@@ -25,8 +25,14 @@ REQUIRED = [
     "psutil==5.6.3",
     "loguru"
 ]
-
-REQUIRES_PYTHON = ">=3.6.0"
+EXTRAS = {
+    # optional packages, installed with: pip install .[fast]
+    "fast": ["lxml", "orjson"],
+    # pip install .[parquet], for --export-format parquet
+    "parquet": ["pyarrow"],
+}
+
+REQUIRES_PYTHON = ">=3.7.0"
 URL = "https://github.com/mmphego/vehicle_history_reports"
 VERSION = "0.1.0"
 
@@ -113,6 +119,7 @@ setup(
         exclude=["tests", "*.tests", "*.tests.*", "tests.*"],
     ),
     install_requires=REQUIRED,
+    extras_require=EXTRAS,
     include_package_data=True,
     scripts=SCRIPTS,
     license="BSD license",
@@ -121,7 +128,6 @@ setup(
         "License :: OSI Approved :: BSD License",
         "Natural Language :: English",
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.6",
         "Programming Language :: Python :: 3.7",
     ],
     keywords="vehicle_history_reports",
@@ -1,3 +1,69 @@
 # -*- coding: utf-8 -*-
 
 """Unit test package for vehicle_history_reports."""
+
+import os
+import sys
+import threading
+import unittest
+from http.server import ThreadingHTTPServer
+
+from vehicle_history_reports.fetch import FetchBackend
+
+BENCHMARKS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"
+)
+FIXTURES = os.path.join(BENCHMARKS, "fixtures")
+
+sys.path.insert(0, BENCHMARKS)
+from mock_site import MockSite  # noqa: E402
+
+
+def fixture(name, mode="r"):
+    """Content of a recorded page or data structure in benchmarks/fixtures"""
+    with open(os.path.join(FIXTURES, name), mode) as fixture_file:
+        return fixture_file.read()
+
+
+class PageDriver:
+    """Browser showing a recorded page"""
+
+    current_url = "https://driving-tests.org/vin-decoder/"
+
+    def __init__(self, name="result.html"):
+        self.page_source = fixture(name)
+
+
+class MockSiteTestCase(unittest.TestCase):
+    """
+    Test case with a local stand-in for the VIN decoder site, see
+    benchmarks/mock_site.py, and a plain HTTP backend looking VINs up on it.
+
+    Attributes:
+        site_options (dict): Passed on to `MockSite`, e.g. its `delay`
+        site (MockSite): Running mock site
+        fetch (FetchBackend): Backend for the mock site
+    """
+
+    site_options = {}
+
+    def setUp(self):
+        self.site = MockSite(**self.site_options).start()
+        self.addCleanup(self.site.close)
+        self.fetch = FetchBackend(url=self.site.url)
+        self.addCleanup(self.fetch.close)
+
+    def serve(self, service):
+        """Serve the HTTP/JSON API of a `ReportService` until the test is done.
+
+        Returns:
+            str: Base URL of the API
+        """
+        from vehicle_history_reports.server import ReportRequestHandler
+
+        httpd = ThreadingHTTPServer(("127.0.0.1", 0), ReportRequestHandler)
+        httpd.service = service
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        self.addCleanup(httpd.server_close)
+        self.addCleanup(httpd.shutdown)
+        return "http://{}:{}".format(*httpd.server_address[:2])
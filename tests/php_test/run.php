@@ -16,7 +16,8 @@
 <?php
     if(isset($_POST['GO']))
     {
-        $message = shell_exec("python3 vin_scrapper.py --vin-numbers JN8AZ2NC3G9400704 --host 23.94.44.65 --port 10998");
+        // Needs: python3 vin_scrapper.py --serve 127.0.0.1:8000 --host 23.94.44.65 --port 10998
+        $message = file_get_contents("http://127.0.0.1:8000/vin/JN8AZ2NC3G9400704");
         print_r($message);
     }
 ?>
\ No newline at end of file
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the batch lookups of `vehicle_history_reports.batch`, `aio` and `server`."""
+
+import asyncio
+import unittest
+
+import requests
+
+from vehicle_history_reports.aio import AsyncVehicleHistoryReports
+from vehicle_history_reports.batch import scrape_many
+from vehicle_history_reports.server import ReportService
+
+from tests import MockSiteTestCase
+
+# The same VIN twice, written differently, and an invalid one.
+VIN_NUMBERS = [
+    "3AKJGLD57FSGD1225",
+    "1HGCM82633A004352",
+    "3akj-gld5-7fsgd1225",
+    "1HGCM82633A00435",
+    "1HGCM82633A004352",
+]
+NORMALIZED = [
+    "3AKJGLD57FSGD1225",
+    "1HGCM82633A004352",
+    "3AKJGLD57FSGD1225",
+    "1HGCM82633A00435",
+    "1HGCM82633A004352",
+]
+STATUSES = ["ok", "ok", "duplicate", "rejected", "duplicate"]
+
+
+class BatchResultsTest(MockSiteTestCase):
+    """Every batch API gives the same results"""
+
+    def assertResults(self, results):
+        self.assertEqual([result["vin"] for result in results], NORMALIZED)
+        self.assertEqual([result["status"] for result in results], STATUSES)
+        for result in results:
+            self.assertEqual(
+                sorted(result), ["cached", "data", "error", "status", "timings", "vin"]
+            )
+            self.assertIs(result["cached"], False)
+            self.assertEqual(result["data"] is None, result["status"] != "ok")
+            self.assertEqual(result["error"] is None, result["status"] == "ok")
+            self.assertEqual("lookup" in result["timings"], result["status"] == "ok")
+        self.assertEqual(self.site.server.statuses, {200: 2})
+
+    def test_scrape_many(self):
+        self.assertResults(scrape_many(VIN_NUMBERS, workers=2, fetch=self.fetch))
+
+    def test_fetch_many(self):
+        async def fetch_many():
+            async with AsyncVehicleHistoryReports(
+                max_concurrency=2, fetch=self.fetch
+            ) as client:
+                return await client.fetch_many(VIN_NUMBERS)
+
+        self.assertResults(asyncio.run(fetch_many()))
+
+    def test_post_batch(self):
+        service = ReportService(workers=2, fetch=self.fetch)
+        self.addCleanup(service.close)
+        url = f"{self.serve(service)}/batch"
+        self.assertResults(requests.post(url, json=VIN_NUMBERS, timeout=10).json())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for `vehicle_history_reports.browser_pool`, with stand-in browsers."""
+
+import asyncio
+import threading
+import time
+import unittest
+from unittest import mock
+
+from concurrent.futures import ThreadPoolExecutor
+
+from vehicle_history_reports.aio import AsyncVehicleHistoryReports
+from vehicle_history_reports.batch import scrape_vin
+from vehicle_history_reports.browser_pool import BrowserPool
+from vehicle_history_reports.fetch import NeedsBrowser
+from vehicle_history_reports.firefox import FirefoxSettings
+from vehicle_history_reports.proxy_pool import ProxyPool, ProxySettings
+from vehicle_history_reports.rate_limit import RateLimiter
+from vehicle_history_reports.vehicle_history_reports import VehicleHistoryReports
+
+VIN_NUMBER = "3AKJGLD57FSGD1225"
+
+
+class StandInDriver:
+    """Answers like a running browser until it is quit"""
+
+    def __init__(self, proxy, settings=None):
+        self.proxy = proxy
+        self.settings = settings
+        self.quits = 0
+
+    @property
+    def current_url(self):
+        if self.quits:
+            raise ConnectionRefusedError("Browser was quit")
+        return "about:blank"
+
+    def get(self, url):
+        pass
+
+    def quit(self):
+        self.quits += 1
+
+
+class ChallengedFetch:
+    """Plain HTTP backend that only ever gets bot check pages"""
+
+    url = "https://driving-tests.org/vin-decoder/"
+
+    def fetch(self, vin_number, proxy=None, timings=None):
+        raise NeedsBrowser(f"Bot check on vin:{vin_number}")
+
+
+class BrowserPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.started = []
+
+        def new_driver(proxy=None, headless=False, timeout=60, settings=None):
+            self.started.append(StandInDriver(proxy, settings))
+            return self.started[-1]
+
+        patcher = mock.patch.object(VehicleHistoryReports, "new_driver", new_driver)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pool = BrowserPool(size=1)
+        self.addCleanup(self.pool.close)
+
+    def test_reuses_browsers(self):
+        for _ in range(3):
+            with self.pool.session():
+                pass
+        self.assertEqual(len(self.started), 1)
+
+    def test_rotating_proxies_keeps_browsers_warm(self):
+        proxy_pool = ProxyPool(
+            [ProxySettings(host=f"10.0.0.{i}", port="3128") for i in range(10)]
+        )
+        pool = BrowserPool(size=2)
+        self.addCleanup(pool.close)
+        looked_up = []
+
+        def scrape(vin_decoder):
+            # Long enough for both workers to be looking up at the same time.
+            time.sleep(0.01)
+            looked_up.append((vin_decoder.proxy, vin_decoder.driver.proxy))
+
+        with mock.patch("vehicle_history_reports.batch._scrape", scrape):
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                list(
+                    executor.map(
+                        lambda _: scrape_vin(
+                            VIN_NUMBER, pool=pool, proxy_pool=proxy_pool
+                        ),
+                        range(20),
+                    )
+                )
+        self.assertEqual(len(self.started), 2)
+        # Every lookup went through, and was reported against, its browser's proxy.
+        for proxy, browser_proxy in looked_up:
+            self.assertIs(proxy, browser_proxy)
+        self.assertEqual(
+            sum(stats["successes"] for stats in proxy_pool.stats()), len(looked_up)
+        )
+        used = {driver.proxy.key for driver in self.started}
+        for stats in proxy_pool.stats():
+            used_proxy = (stats["host"], stats["port"], None, None) in used
+            self.assertEqual(stats["successes"] > 0, used_proxy)
+
+    def test_fallback_to_the_browser(self):
+        proxy_pool = ProxyPool(
+            [ProxySettings(host=f"10.0.0.{i}", port="3128") for i in range(2)]
+        )
+        rate_limiter = RateLimiter(rate=1000, burst=10)
+        timings = {}
+        with mock.patch("vehicle_history_reports.batch._scrape"), mock.patch.object(
+            rate_limiter, "acquire", wraps=rate_limiter.acquire
+        ) as acquire:
+            for _ in range(3):
+                scrape_vin(
+                    VIN_NUMBER,
+                    pool=self.pool,
+                    fetch=ChallengedFetch(),
+                    proxy_pool=proxy_pool,
+                    rate_limiter=rate_limiter,
+                    timings=timings,
+                )
+        # One go ahead per VIN, and only the browser's proxy is counted.
+        self.assertEqual(acquire.call_count, 3)
+        self.assertEqual(
+            sorted(
+                (stats["requests"], stats["successes"]) for stats in proxy_pool.stats()
+            ),
+            [(0, 0), (1, 3)],
+        )
+
+    def test_benched_proxy_retires_its_browser(self):
+        proxy_pool = ProxyPool([ProxySettings(host="10.0.0.1", port="3128")])
+        with self.pool.lend(proxy_pool=proxy_pool) as pooled:
+            proxy_pool.report(pooled.proxy, "error")
+        with self.pool.lend(proxy_pool=proxy_pool) as pooled:
+            self.assertIs(pooled.driver, self.started[-1])
+        self.assertEqual(len(self.started), 2)
+        self.assertEqual(self.started[0].quits, 1)
+
+    def test_aborted_browser_is_dropped(self):
+        pooled = self.pool.acquire()
+        self.pool.abort(pooled)
+        # The lookup fails with a connection error rather than a WebDriverException.
+        self.pool.release(pooled, healthy=True)
+        self.assertEqual(pooled.driver.quits, 1)
+        self.assertIsNot(self.pool.acquire().driver, pooled.driver)
+
+    def test_timed_out_call_aborts_its_browser(self):
+        def lookup(vin_number, pool, **kwargs):
+            with pool.session() as driver:
+                while not driver.quits:
+                    time.sleep(0.01)
+                raise ConnectionResetError("Browser was quit")
+
+        async def fetch(client):
+            with self.assertRaises(asyncio.TimeoutError):
+                await client.fetch_report(VIN_NUMBER, timeout=0.2)
+
+        client = AsyncVehicleHistoryReports(max_concurrency=1)
+        with mock.patch("vehicle_history_reports.aio.scrape_vin", lookup):
+            asyncio.run(fetch(client))
+            client._close()
+        self.assertEqual([driver.quits for driver in self.started], [1])
+        self.assertEqual(client._pool._idle, {})
+
+    def test_client_starts_browsers_with_its_settings(self):
+        def lookup(vin_number, pool, **kwargs):
+            with pool.session():
+                return {}
+
+        settings = FirefoxSettings.stock()
+        client = AsyncVehicleHistoryReports(max_concurrency=1, settings=settings)
+        with mock.patch("vehicle_history_reports.aio.scrape_vin", lookup):
+            asyncio.run(client.fetch_report(VIN_NUMBER))
+            client._close()
+        self.assertEqual([driver.settings for driver in self.started], [settings])
+
+    def test_client_outlives_its_event_loop(self):
+        def lookup(vin_number, pool, **kwargs):
+            time.sleep(0.05)
+            return {"vin": vin_number}
+
+        async def fetch_many(client):
+            return await client.fetch_many([VIN_NUMBER, "1HGCM82633A004352"])
+
+        client = AsyncVehicleHistoryReports(max_concurrency=1)
+        with mock.patch("vehicle_history_reports.aio.scrape_vin", lookup):
+            # Lookups wait for each other on the semaphore, in one loop after another.
+            for _ in range(2):
+                results = asyncio.run(fetch_many(client))
+                self.assertEqual([result["status"] for result in results], ["ok", "ok"])
+        client._close()
+
+    def test_abort_after_the_call_finished(self):
+        client = AsyncVehicleHistoryReports(max_concurrency=1)
+        client._pool = self.pool
+        call = {"cancelled": threading.Event(), "lock": threading.Lock()}
+        # The thread finished the call and borrowed a browser for its next one.
+        call["thread_id"] = None
+        pooled = self.pool.acquire()
+        client._abort(call)
+        self.assertFalse(pooled.aborted)
+        self.pool.release(pooled)
+        client._close()
+
+
+if __name__ == "__main__":
+    unittest.main()
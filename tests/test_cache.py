@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the report cache of `vehicle_history_reports.cache`."""
+
+import json
+import os
+import re
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from vehicle_history_reports.batch import scrape_many
+from vehicle_history_reports.cache import DAY, ReportCache
+from vehicle_history_reports.fetch import FetchBackend
+
+from tests import FIXTURES, MockSite, fixture
+
+VIN_NUMBERS = ["3AKJGLD57FSGD1225", "1HGCM82633A004352", "1M8GDM9AXKP042788"]
+
+
+class ReportCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = ReportCache(":memory:", max_entries=2)
+        self.addCleanup(self.cache.close)
+        self.data = json.loads(fixture("result.json"))
+        patcher = mock.patch("vehicle_history_reports.cache.time")
+        self.time = patcher.start().time
+        self.addCleanup(patcher.stop)
+        self.time.return_value = 1000.0
+
+    def test_get(self):
+        self.assertIsNone(self.cache.get(VIN_NUMBERS[0]))
+        self.assertTrue(self.cache.set(VIN_NUMBERS[0], self.data))
+        self.assertEqual(self.cache.get(VIN_NUMBERS[0]), self.data)
+        self.assertEqual(
+            self.cache.get(VIN_NUMBERS[0], sections=["Decoded Details"]),
+            {"Decoded Details": self.data["Decoded Details"]},
+        )
+
+    def test_ttl_expiry(self):
+        self.cache.set(VIN_NUMBERS[0], self.data)
+        # Recalls and complaints go stale after a day, the other sections do not.
+        self.time.return_value += DAY + 1
+        self.assertIsNone(self.cache.get(VIN_NUMBERS[0]))
+        self.assertEqual(
+            self.cache.get(VIN_NUMBERS[0], sections=["Decoded Details"]),
+            {"Decoded Details": self.data["Decoded Details"]},
+        )
+        self.time.return_value += 30 * DAY
+        self.assertIsNone(self.cache.get(VIN_NUMBERS[0], sections=["Decoded Details"]))
+
+    def test_lru_eviction(self):
+        for vin_number in VIN_NUMBERS[:2]:
+            self.time.return_value += 1
+            self.cache.set(vin_number, self.data)
+        # Reading the first VIN makes the second one the least recently used.
+        self.time.return_value += 1
+        self.assertIsNotNone(self.cache.get(VIN_NUMBERS[0]))
+        self.time.return_value += 1
+        self.cache.set(VIN_NUMBERS[2], self.data)
+        self.assertIsNotNone(self.cache.get(VIN_NUMBERS[0]))
+        self.assertIsNone(self.cache.get(VIN_NUMBERS[1]))
+        self.assertIsNotNone(self.cache.get(VIN_NUMBERS[2]))
+
+    def test_incomplete_report_is_not_stored(self):
+        data = dict(self.data, **{"Decoded Details": {}})
+        self.assertFalse(self.cache.set(VIN_NUMBERS[0], data))
+        self.assertIsNone(self.cache.get(VIN_NUMBERS[0], sections=["Images Links"]))
+
+
+class IncompleteReportTest(unittest.TestCase):
+    """A lookup whose extraction failed is not served from the cache after"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        fixtures = os.path.join(directory.name, "fixtures")
+        shutil.copytree(FIXTURES, fixtures)
+        # The decoded details table is missing from the page of this VIN.
+        with open(os.path.join(fixtures, f"{VIN_NUMBERS[0]}.html"), "w") as page:
+            page.write(
+                re.sub(
+                    r'<table class="tableinfo">.*?</table>',
+                    "",
+                    fixture("result.html"),
+                    flags=re.S,
+                )
+            )
+        self.site = MockSite(fixtures=fixtures).start()
+        self.addCleanup(self.site.close)
+        self.fetch = FetchBackend(url=self.site.url)
+        self.addCleanup(self.fetch.close)
+        self.cache = ReportCache(":memory:")
+        self.addCleanup(self.cache.close)
+
+    def test_not_cached(self):
+        for _ in range(2):
+            results = scrape_many(VIN_NUMBERS[:2], fetch=self.fetch, cache=self.cache)
+            self.assertEqual([result["status"] for result in results], ["ok", "ok"])
+            self.assertEqual(results[0]["data"]["Decoded Details"], {})
+        self.assertEqual([result["cached"] for result in results], [False, True])
+        self.assertIsNone(self.cache.get(VIN_NUMBERS[0]))
+        self.assertEqual(self.site.server.statuses, {200: 3})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the bulk export of `vehicle_history_reports.export`."""
+
+import csv
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from vehicle_history_reports.export import (
+    TABLES,
+    CSVExporter,
+    Exporter,
+    ParquetExporter,
+    SQLiteExporter,
+    export_results,
+    report_rows,
+)
+from vehicle_history_reports.report import Report
+
+from tests import fixture
+
+VIN_NUMBER = "3AKJGLD57FSGD1225"
+
+
+class ReportRowsTest(unittest.TestCase):
+    def setUp(self):
+        self.data = json.loads(fixture("result.json"))
+
+    def test_report_rows(self):
+        rows = report_rows(VIN_NUMBER, self.data)
+        self.assertEqual(sorted(rows), sorted(TABLES))
+        self.assertEqual(
+            rows["vehicles"],
+            [
+                (
+                    VIN_NUMBER,
+                    "NISSAN",
+                    "Murano",
+                    2016,
+                    "S",
+                    "https://driving-tests.org/vin-decoder/images/logos/nissan.png",
+                )
+            ],
+        )
+        self.assertIn(
+            (VIN_NUMBER, "Decoded Details", "Make", "NISSAN"), rows["attributes"]
+        )
+        self.assertIn(
+            (VIN_NUMBER, "Additional Vehicle Info", "Body Class", "SUV"),
+            rows["attributes"],
+        )
+        self.assertEqual(len(rows["attributes"]), 9)
+        self.assertEqual(
+            sorted(rows["recalls"]),
+            [
+                (VIN_NUMBER, 1, "Component", "AIR BAGS"),
+                (VIN_NUMBER, 1, "Date", "2017-05-01"),
+                (VIN_NUMBER, 2, "Component", "ELECTRICALSYSTEM"),
+                (VIN_NUMBER, 2, "Date", "2018-02-11"),
+            ],
+        )
+        self.assertEqual(
+            sorted(rows["complaints"]),
+            [
+                (VIN_NUMBER, 1, "Date", "2019-01-03"),
+                (VIN_NUMBER, 1, "Summary", "Engine stalls while driving."),
+            ],
+        )
+        self.assertEqual(
+            rows["images"],
+            [
+                (VIN_NUMBER, 1, "https://example.com/1.jpg"),
+                (VIN_NUMBER, 2, "https://example.com/2.jpg"),
+            ],
+        )
+        for table, table_rows in rows.items():
+            for row in table_rows:
+                self.assertEqual(len(row), len(TABLES[table]))
+
+    def test_report(self):
+        self.assertEqual(
+            report_rows(VIN_NUMBER, Report.from_dict(self.data)),
+            report_rows(VIN_NUMBER, self.data),
+        )
+
+    def test_empty_report(self):
+        rows = report_rows(VIN_NUMBER, {})
+        self.assertEqual(rows["vehicles"], [(VIN_NUMBER, None, None, None, None, None)])
+        self.assertEqual(sum(len(table_rows) for table_rows in rows.values()), 1)
+
+    def test_exporter_is_abstract(self):
+        with self.assertRaises(TypeError):
+            Exporter()
+
+
+class ExporterTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.data = json.loads(fixture("result.json"))
+        self.rows = report_rows(VIN_NUMBER, self.data)
+
+    def results(self):
+        return [
+            {"vin": VIN_NUMBER, "status": "ok", "data": self.data},
+            {"vin": "00000000000000000", "status": "not_found", "data": None},
+        ]
+
+    def test_sqlite(self):
+        filename = os.path.join(self.directory, "vehicles.sqlite")
+        # Exporting a VIN again, in the same batch or another run, replaces its rows.
+        for _ in range(2):
+            with SQLiteExporter(filename) as exporter:
+                results = list(export_results(self.results() * 2, exporter))
+            self.assertEqual(results, self.results() * 2)
+            self.assertEqual(exporter.exported, 1)
+
+        conn = sqlite3.connect(filename)
+        self.addCleanup(conn.close)
+        for table, rows in self.rows.items():
+            with self.subTest(table=table):
+                self.assertEqual(
+                    sorted(conn.execute(f"SELECT * FROM {table}").fetchall()),
+                    sorted(rows),
+                )
+
+    def test_sqlite_batches(self):
+        filename = os.path.join(self.directory, "vehicles.sqlite")
+        with SQLiteExporter(filename, batch_size=2) as exporter:
+            for vin_number in ("1HGCM82633A004352", VIN_NUMBER, "1M8GDM9AXKP042788"):
+                exporter.write(vin_number, self.data)
+            self.assertEqual(exporter.exported, 2)
+        self.assertEqual(exporter.exported, 3)
+
+        conn = sqlite3.connect(filename)
+        self.addCleanup(conn.close)
+        self.assertEqual(
+            conn.execute(
+                "SELECT COUNT(*) FROM vehicles WHERE make = 'NISSAN'"
+            ).fetchone(),
+            (3,),
+        )
+
+    def test_csv(self):
+        with CSVExporter(self.directory) as exporter:
+            list(export_results(self.results(), exporter))
+
+        for table, columns in TABLES.items():
+            with self.subTest(table=table):
+                with open(
+                    os.path.join(self.directory, f"{table}.csv"),
+                    newline="",
+                    encoding="utf-8",
+                ) as csv_file:
+                    header, *rows = csv.reader(csv_file)
+                self.assertEqual(tuple(header), columns)
+                self.assertEqual(
+                    rows,
+                    [
+                        ["" if value is None else str(value) for value in row]
+                        for row in self.rows[table]
+                    ],
+                )
+
+    def test_parquet(self):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            self.skipTest("pyarrow is not installed")
+
+        with ParquetExporter(self.directory) as exporter:
+            list(export_results(self.results(), exporter))
+
+        for table, columns in TABLES.items():
+            with self.subTest(table=table):
+                (part,) = os.listdir(os.path.join(self.directory, table))
+                parquet = pq.read_table(os.path.join(self.directory, table, part))
+                self.assertEqual(tuple(parquet.column_names), columns)
+                self.assertEqual(
+                    [tuple(row.values()) for row in parquet.to_pylist()],
+                    self.rows[table],
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the plain HTTP lookups of `vehicle_history_reports.fetch`."""
+
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from vehicle_history_reports.fetch import FetchBackend, NeedsBrowser
+from vehicle_history_reports.parser import VinNotFound
+
+from tests import fixture
+
+VIN_NUMBER = "3AKJGLD57FSGD1225"
+
+CHALLENGE = b"""<!DOCTYPE html>
+<html><head><title>Just a moment...</title></head>
+<body><noscript>Please enable JavaScript and cookies to continue</noscript>
+<script src="/cdn-cgi/challenge-platform/orchestrate.js"></script></body></html>
+"""
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    # VIN searched for: HTTP status, headers and page answered with.
+    pages = {
+        VIN_NUMBER: (200, {}, fixture("result.html", "rb")),
+        "00000000000000000": (200, {}, fixture("not_found.html", "rb")),
+        "CHALLENGE00000000": (403, {}, CHALLENGE),
+        "CHALLENGE00000001": (503, {"cf-mitigated": "challenge"}, b"<html></html>"),
+        "UNAVAILABLE000000": (503, {}, b"<html><body>Down for maintenance</body></html>"),
+        "JAVASCRIPT0000000": (200, {}, fixture("search.html", "rb")),
+    }
+
+    def do_GET(self):
+        vin_number = parse_qs(urlparse(self.path).query).get("vin", [""])[0]
+        status, headers, content = self.pages[vin_number]
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        for header, value in headers.items():
+            self.send_header(header, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class FetchBackendTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        host, port = cls.server.server_address[:2]
+        cls.fetch = FetchBackend(url=f"http://{host}:{port}/vin-decoder/")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.fetch.close()
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_results_page(self):
+        data = self.fetch.fetch(VIN_NUMBER)
+        self.assertTrue(data["Decoded Details"])
+
+    def test_not_found(self):
+        with self.assertRaises(VinNotFound):
+            self.fetch.fetch("00000000000000000")
+
+    def test_challenge_needs_browser(self):
+        for vin_number in ("CHALLENGE00000000", "CHALLENGE00000001"):
+            with self.subTest(vin_number=vin_number):
+                with self.assertRaises(NeedsBrowser):
+                    self.fetch.fetch(vin_number)
+
+    def test_page_without_results_needs_browser(self):
+        with self.assertRaises(NeedsBrowser):
+            self.fetch.fetch("JAVASCRIPT0000000")
+
+    def test_other_errors_fail(self):
+        with self.assertRaises(requests.HTTPError):
+            self.fetch.fetch("UNAVAILABLE000000")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the Firefox settings of `vehicle_history_reports.firefox`."""
+
+import unittest
+
+from vehicle_history_reports.firefox import DEFAULT_BLOCKED_CONTENT, FirefoxSettings
+
+
+class FirefoxSettingsTest(unittest.TestCase):
+    def test_defaults(self):
+        settings = FirefoxSettings()
+        self.assertEqual(settings.blocked_content, DEFAULT_BLOCKED_CONTENT)
+        self.assertEqual(settings.page_load_strategy, "eager")
+        self.assertEqual(FirefoxSettings.stock().blocked_content, ())
+
+    def test_unknown_content_type(self):
+        with self.assertRaisesRegex(ValueError, "Unknown content types: scripts"):
+            FirefoxSettings(blocked_content=("image", "scripts"))
+
+    def test_unknown_page_load_strategy(self):
+        with self.assertRaisesRegex(ValueError, "Unknown page load strategy: lazy"):
+            FirefoxSettings(page_load_strategy="lazy")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the resumable batch jobs of `vehicle_history_reports.journal`."""
+
+import os
+import tempfile
+import unittest
+
+from vehicle_history_reports.journal import Journal, iter_job
+
+from tests import MockSiteTestCase
+
+# The mock site has no information for VINs starting with "0".
+VIN_NUMBERS = ["3AKJGLD57FSGD1225", "00000000000000000"]
+
+
+class JournalTest(MockSiteTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.filename = os.path.join(directory.name, "vins.txt.journal")
+
+    def test_resume_skips_finished_vins(self):
+        results = list(iter_job(VIN_NUMBERS, Journal(self.filename), fetch=self.fetch))
+        self.assertEqual([result["status"] for result in results], ["ok", "not_found"])
+        self.assertEqual(list(Journal(self.filename).pending(VIN_NUMBERS)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the lookup stage timings of `vehicle_history_reports.metrics`."""
+
+import unittest
+from unittest import mock
+
+from vehicle_history_reports.batch import _scrape
+from vehicle_history_reports.metrics import METRICS
+from vehicle_history_reports.vehicle_history_reports import VehicleHistoryReports
+
+from tests import PageDriver
+
+
+class StageTimingsTest(unittest.TestCase):
+    def setUp(self):
+        METRICS.reset()
+        self.addCleanup(METRICS.reset)
+
+    def test_extract_is_observed_once_per_lookup(self):
+        for _ in range(3):
+            vin_decoder = VehicleHistoryReports("3AKJGLD57FSGD1225", log_level="ERROR")
+            vin_decoder.attach(PageDriver())
+            with mock.patch.object(vin_decoder, "navigate_site"):
+                _scrape(vin_decoder)
+            self.assertEqual(list(vin_decoder.timings), ["parse", "extract"])
+        self.assertIn(
+            'vehicle_history_reports_stage_seconds_count{stage="extract"} 3',
+            METRICS.to_prometheus().splitlines(),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
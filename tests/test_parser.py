@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the strained page parsing of `vehicle_history_reports.parser`."""
+
+import json
+import os
+import unittest
+from unittest import mock
+
+from bs4 import BeautifulSoup
+
+from vehicle_history_reports import parser
+from vehicle_history_reports.parser import ReportParser, parse_report
+
+from tests import FIXTURES, fixture
+
+HTML_PARSERS = ["html.parser", "lxml"]
+
+# Pages the report nodes are hard to tell apart on, see benchmarks/fixtures/edge_cases.
+EDGE_CASES = os.path.join(FIXTURES, "edge_cases")
+
+
+def pages():
+    """Recorded results page and edge case pages by name"""
+    names = ["result.html"] + [
+        os.path.join("edge_cases", name) for name in sorted(os.listdir(EDGE_CASES))
+    ]
+    return {name: fixture(name) for name in names}
+
+
+class ReportParserTest(unittest.TestCase):
+    def setUp(self):
+        # Extraction errors of the edge case pages are expected, keep the output clean.
+        patcher = mock.patch.object(parser, "logger")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_parse(self):
+        expected = json.loads(fixture("result.json"))
+        for html_parser in HTML_PARSERS:
+            with self.subTest(html_parser=html_parser), mock.patch.object(
+                parser, "HTML_PARSER", html_parser
+            ):
+                self.assertEqual(ReportParser.parse(fixture("result.html")), expected)
+                self.assertEqual(
+                    ReportParser.parse(fixture("result.html", "rb")), expected
+                )
+
+    def test_strained_parse_matches_full_parse(self):
+        for html_parser in HTML_PARSERS:
+            for name, page in pages().items():
+                with self.subTest(html_parser=html_parser, page=name), mock.patch.object(
+                    parser, "HTML_PARSER", html_parser
+                ):
+                    self.assertEqual(
+                        ReportParser.parse(page),
+                        ReportParser.parse(BeautifulSoup(page, html_parser)),
+                    )
+
+    def test_only_report_nodes_are_built(self):
+        for html_parser in HTML_PARSERS:
+            with self.subTest(html_parser=html_parser), mock.patch.object(
+                parser, "HTML_PARSER", html_parser
+            ):
+                page = parse_report(fixture("result.html"))
+                self.assertIsNone(page.find("title"))
+                self.assertIsNone(page.find("input", attrs={"id": "vin_input"}))
+                self.assertEqual(len(page.find_all("img", class_="slick-slide")), 2)
+
+    def test_missing_sections_are_left_empty(self):
+        data = ReportParser.parse(fixture("edge_cases/missing_sections.html"))
+        self.assertEqual(
+            data["Decoded Details"], {"Make: ": "HONDA", "Model: ": "Accord"}
+        )
+        self.assertEqual(data["Additional Vehicle Info"], {})
+        self.assertEqual(data["Images Links"], {})
+        self.assertEqual(data["Most Recent Complaints"], {})
+        self.assertEqual(
+            data["Most Recent Recalls"],
+            {"recalls_1": {"Date": "2004-07-19", "Component": "BRAKES"}},
+        )
+
+    def test_nested_sections(self):
+        data = ReportParser.parse(fixture("edge_cases/nested_sections.html"))
+        self.assertEqual(
+            data["Decoded Details"],
+            {"Make: ": "TOYOTA", "Model: ": "Camry", "Engine": "2.5L I4"},
+        )
+        self.assertEqual(
+            [issue["Component"] for issue in data["Most Recent Recalls"].values()],
+            ["FUEL SYSTEM", "POWER TRAIN"],
+        )
+        self.assertEqual(
+            data["Most Recent Complaints"]["complaints_1"]["Summary"],
+            "Hesitates when accelerating.",
+        )
+        self.assertEqual(
+            data["Images Links"]["vehicle_images"], ["https://example.com/toyota-1.jpg"]
+        )
+
+    def test_extra_classes(self):
+        data = ReportParser.parse(fixture("edge_cases/extra_classes.html"))
+        # The first table of each class is the one read.
+        self.assertEqual(data["Decoded Details"], {"Make: ": "BMW", "Engine": "3.0L I6"})
+        self.assertEqual(data["Additional Vehicle Info"], {"Body Class": "SUV"})
+        self.assertEqual(
+            data["Images Links"]["vehicle_images"],
+            ["https://example.com/bmw-1.jpg", "https://example.com/bmw-2.jpg"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the proxy rotation of `vehicle_history_reports.proxy_pool`."""
+
+import unittest
+
+from vehicle_history_reports.proxy_pool import ProxyPool, ProxySettings
+
+PROXIES = [ProxySettings(host=f"10.0.0.{i}", port="3128") for i in range(3)]
+
+
+class ProxyPoolTest(unittest.TestCase):
+    def test_round_robin(self):
+        proxy_pool = ProxyPool(PROXIES)
+        self.assertEqual([proxy_pool.acquire() for _ in range(4)], PROXIES + PROXIES[:1])
+
+    def test_unknown_strategy(self):
+        with self.assertRaisesRegex(ValueError, "Unknown strategy: random"):
+            ProxyPool(PROXIES, strategy="random")
+
+    def test_no_proxies(self):
+        with self.assertRaisesRegex(ValueError, "No proxies given"):
+            ProxyPool([])
+
+
+if __name__ == "__main__":
+    unittest.main()
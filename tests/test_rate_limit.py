@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the adaptive rate limiting of `vehicle_history_reports.rate_limit`."""
+
+import random
+import unittest
+from urllib.parse import urlparse
+
+from vehicle_history_reports.batch import scrape_vin
+from vehicle_history_reports.rate_limit import RateLimiter
+
+from tests import MockSiteTestCase
+
+
+class RateLimiterTest(MockSiteTestCase):
+    site_options = {"failure_rate": 0.3}
+
+    def test_failure_below_threshold_keeps_rate(self):
+        limiter = RateLimiter(rate=1.0)
+        for outcome in ("error", "not_found", "error"):
+            limiter.report("site", None, outcome)
+            self.assertEqual(limiter.rates(), {("target", "site"): 1.0})
+        limiter.report("site", None, "ok")
+        self.assertEqual(limiter.rates(), {("target", "site"): 1.05})
+
+    def test_failed_lookups_never_raise_rate(self):
+        random.seed(1)
+        limiter = RateLimiter(rate=50.0, min_rate=20.0, increase=1.0)
+        key = ("target", urlparse(self.site.url).netloc)
+
+        outcomes = []
+        for count in range(40):
+            # Every fifth VIN is one the site has no information on.
+            vin_number = "00000000000000000" if count % 5 == 4 else "3AKJGLD57FSGD1225"
+            rate = limiter.rates().get(key, limiter.rate)
+            try:
+                scrape_vin(
+                    vin_number, fetch=self.fetch, rate_limiter=limiter, log_level="ERROR"
+                )
+            except Exception:
+                self.assertLessEqual(limiter.rates()[key], rate)
+                outcomes.append("failed")
+            else:
+                self.assertGreater(limiter.rates()[key], rate)
+                outcomes.append("ok")
+        self.assertIn("failed", outcomes)
+        self.assertGreater(self.site.server.statuses.get(503, 0), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the HTTP/JSON service of `vehicle_history_reports.server`."""
+
+import json
+import time
+import unittest
+
+import requests
+
+from vehicle_history_reports.server import ReportService
+
+from tests import MockSiteTestCase
+
+VIN_NUMBERS = ["3AKJGLD57FSGD1225", "1HGCM82633A004352"]
+
+
+class ReportServiceTest(MockSiteTestCase):
+    site_options = {"delay": 1.0}
+
+    def setUp(self):
+        super().setUp()
+        self.service = ReportService(workers=1, request_timeout=0.3, fetch=self.fetch)
+        self.addCleanup(self.service.close)
+        self.url = self.serve(self.service)
+
+    def test_batch_must_be_a_list(self):
+        for body in ("5", json.dumps(VIN_NUMBERS[0]), "null", "{"):
+            with self.subTest(body=body):
+                response = requests.post(f"{self.url}/batch", data=body, timeout=5)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("error", response.json())
+
+    def test_timed_out_lookup_is_not_run(self):
+        # The first lookup keeps the only worker busy past both time-outs.
+        for vin_number in VIN_NUMBERS:
+            response = requests.get(f"{self.url}/vin/{vin_number}", timeout=5)
+            self.assertEqual(response.status_code, 504)
+        time.sleep(1.5)
+        self.assertEqual(self.service.health()["queued"], 0)
+        self.assertEqual(sum(self.site.server.statuses.values()), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the data structure of `VehicleHistoryReports`."""
+
+import json
+import os
+import tempfile
+import unittest
+
+from vehicle_history_reports.report import dumps
+from vehicle_history_reports.vehicle_history_reports import (
+    DataStructure,
+    VehicleHistoryReports,
+)
+
+from tests import PageDriver
+
+
+class DataStructureTest(unittest.TestCase):
+    def setUp(self):
+        self.vin_decoder = VehicleHistoryReports("3AKJGLD57FSGD1225", log_level="ERROR")
+        self.vin_decoder.attach(PageDriver())
+        self.vin_decoder.get_vehicle_details()
+        self.vin_decoder.get_image_links()
+
+    def test_writes_are_kept(self):
+        self.vin_decoder.data_structure["Decoded Details"]["Make"] = "Tesla"
+        self.vin_decoder.data_structure["Notes"] = "checked"
+        data = json.loads(self.vin_decoder.data_as_json)
+        self.assertEqual(data["Decoded Details"]["Make"], "Tesla")
+        self.assertEqual(data["Notes"], "checked")
+
+    def test_assignment(self):
+        data = {"Decoded Details": {"Make": "Tesla"}}
+        self.vin_decoder.data_structure = data
+        self.assertIs(self.vin_decoder.data_structure, data)
+        self.assertEqual(self.vin_decoder.report.decoded_details["Make"], "Tesla")
+
+    def test_json_output(self):
+        self.assertEqual(
+            self.vin_decoder.data_as_json,
+            json.dumps(self.vin_decoder.data_structure, sort_keys=True),
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "data_structure.json")
+            self.vin_decoder.data_json_to_file(filename)
+            with open(filename) as json_file:
+                self.assertEqual(
+                    json_file.read(), json.dumps(self.vin_decoder.data_structure)
+                )
+
+    def test_fast_json(self):
+        self.vin_decoder.fast_json = True
+        self.vin_decoder.data_structure["Notes"] = "checked"
+        data = self.vin_decoder.data_structure
+        self.assertEqual(self.vin_decoder.data_as_json, dumps(data, sort_keys=True))
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "data_structure.json")
+            self.vin_decoder.data_json_to_file(filename)
+            with open(filename) as json_file:
+                self.assertEqual(json.load(json_file), data)
+
+    def test_sections(self):
+        self.assertEqual(
+            list(DataStructure.asdict()), sorted(self.vin_decoder.data_structure)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the VIN validation of `vehicle_history_reports.vin`."""
+
+import unittest
+
+from vehicle_history_reports.vin import (
+    InvalidVin,
+    VinFilter,
+    check_digit,
+    screen,
+    validate,
+    wmi,
+)
+
+# Well formed VINs, all but the last one with a valid check digit, the 9th character.
+VALID = [
+    "3AKJGLD57FSGD1225",
+    "1HGCM82633A004352",
+    "1M8GDM9AXKP042788",
+    "WP0ZZZ99ZTS392124",
+]
+
+
+class ValidateTest(unittest.TestCase):
+    def test_valid(self):
+        for vin_number in VALID:
+            with self.subTest(vin_number=vin_number):
+                self.assertEqual(validate(vin_number, check=False), vin_number)
+        for vin_number in VALID[:3]:
+            with self.subTest(vin_number=vin_number):
+                self.assertEqual(check_digit(vin_number), vin_number[8])
+                self.assertEqual(validate(vin_number), vin_number)
+
+    def test_normalizes(self):
+        self.assertEqual(validate(" 3akj-gld5 7fsgd1225 "), "3AKJGLD57FSGD1225")
+
+    def assertInvalid(self, vin_number, reason, check=True):
+        with self.assertRaises(InvalidVin) as raised:
+            validate(vin_number, check)
+        self.assertEqual(raised.exception.reason, reason)
+        self.assertEqual(raised.exception.vin_number, vin_number)
+
+    def test_wrong_length(self):
+        for vin_number in ("", "1HGCM82633A00435", "1HGCM82633A0043521"):
+            with self.subTest(vin_number=vin_number):
+                self.assertInvalid(vin_number, "length")
+
+    def test_never_used_characters(self):
+        for char in "IOQ":
+            vin_number = f"1HGCM82633A00{char}352"
+            with self.subTest(vin_number=vin_number):
+                self.assertInvalid(vin_number, "characters", check=False)
+        self.assertInvalid("1HGCM82633A00*352", "characters")
+
+    def test_wrong_check_digit(self):
+        self.assertInvalid("1HGCM82643A004352", "check_digit")
+        # Europe has no check digit, e.g. the "Z" of this Porsche.
+        self.assertInvalid(VALID[3], "check_digit")
+        self.assertEqual(validate("1HGCM82643A004352", check=False), "1HGCM82643A004352")
+
+    def test_check_digit_x(self):
+        self.assertEqual(check_digit("1M8GDM9AXKP042788"), "X")
+
+
+class WmiTest(unittest.TestCase):
+    def test_wmi(self):
+        self.assertEqual(wmi("1hgcm82633a004352"), "1HG")
+        self.assertEqual(wmi("WP0ZZZ99ZTS392124"), "WP0")
+
+    def test_small_manufacturer(self):
+        # A third character "9" is told apart by the 12th to 14th characters.
+        self.assertEqual(wmi("SA9RE123456789012"), "SA9789")
+
+
+class ScreenTest(unittest.TestCase):
+    def test_screen(self):
+        valid, rejected = screen(
+            ["3AKJGLD57FSGD1225", "bad", "3akj-gld5-7fsgd1225", "1HGCM82633A004352"]
+        )
+        self.assertEqual(valid, ["3AKJGLD57FSGD1225", "1HGCM82633A004352"])
+        self.assertEqual(
+            [(err.vin_number, err.reason) for err in rejected],
+            [("bad", "length"), ("3akj-gld5-7fsgd1225", "duplicate")],
+        )
+
+    def test_filter_keeps_order_and_rejects_repeats(self):
+        vin_filter = VinFilter()
+        self.assertEqual(vin_filter("1HGCM82633A004352"), "1HGCM82633A004352")
+        with self.assertRaises(InvalidVin) as raised:
+            vin_filter("1hgcm82633a004352")
+        self.assertEqual(raised.exception.reason, "duplicate")
+        # A rejected VIN is not remembered.
+        with self.assertRaises(InvalidVin):
+            vin_filter("1HGCM82643A004352")
+        self.assertEqual(vin_filter.seen, {"1HGCM82633A004352"})
+
+
+if __name__ == "__main__":
+    unittest.main()
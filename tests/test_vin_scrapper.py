@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the scripts/vin_scrapper.py command line."""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from vehicle_history_reports.work_queue import WorkQueue
+
+from tests import FIXTURES, fixture
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, "scripts", "vin_scrapper.py")
+
+
+class VinScrapperTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.output = os.path.join(self.directory, "output.json")
+
+    def run_script(self, *args):
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        subprocess.run(
+            [sys.executable, SCRIPT, "--loglevel", "ERROR", "--output", self.output]
+            + list(args),
+            check=True,
+            cwd=self.directory,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        with open(self.output) as output:
+            return json.load(output)
+
+    def test_from_html_ndjson_writes_output(self):
+        pages = os.path.join(self.directory, "pages")
+        os.mkdir(pages)
+        shutil.copy(os.path.join(FIXTURES, "result.html"), pages)
+        data = self.run_script("--from-html", pages, "--output-format", "ndjson")
+        self.assertEqual(data, {"result": json.loads(fixture("result.json"))})
+
+    def test_queue_ndjson_writes_output(self):
+        queue = os.path.join(self.directory, "vins.sqlite")
+        data = self.run_script(
+            "--queue", queue, "-v", "3AKJGLD57FSGD1225", "--output-format", "ndjson"
+        )
+        self.assertEqual(data["queued"], 1)
+        self.assertEqual(data["jobs"]["queued"], 1)
+
+    def test_queue_exports_only_its_own_results(self):
+        queue = os.path.join(self.directory, "vins.sqlite")
+        with WorkQueue(queue) as work_queue:
+            work_queue.enqueue(["3AKJGLD57FSGD1225"])
+            (lease,) = work_queue.lease("other-node")
+            data = json.loads(fixture("result.json"))
+            work_queue.complete(lease, data, "other-node")
+
+        export = os.path.join(self.directory, "tables")
+        for args in (["-v", "3AKJGLD57FSGD1225"],) * 3 + (["--work"],):
+            self.run_script(
+                "--queue", queue, "--export", export, "--export-format", "csv", *args
+            )
+        self.assertFalse(os.path.exists(os.path.join(export, "vehicles.csv")))
+
+
+if __name__ == "__main__":
+    unittest.main()
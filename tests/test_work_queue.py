@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the shared work queue of `vehicle_history_reports.work_queue`."""
+
+import os
+import tempfile
+import time
+import unittest
+
+from vehicle_history_reports.work_queue import WorkQueue, work
+
+from tests import MockSiteTestCase
+
+VIN_NUMBER = "3AKJGLD57FSGD1225"
+NOT_FOUND = "00000000000000000"
+
+
+class WorkQueueTest(MockSiteTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.filename = os.path.join(directory.name, "vins.sqlite")
+
+    def queue(self, **kwargs):
+        work_queue = WorkQueue(self.filename, retry_delay=0, **kwargs)
+        self.addCleanup(work_queue.close)
+        return work_queue
+
+    def test_lease_is_exclusive(self):
+        first, second = self.queue(), self.queue()
+        first.enqueue([VIN_NUMBER])
+        self.assertEqual(len(first.lease("first")), 1)
+        self.assertEqual(second.lease("second"), [])
+        self.assertEqual(second.counts()["leased"], 1)
+
+    def test_expired_lease_is_taken_over(self):
+        slow, other = self.queue(visibility_timeout=0.1), self.queue()
+        slow.enqueue([VIN_NUMBER])
+        (stale,) = slow.lease("slow")
+        self.assertEqual(other.lease("other"), [])
+        time.sleep(0.2)
+        (lease,) = other.lease("other")
+        self.assertEqual(lease.attempts, 2)
+
+        # The worker that lost the lease can no longer fail the job.
+        self.assertIsNone(slow.fail(stale, "Timed out"))
+        self.assertEqual(other.counts()["leased"], 1)
+
+        # Its result still counts if it is first, but only one result is recorded.
+        self.assertTrue(slow.complete(stale, {"worker": "slow"}, "slow"))
+        self.assertFalse(other.complete(lease, {"worker": "other"}, "other"))
+        (result,) = other.results()
+        self.assertEqual(result["worker"], "slow")
+        self.assertEqual(result["data"], {"worker": "slow"})
+        self.assertEqual(other.counts()["done"], 1)
+        self.assertIsNone(other.fail(lease, "Too late"))
+
+    def test_results_of_worker(self):
+        work_queue = self.queue()
+        work_queue.enqueue([VIN_NUMBER, NOT_FOUND])
+        first, second = work_queue.lease("first", count=2)
+        work_queue.complete(first, {"worker": "first"}, "first")
+        started = time.time()
+        work_queue.complete(second, {"worker": "second"}, "second")
+
+        def vins(**kwargs):
+            return [result["vin"] for result in work_queue.results(**kwargs)]
+
+        self.assertEqual(vins(), [VIN_NUMBER, NOT_FOUND])
+        self.assertEqual(vins(worker="first"), [VIN_NUMBER])
+        self.assertEqual(vins(since=started), [NOT_FOUND])
+        self.assertEqual(vins(worker="first", since=started), [])
+
+    def test_retries_then_dead(self):
+        work_queue = self.queue(max_attempts=2)
+        work_queue.enqueue([VIN_NUMBER])
+        (lease,) = work_queue.lease()
+        self.assertEqual(work_queue.fail(lease, "Timed out"), "queued")
+        (lease,) = work_queue.lease()
+        self.assertEqual(work_queue.fail(lease, "Timed out"), "dead")
+        self.assertEqual(
+            work_queue.dead_letters(),
+            [{"vin": VIN_NUMBER, "attempts": 2, "error": "Timed out"}],
+        )
+        self.assertEqual(work_queue.requeue_dead(), 1)
+        (lease,) = work_queue.lease()
+        self.assertEqual(lease.attempts, 1)
+
+    def test_work_does_not_retry_not_found(self):
+        work_queue = self.queue()
+        work_queue.enqueue([VIN_NUMBER, NOT_FOUND])
+
+        tally = work(work_queue, fetch=self.fetch, log_level="ERROR")
+        self.assertEqual(tally, {"done": 1, "duplicate": 0, "retried": 0, "dead": 1})
+        (dead,) = work_queue.dead_letters()
+        self.assertEqual((dead["vin"], dead["attempts"]), (NOT_FOUND, 1))
+        self.assertEqual([result["vin"] for result in work_queue.results()], [VIN_NUMBER])
+        self.assertEqual(self.site.server.statuses, {200: 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,4 +5,55 @@
 __author__ = """Mpho Mphego"""
 __email__ = "mpho112@gmail.com"
 
-from vehicle_history_reports.vehicle_history_reports import *
+import importlib
+
+__version__ = "0.1.0"
+
+# Public names and their modules, imported on first access so that e.g. a cache hit
+# does not pay for importing selenium.
+_LAZY_IMPORTS = {
+    "DataStructure": "vehicle_history_reports.parser",
+    "MissingPageSource": "vehicle_history_reports.parser",
+    "ProxyPool": "vehicle_history_reports.proxy_pool",
+    "ProxySettings": "vehicle_history_reports.proxy_pool",
+    "VinNotFound": "vehicle_history_reports.parser",
+    "InvalidVin": "vehicle_history_reports.vin",
+    "VehicleHistoryReports": "vehicle_history_reports.vehicle_history_reports",
+    "quit_driver": "vehicle_history_reports.vehicle_history_reports",
+    "reap_orphans": "vehicle_history_reports.vehicle_history_reports",
+    "AsyncVehicleHistoryReports": "vehicle_history_reports.aio",
+    "fetch_report": "vehicle_history_reports.aio",
+    "BrowserPool": "vehicle_history_reports.browser_pool",
+    "FetchBackend": "vehicle_history_reports.fetch",
+    "FirefoxSettings": "vehicle_history_reports.firefox",
+    "Journal": "vehicle_history_reports.journal",
+    "iter_job": "vehicle_history_reports.journal",
+    "WorkQueue": "vehicle_history_reports.work_queue",
+    "ReportCache": "vehicle_history_reports.cache",
+    "RateLimiter": "vehicle_history_reports.rate_limit",
+    "CSVExporter": "vehicle_history_reports.export",
+    "ParquetExporter": "vehicle_history_reports.export",
+    "SQLiteExporter": "vehicle_history_reports.export",
+    "ReportParser": "vehicle_history_reports.parser",
+    "Report": "vehicle_history_reports.report",
+    "parse_directory": "vehicle_history_reports.parser",
+    "ReportService": "vehicle_history_reports.server",
+    "serve": "vehicle_history_reports.server",
+    "iter_reports": "vehicle_history_reports.batch",
+    "scrape_many": "vehicle_history_reports.batch",
+    "scrape_vin": "vehicle_history_reports.batch",
+}
+
+__all__ = sorted(_LAZY_IMPORTS)
+
+
+def __getattr__(name):
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_IMPORTS[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
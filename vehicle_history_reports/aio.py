@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+
+"""Asyncio API for VIN lookups."""
+
+import asyncio
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from vehicle_history_reports.batch import lookup_result, rejected_result, scrape_vin
+from vehicle_history_reports.log import logger
+from vehicle_history_reports.metrics import METRICS
+from vehicle_history_reports.vin import InvalidVin, VinFilter, validate
+
+
+class AsyncVehicleHistoryReports:
+    def __init__(
+        self,
+        max_concurrency=4,
+        timeout=None,
+        headless=True,
+        max_uses=50,
+        settings=None,
+        cache=None,
+        fetch=None,
+        check_digit=True,
+        **kwargs,
+    ):
+        """Look up VINs from asyncio code without blocking the event loop.
+
+        The blocking browser work runs on a fixed set of threads, one warm browser
+        each, so any number of concurrent callers share `max_concurrency` browsers.
+
+        Args:
+            max_concurrency (int, optional): Maximum number of lookups running at once
+            timeout (float, optional): Default per lookup time-out in seconds
+            headless (bool, optional): Run browsers in headless mode
+            max_uses (int, optional): Restart a browser after this many lookups
+            settings (FirefoxSettings, optional): Profile and options to start the
+                browsers with, defaults to the lean ones
+            cache (ReportCache, optional): Serve VINs from and store them in this cache
+            fetch (FetchBackend, optional): Try plain HTTP lookups first
+            check_digit (bool, optional): Reject VINs with a wrong check digit
+            **kwargs: Passed on to `scrape_vin`, e.g. `proxy_pool` or `rate_limiter`,
+                and `VehicleHistoryReports`
+        """
+        self.max_concurrency = max_concurrency
+        self.headless = headless
+        self.max_uses = max_uses
+        self.settings = settings
+        self._timeout = timeout
+        self._cache = cache
+        self._fetch = fetch
+        self._check_digit = check_digit
+        self._kwargs = kwargs
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="vehicle_history_reports"
+        )
+        # A semaphore per event loop, the client may be used from several in turn.
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._semaphores_lock = threading.Lock()
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def _browser_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                from vehicle_history_reports.browser_pool import BrowserPool
+
+                self._pool = BrowserPool(
+                    size=self.max_concurrency,
+                    headless=self.headless,
+                    max_uses=self.max_uses,
+                    settings=self.settings,
+                )
+            return self._pool
+
+    def _lookup(self, vin_number, call, refresh, timings):
+        with call["lock"]:
+            call["thread_id"] = threading.get_ident()
+        try:
+            if call["cancelled"].is_set():
+                raise asyncio.CancelledError()
+            if self._cache is not None and not refresh:
+                with METRICS.time("cache", timings):
+                    data = self._cache.get(vin_number)
+                if data is not None:
+                    METRICS.inc("cache_hits")
+                    return data, True
+            data = scrape_vin(
+                vin_number,
+                pool=self._browser_pool(),
+                fetch=self._fetch,
+                timings=timings,
+                **self._kwargs,
+            )
+            if self._cache is not None:
+                self._cache.set(vin_number, data)
+            return data, False
+        finally:
+            # Past this point the thread may take the next call, see `_abort`.
+            with call["lock"]:
+                call["thread_id"] = None
+
+    def _abort(self, call):
+        """Quit the browser of a call still running, so that its lookup fails fast"""
+        with call["lock"]:
+            if call["thread_id"] is None or self._pool is None:
+                return
+            pooled = self._pool.lent(call["thread_id"])
+            if pooled is not None:
+                self._pool.abort(pooled)
+
+    def _semaphore(self, loop):
+        """Semaphore limiting the lookups started from an event loop"""
+        with self._semaphores_lock:
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                semaphore = self._semaphores[loop] = asyncio.Semaphore(
+                    self.max_concurrency
+                )
+            return semaphore
+
+    async def fetch_report(self, vin_number, timeout=None, refresh=False):
+        """Look up a single VIN.
+
+        Cancelling the call, or running out of time, aborts the lookup and drops the
+        browser it was using.
+
+        Args:
+            vin_number (str): VIN Number
+            timeout (float, optional): Time-out in seconds, defaults to the one given
+                to the constructor
+            refresh (bool, optional): Ignore cached data, but still update the cache
+
+        Returns:
+            dict: Vehicle data structure
+
+        Raises:
+            asyncio.TimeoutError: If the lookup did not finish in time
+            InvalidVin: If the VIN is invalid, before any lookup
+        """
+        vin_number = validate(vin_number, self._check_digit)
+        data, _ = await self._run(vin_number, timeout, refresh, {})
+        return data
+
+    async def _run(self, vin_number, timeout, refresh, timings):
+        """Look up a validated VIN on the worker threads, see `fetch_report`.
+
+        Returns:
+            tuple: Vehicle data structure, and whether it was served from the cache
+        """
+        timeout = self._timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        async with self._semaphore(loop):
+            call = {
+                "cancelled": threading.Event(),
+                "lock": threading.Lock(),
+                "thread_id": None,
+            }
+            future = loop.run_in_executor(
+                self._executor, self._lookup, vin_number, call, refresh, timings
+            )
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), timeout)
+            except (asyncio.CancelledError, asyncio.TimeoutError):
+                logger.warning("Aborting lookup of vin:{}", vin_number)
+                call["cancelled"].set()
+                # The lookup fails once aborted, nobody is left to retrieve its error.
+                future.add_done_callback(
+                    lambda done: done.cancelled() or done.exception()
+                )
+                loop.run_in_executor(None, self._abort, call)
+                raise
+
+    async def fetch_many(self, vin_numbers, timeout=None, refresh=False):
+        """Look up many VINs concurrently.
+
+        Invalid VINs are rejected and a repeated VIN is only looked up the first time,
+        like with `scrape_many`.
+
+        Args:
+            vin_numbers (list): VIN Numbers
+            timeout (float, optional): Per lookup time-out in seconds
+            refresh (bool, optional): Ignore cached data, but still update the cache
+
+        Returns:
+            list: One dict per VIN in input order, see `scrape_many`
+        """
+
+        async def lookup(vin_number):
+            timings = {}
+            try:
+                data, cached = await self._run(vin_number, timeout, refresh, timings)
+            except Exception as err:
+                return lookup_result(vin_number, error=err, timings=timings)
+            return lookup_result(vin_number, data, cached=cached, timings=timings)
+
+        async def rejected(err):
+            return rejected_result(err)
+
+        vin_filter = VinFilter(self._check_digit)
+        calls = []
+        for vin_number in vin_numbers:
+            try:
+                calls.append(lookup(vin_filter(vin_number)))
+            except InvalidVin as err:
+                calls.append(rejected(err))
+        return list(await asyncio.gather(*calls))
+
+    async def close(self):
+        """Quit the browsers and stop the worker threads"""
+        await asyncio.get_running_loop().run_in_executor(None, self._close)
+
+    def _close(self):
+        self._executor.shutdown(wait=True)
+        if self._pool is not None:
+            self._pool.close()
+
+
+async def fetch_report(vin_number, timeout=None, **kwargs):
+    """Look up a single VIN with a one-off `AsyncVehicleHistoryReports`.
+
+    Args:
+        vin_number (str): VIN Number
+        timeout (float, optional): Time-out in seconds
+        **kwargs: Passed on to `AsyncVehicleHistoryReports`
+
+    Returns:
+        dict: Vehicle data structure
+    """
+    async with AsyncVehicleHistoryReports(max_concurrency=1, **kwargs) as client:
+        return await client.fetch_report(vin_number, timeout=timeout)
@@ -0,0 +1,401 @@
+# -*- coding: utf-8 -*-
+
+"""Run VIN lookups in batches."""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from vehicle_history_reports.log import logger
+from vehicle_history_reports.metrics import METRICS
+from vehicle_history_reports.vin import InvalidVin, VinFilter, normalize
+
+
+def scrape_vin(
+    vin_number,
+    pool=None,
+    headless=True,
+    fetch=None,
+    proxy_pool=None,
+    settings=None,
+    timings=None,
+    rate_limiter=None,
+    **kwargs,
+):
+    """Look up a single VIN.
+
+    Args:
+        vin_number (str): VIN Number
+        pool (BrowserPool, optional): Borrow the browser from this pool, else start one
+        headless (bool, optional): Run browser in headless mode, ignored with a pool
+        fetch (FetchBackend, optional): Try a plain HTTP lookup first, falling back to
+            the browser when the page needs JavaScript
+        proxy_pool (ProxyPool, optional): Go through a proxy picked from this pool and
+            report back how it did. A plain HTTP lookup picks one, a pooled browser
+            keeps the one it was started with
+        settings (FirefoxSettings, optional): Browser profile and options, ignored with
+            a pool
+        timings (dict, optional): Add the seconds spent in each stage to this
+        rate_limiter (RateLimiter, optional): Wait for its go ahead and report back
+            how the lookup went
+        **kwargs: Passed on to `VehicleHistoryReports`
+
+    Returns:
+        dict: Vehicle data structure
+    """
+    timings = {} if timings is None else timings
+    try:
+        with METRICS.time("lookup", timings):
+            data = _scrape_vin(
+                vin_number,
+                pool,
+                headless,
+                fetch,
+                proxy_pool,
+                rate_limiter,
+                settings,
+                timings,
+                **kwargs,
+            )
+    except Exception as err:
+        METRICS.inc("lookups", status=_status(err))
+        raise
+    METRICS.inc("lookups", status="ok")
+    return data
+
+
+def _status(err):
+    from vehicle_history_reports.parser import MissingPageSource, VinNotFound
+
+    if isinstance(err, VinNotFound):
+        return "not_found"
+    if isinstance(err, MissingPageSource):
+        return "missing_page_source"
+    return "error"
+
+
+def result_status(err):
+    """Status of the result of a failed lookup, see `iter_reports`.
+
+    Args:
+        err (Exception): Why the lookup failed
+
+    Returns:
+        str: "rejected" for an invalid VIN, "duplicate" for a repeated one,
+            "not_found" if the site has no information for the VIN, else "error"
+    """
+    if isinstance(err, InvalidVin):
+        return "duplicate" if err.reason == "duplicate" else "rejected"
+    return "not_found" if _status(err) == "not_found" else "error"
+
+
+def lookup_result(vin_number, data=None, error=None, cached=False, timings=None):
+    """Result of a lookup in a batch, the same for every batch API, see `iter_reports`.
+
+    Args:
+        vin_number (str): VIN Number, normalized in the result
+        data (dict, optional): Vehicle data structure of a successful lookup
+        error (Exception, optional): Why the lookup failed
+        cached (bool, optional): Whether the data was served from the cache
+        timings (dict, optional): Seconds spent in each stage of the lookup
+
+    Returns:
+        dict: Result with keys `vin`, `status`, `data`, `error`, `cached` and
+            `timings`
+    """
+    return {
+        "vin": normalize(vin_number),
+        "status": "ok" if error is None else result_status(error),
+        "data": data if error is None else None,
+        "error": None if error is None else str(error) or error.__class__.__name__,
+        "cached": cached,
+        "timings": {} if timings is None else timings,
+    }
+
+
+def rejected_result(err):
+    """Result of a VIN rejected before any lookup, see `lookup_result`.
+
+    Args:
+        err (InvalidVin): Why it was rejected
+
+    Returns:
+        dict: Result with status "rejected" or "duplicate"
+    """
+    METRICS.inc("rejected", reason=err.reason)
+    if err.reason == "duplicate":
+        logger.info("Not looking up vin:{} again", err.vin_number)
+    else:
+        logger.warning("{}", err)
+    return lookup_result(err.vin_number, error=err)
+
+
+def _scrape_vin(
+    vin_number,
+    pool,
+    headless,
+    fetch,
+    proxy_pool,
+    rate_limiter,
+    settings,
+    timings,
+    **kwargs,
+):
+    started = None
+    if fetch is not None:
+        from vehicle_history_reports.fetch import NeedsBrowser
+        from vehicle_history_reports.proxy_pool import ProxySettings
+
+        if proxy_pool is not None:
+            proxy = proxy_pool.acquire()
+        else:
+            proxy = ProxySettings(**kwargs) if kwargs.get("host") else None
+        # A VIN takes one go ahead of the rate limiter, the browser reuses it.
+        started = _throttle(rate_limiter, fetch.url, proxy, timings)
+        try:
+            return _tracked(
+                lambda: fetch.fetch(vin_number, proxy=proxy, timings=timings),
+                fetch.url,
+                proxy,
+                proxy_pool,
+                rate_limiter,
+                started,
+                untracked=(NeedsBrowser,),
+            )
+        except NeedsBrowser as err:
+            logger.info("{}, falling back to the browser.", err)
+            METRICS.inc("fetch_fallbacks")
+            if proxy_pool is not None:
+                proxy_pool.release(proxy)
+
+    from vehicle_history_reports.vehicle_history_reports import VehicleHistoryReports
+
+    vin_decoder = VehicleHistoryReports(vin_number=vin_number, **kwargs)
+    vin_decoder.timings = timings
+
+    def lookup():
+        try:
+            vin_decoder.open_site(headless=headless, settings=settings)
+            _scrape(vin_decoder)
+        finally:
+            if vin_decoder.driver is not None:
+                vin_decoder.close_session()
+        return vin_decoder.data_structure
+
+    if pool is None:
+        if proxy_pool is not None:
+            vin_decoder.proxy = proxy_pool.acquire()
+        if started is None:
+            started = _throttle(rate_limiter, vin_decoder.url, vin_decoder.proxy, timings)
+        return _tracked(
+            lookup, vin_decoder.url, vin_decoder.proxy, proxy_pool, rate_limiter, started
+        )
+
+    # A pooled browser goes through the proxy it was started with, so that rotating
+    # proxies does not cost a browser start per lookup.
+    with pool.lend(vin_decoder.proxy, proxy_pool) as pooled:
+        vin_decoder.proxy = pooled.proxy
+        vin_decoder.attach(pooled.driver)
+        if started is None:
+            started = _throttle(rate_limiter, vin_decoder.url, pooled.proxy, timings)
+        return _tracked(
+            lookup, vin_decoder.url, pooled.proxy, proxy_pool, rate_limiter, started
+        )
+
+
+def _proxy_key(proxy):
+    return f"{proxy.host}:{proxy.port}" if proxy is not None else None
+
+
+def _throttle(rate_limiter, url, proxy, timings):
+    """Wait for the go ahead of the rate limiter.
+
+    Args:
+        rate_limiter (RateLimiter): Rate limiter, or None
+        url (str): Page to look up
+        proxy (ProxySettings): Proxy the lookup goes through, or None
+        timings (dict): Add the seconds spent waiting to this
+
+    Returns:
+        float: What `RateLimiter.acquire` returned, None without a rate limiter
+    """
+    if rate_limiter is None:
+        return None
+    with METRICS.time("throttle", timings):
+        return rate_limiter.acquire(urlparse(url).netloc, _proxy_key(proxy))
+
+
+def _tracked(lookup, url, proxy, proxy_pool, rate_limiter, started, untracked=()):
+    """Run a lookup, and report back how it went to the rate limiter and the proxy
+    pool.
+
+    Args:
+        lookup (callable): Looks the VIN up, returns the vehicle data structure
+        url (str): Page looked up
+        proxy (ProxySettings): Proxy the lookup goes through, or None
+        proxy_pool (ProxyPool): Pool `proxy` was picked from, or None
+        rate_limiter (RateLimiter): Rate limiter, or None
+        started (float): What `_throttle` returned for the VIN
+        untracked (tuple, optional): Errors reported to neither, e.g. a page that
+            needs the browser
+
+    Returns:
+        dict: Vehicle data structure
+    """
+    target = urlparse(url).netloc
+    proxy_key = _proxy_key(proxy)
+
+    def report(outcome, latency=None):
+        if rate_limiter is not None:
+            rate_limiter.report(target, proxy_key, outcome, started)
+        if proxy_pool is not None and proxy is not None:
+            proxy_pool.report(proxy, outcome, latency)
+
+    start = time.monotonic()
+    try:
+        data = lookup()
+    except untracked:
+        raise
+    except Exception as err:
+        report("not_found" if _status(err) == "not_found" else "error")
+        raise
+    report("ok", time.monotonic() - start)
+    return data
+
+
+def _scrape(vin_decoder):
+    vin_decoder.navigate_site()
+    # One "extract" observation per lookup, like `FetchBackend.fetch`.
+    with METRICS.time("extract", vin_decoder.timings):
+        vin_decoder.get_vehicle_details()
+        vin_decoder.get_recent_recalls()
+        vin_decoder.get_recent_complaints()
+        vin_decoder.get_image_links()
+
+
+def iter_reports(
+    vin_numbers,
+    workers=1,
+    headless=True,
+    max_uses=50,
+    cache=None,
+    refresh=False,
+    fetch=None,
+    settings=None,
+    check_digit=True,
+    **kwargs,
+):
+    """Look up many VINs concurrently, each worker on its own browser, and yield each
+    result as soon as it and the ones before it are done.
+
+    VINs are consumed lazily and only a few lookups are in flight at any time, so
+    memory stays flat however long `vin_numbers` is. A failing VIN does not abort the
+    batch, its error is recorded in its result.
+
+    VINs are normalized and validated first, an invalid one is rejected without a
+    lookup, see `vehicle_history_reports.vin`. A repeated one is only looked up the
+    first time, it gets a "duplicate" result every time after.
+
+    Args:
+        vin_numbers (iterable): VIN Numbers
+        workers (int, optional): Number of concurrent lookups/browsers
+        headless (bool, optional): Run browsers in headless mode
+        max_uses (int, optional): Restart a browser after this many lookups
+        cache (ReportCache, optional): Serve VINs from and store them in this cache,
+            no browser is started when every VIN is a cache hit
+        refresh (bool, optional): Ignore cached data, but still update the cache
+        fetch (FetchBackend, optional): Try plain HTTP lookups first, browsers are only
+            started for pages that need JavaScript
+        settings (FirefoxSettings, optional): Profile and options to start the browsers
+            with, defaults to the lean ones
+        check_digit (bool, optional): Reject VINs with a wrong check digit, turn off
+            for VINs from outside North America
+        **kwargs: Passed on to `scrape_vin`, e.g. `proxy_pool` or `rate_limiter`,
+            and `VehicleHistoryReports`
+
+    Yields:
+        dict: One per VIN in input order, with keys `vin` (normalized), `status`
+            ("ok", "not_found" if the site has no information for the VIN, "error",
+            "rejected" or "duplicate"), `data` (vehicle data structure),
+            `error` (error message), `cached` and `timings` (seconds spent in each
+            stage of the lookup)
+    """
+    pools = []
+    pool_lock = threading.Lock()
+
+    def browser_pool():
+        with pool_lock:
+            if not pools:
+                from vehicle_history_reports.browser_pool import BrowserPool
+
+                pools.append(
+                    BrowserPool(
+                        size=workers,
+                        headless=headless,
+                        max_uses=max_uses,
+                        settings=settings,
+                    )
+                )
+            return pools[0]
+
+    def lookup(vin_number):
+        timings = {}
+        if cache is not None and not refresh:
+            with METRICS.time("cache", timings):
+                data = cache.get(vin_number)
+            if data is not None:
+                METRICS.inc("cache_hits")
+                return lookup_result(vin_number, data, cached=True, timings=timings)
+        try:
+            data = scrape_vin(
+                vin_number, pool=browser_pool(), fetch=fetch, timings=timings, **kwargs
+            )
+        except Exception as err:
+            logger.error("Failed to look up vin:{}: {}", vin_number, err)
+            return lookup_result(vin_number, error=err, timings=timings)
+        if cache is not None:
+            cache.set(vin_number, data)
+        return lookup_result(vin_number, data, timings=timings)
+
+    def rejected(err):
+        future = Future()
+        future.set_result(rejected_result(err))
+        return future
+
+    vin_filter = VinFilter(check_digit)
+    pending = deque()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            try:
+                for vin_number in vin_numbers:
+                    try:
+                        future = executor.submit(lookup, vin_filter(vin_number))
+                    except InvalidVin as err:
+                        future = rejected(err)
+                    pending.append(future)
+                    if len(pending) >= 2 * workers:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+    finally:
+        if pools:
+            pools[0].close()
+
+
+def scrape_many(vin_numbers, workers=1, **kwargs):
+    """Look up many VINs concurrently, each worker on its own browser.
+
+    Args:
+        vin_numbers (list): VIN Numbers
+        workers (int, optional): Number of concurrent lookups/browsers
+        **kwargs: Passed on to `iter_reports`
+
+    Returns:
+        list: One dict per VIN in input order, see `iter_reports`
+    """
+    return list(iter_reports(vin_numbers, workers=workers, **kwargs))
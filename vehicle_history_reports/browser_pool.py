@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+
+"""Pool of warm Firefox browsers reused across VIN lookups."""
+
+import threading
+from contextlib import contextmanager
+
+from selenium.common.exceptions import WebDriverException
+
+from vehicle_history_reports.log import logger
+from vehicle_history_reports.metrics import METRICS
+from vehicle_history_reports.vehicle_history_reports import (
+    VehicleHistoryReports,
+    quit_driver,
+)
+
+
+class PooledDriver:
+    """
+    Browser lent out by a `BrowserPool`.
+
+    Attributes:
+        driver (webdriver.Firefox): Running browser
+        key (tuple): Proxy configuration the browser was started with, or the
+            `ProxyPool` its proxy was picked from
+        proxy (ProxySettings): Proxy the browser goes through for its whole life, or
+            None
+        proxy_pool (ProxyPool): Pool the proxy was picked from, or None
+        uses (int): Number of lookups the browser has served
+        aborted (bool): Quit by `BrowserPool.abort`, never handed out again
+    """
+
+    def __init__(self, driver, key, proxy=None, proxy_pool=None):
+        self.driver = driver
+        self.key = key
+        self.proxy = proxy
+        self.proxy_pool = proxy_pool
+        self.uses = 0
+        self.aborted = False
+
+    def __repr__(self):
+        return repr(
+            "<{}(key='{}', uses='{}') at 0x{:x}>".format(
+                self.__class__.__name__, self.key, self.uses, id(self)
+            )
+        )
+
+
+class BrowserPool:
+    def __init__(self, size=1, headless=True, timeout=60, max_uses=50, settings=None):
+        """Keep up to `size` browsers warm, each keyed by its proxy configuration.
+
+        Args:
+            size (int, optional): Maximum number of running browsers
+            headless (bool, optional): Run browsers in headless mode
+            timeout (int, optional): Web time-out
+            max_uses (int, optional): Recycle a browser after this many lookups
+            settings (FirefoxSettings, optional): Profile and options to start the
+                browsers with, defaults to the lean ones
+        """
+        self.size = size
+        self.headless = headless
+        self.settings = settings
+        self.max_uses = max_uses
+        self._timeout = timeout
+        self._idle = {}
+        self._count = 0
+        self._closed = False
+        self._lent = {}
+        self._cond = threading.Condition()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def _key(proxy):
+        return proxy.key if proxy else None
+
+    def _checkout(self, key):
+        """Take an idle browser for `key`, or reserve a slot for a new one.
+
+        Returns:
+            tuple: (idle browser or None if a slot was reserved, browser to retire)
+        """
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("BrowserPool is closed.")
+                if self._idle.get(key):
+                    return self._idle[key].pop(), None
+                if self._count < self.size:
+                    self._count += 1
+                    return None, None
+                # Pool is full, hand over the slot of an idle browser using another proxy.
+                for idle in self._idle.values():
+                    if idle:
+                        return None, idle.pop()
+                self._cond.wait()
+
+    def _free_slot(self):
+        with self._cond:
+            self._count -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _quit(pooled):
+        try:
+            quit_driver(pooled.driver)
+        except Exception as err:
+            logger.warning("Failed to quit browser {}: {}", pooled, err)
+
+    @staticmethod
+    def is_healthy(pooled):
+        """Check that the browser still responds to commands"""
+        try:
+            pooled.driver.current_url
+        except Exception:
+            return False
+        return True
+
+    def acquire(self, proxy=None, proxy_pool=None):
+        """Borrow a browser configured with `proxy`, starting one if needed.
+
+        With a `proxy_pool`, any browser started from that pool will do. A new one
+        goes through a proxy picked from the pool, and keeps it for its whole life,
+        so that rotating proxies does not cost a browser start per lookup.
+
+        Args:
+            proxy (ProxySettings, optional): Proxy settings
+            proxy_pool (ProxyPool, optional): Pick the proxy of a new browser from
+                this pool instead
+
+        Returns:
+            PooledDriver: Borrowed browser, hand it back with `release`
+        """
+        key = proxy_pool if proxy_pool is not None else self._key(proxy)
+        while True:
+            pooled, retired = self._checkout(key)
+            if retired:
+                logger.info("Retiring browser {} to make room", retired)
+                self._quit(retired)
+            if pooled is None:
+                if proxy_pool is not None:
+                    proxy = proxy_pool.acquire()
+                try:
+                    driver = VehicleHistoryReports.new_driver(
+                        proxy, self.headless, self._timeout, self.settings
+                    )
+                except Exception:
+                    self._free_slot()
+                    raise
+                return self._lend(PooledDriver(driver, key, proxy, proxy_pool))
+            if self.is_healthy(pooled):
+                return self._lend(pooled)
+            logger.warning("Discarding crashed browser {}", pooled)
+            METRICS.inc("browser_restarts", reason="crashed")
+            self._quit(pooled)
+            self._free_slot()
+
+    def _lend(self, pooled):
+        with self._cond:
+            self._lent[threading.get_ident()] = pooled
+        return pooled
+
+    def lent(self, thread_id=None):
+        """Browser lent to a thread.
+
+        Args:
+            thread_id (int, optional): `threading.get_ident()` of the borrowing thread,
+                defaults to the current one
+
+        Returns:
+            PooledDriver: Borrowed browser, None if the thread has none
+        """
+        with self._cond:
+            return self._lent.get(
+                threading.get_ident() if thread_id is None else thread_id
+            )
+
+    def abort(self, pooled):
+        """Quit a borrowed browser, so that the lookup blocked on it fails fast.
+
+        The browser is dropped from the pool when it is released, however the lookup
+        failed.
+
+        Args:
+            pooled (PooledDriver): Browser returned by `acquire` or `lent`
+        """
+        with self._cond:
+            if pooled.aborted:
+                return
+            pooled.aborted = True
+        logger.info("Aborting lookup on browser {}", pooled)
+        self._quit(pooled)
+
+    def release(self, pooled, healthy=True):
+        """Hand a borrowed browser back to the pool.
+
+        Args:
+            pooled (PooledDriver): Browser returned by `acquire`
+            healthy (bool, optional): False if the browser misbehaved and must be dropped
+        """
+        pooled.uses += 1
+        with self._cond:
+            if self._lent.get(threading.get_ident()) is pooled:
+                del self._lent[threading.get_ident()]
+            keep = (
+                healthy
+                and not pooled.aborted
+                and not self._closed
+                and pooled.uses < self.max_uses
+                # Start over with a healthy proxy rather than keep using a benched one.
+                and not (pooled.proxy_pool and pooled.proxy_pool.is_benched(pooled.proxy))
+            )
+            if keep:
+                self._idle.setdefault(pooled.key, []).append(pooled)
+                self._cond.notify()
+                return
+        if pooled.aborted:
+            # Already quit by `abort`.
+            METRICS.inc("browser_restarts", reason="aborted")
+        else:
+            logger.info("Recycling browser {}", pooled)
+            METRICS.inc("browser_restarts", reason="recycled" if healthy else "failed")
+            self._quit(pooled)
+        self._free_slot()
+
+    @contextmanager
+    def lend(self, proxy=None, proxy_pool=None):
+        """Borrow a browser for the duration of a `with` block, see `acquire`.
+
+        Yields:
+            PooledDriver: Borrowed browser, with the proxy it goes through
+        """
+        pooled = self.acquire(proxy, proxy_pool)
+        healthy = True
+        try:
+            yield pooled
+        except WebDriverException:
+            healthy = False
+            raise
+        finally:
+            self.release(pooled, healthy=healthy)
+
+    @contextmanager
+    def session(self, proxy=None, proxy_pool=None):
+        """Borrow a browser for the duration of a `with` block, see `acquire`"""
+        with self.lend(proxy, proxy_pool) as pooled:
+            yield pooled.driver
+
+    def close(self):
+        """Quit all idle browsers, borrowed ones are quit when released"""
+        with self._cond:
+            self._closed = True
+            idle = [pooled for drivers in self._idle.values() for pooled in drivers]
+            self._idle.clear()
+            self._count -= len(idle)
+            self._cond.notify_all()
+        for pooled in idle:
+            self._quit(pooled)
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+"""Persistent cache of vehicle data structures keyed by VIN."""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from vehicle_history_reports.log import logger
+
+DAY = 24 * 60 * 60
+
+DEFAULT_CACHE_FILE = os.path.join(
+    os.path.expanduser("~"), ".cache", "vehicle_history_reports", "reports.sqlite"
+)
+
+# Decoded details hardly ever change, recalls and complaints do.
+DEFAULT_TTL = {
+    "Additional Vehicle Info": 30 * DAY,
+    "Decoded Details": 30 * DAY,
+    "Images Links": 30 * DAY,
+    "Most Recent Complaints": DAY,
+    "Most Recent Recalls": DAY,
+}
+
+# Sections every report has, one left empty means its extraction failed.
+REQUIRED_SECTIONS = ("Decoded Details",)
+
+
+class ReportCache:
+    def __init__(
+        self,
+        filename=DEFAULT_CACHE_FILE,
+        ttl=None,
+        max_entries=10000,
+        required_sections=REQUIRED_SECTIONS,
+    ):
+        """SQLite backed cache, one row per VIN and data structure section.
+
+        Args:
+            filename (str, optional): SQLite file to keep the cache in
+            ttl (dict, optional): Seconds each section stays fresh, merged with
+                `DEFAULT_TTL`
+            max_entries (int, optional): Evict the least recently used VINs beyond
+                this many
+            required_sections (tuple, optional): Reports with one of these sections
+                empty are not stored
+        """
+        self.ttl = dict(DEFAULT_TTL, **(ttl or {}))
+        self.max_entries = max_entries
+        self.required_sections = required_sections
+        if filename != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(filename, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS reports ("
+                "vin TEXT NOT NULL, section TEXT NOT NULL, data TEXT NOT NULL, "
+                "stored_at REAL NOT NULL, accessed_at REAL NOT NULL, "
+                "PRIMARY KEY (vin, section))"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS reports_accessed_at ON reports (accessed_at)"
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get(self, vin_number, sections=None):
+        """Get the cached data structure of a VIN.
+
+        Args:
+            vin_number (str): VIN Number
+            sections (list, optional): Only these sections, defaults to all
+
+        Returns:
+            dict: Data structure, or None unless every requested section is fresh
+        """
+        sections = sections or list(self.ttl)
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT section, data, stored_at FROM reports WHERE vin = ?",
+                (vin_number,),
+            ).fetchall()
+            data = {
+                section: json.loads(value)
+                for section, value, stored_at in rows
+                if section in sections and now - stored_at < self.ttl.get(section, 0)
+            }
+            if len(data) != len(sections):
+                return None
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE reports SET accessed_at = ? WHERE vin = ?", (now, vin_number)
+                )
+        return data
+
+    def set(self, vin_number, data_structure):
+        """Store the data structure of a VIN, evicting old VINs if the cache is full.
+
+        Extractors log and skip a section they fail on, a report with an empty
+        required section is not stored so that the next lookup tries again.
+
+        Args:
+            vin_number (str): VIN Number
+            data_structure (dict): Vehicle data structure
+
+        Returns:
+            bool: Whether the data structure was stored
+        """
+        missing = [
+            section
+            for section in self.required_sections
+            if not data_structure.get(section)
+        ]
+        if missing:
+            logger.warning(
+                "Not caching vin:{}, its {} came out empty",
+                vin_number,
+                ", ".join(missing),
+            )
+            return False
+        now = time.time()
+        rows = [
+            (vin_number, section, json.dumps(value), now, now)
+            for section, value in data_structure.items()
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO reports VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self._evict()
+        return True
+
+    def _evict(self):
+        (count,) = self._conn.execute(
+            "SELECT COUNT(DISTINCT vin) FROM reports"
+        ).fetchone()
+        if count <= self.max_entries:
+            return
+        logger.info("Evicting {} VINs from the cache", count - self.max_entries)
+        self._conn.execute(
+            "DELETE FROM reports WHERE vin IN ("
+            "SELECT vin FROM reports GROUP BY vin ORDER BY MAX(accessed_at) LIMIT ?)",
+            (count - self.max_entries,),
+        )
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+
+"""Bulk export of reports into normalized tables: SQLite, CSV or Parquet."""
+
+import abc
+import csv
+import os
+import sqlite3
+import time
+
+from vehicle_history_reports.log import logger
+from vehicle_history_reports.report import ADDITIONAL_INFO, DECODED_DETAILS, Report
+
+# Tables and their columns.
+TABLES = {
+    "vehicles": ("vin", "make", "model", "year", "trim", "vehicle_logo"),
+    "attributes": ("vin", "section", "name", "value"),
+    "recalls": ("vin", "number", "name", "value"),
+    "complaints": ("vin", "number", "name", "value"),
+    "images": ("vin", "position", "url"),
+}
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS vehicles (
+    vin TEXT PRIMARY KEY,
+    make TEXT,
+    model TEXT,
+    year INTEGER,
+    trim TEXT,
+    vehicle_logo TEXT
+);
+CREATE INDEX IF NOT EXISTS vehicles_make_model ON vehicles (make, model, year);
+CREATE INDEX IF NOT EXISTS vehicles_model ON vehicles (model);
+CREATE TABLE IF NOT EXISTS attributes (
+    vin TEXT NOT NULL, section TEXT NOT NULL, name TEXT NOT NULL, value TEXT
+);
+CREATE INDEX IF NOT EXISTS attributes_vin ON attributes (vin);
+CREATE INDEX IF NOT EXISTS attributes_name ON attributes (name, value);
+CREATE TABLE IF NOT EXISTS recalls (
+    vin TEXT NOT NULL, number INTEGER NOT NULL, name TEXT NOT NULL, value TEXT
+);
+CREATE INDEX IF NOT EXISTS recalls_vin ON recalls (vin);
+CREATE TABLE IF NOT EXISTS complaints (
+    vin TEXT NOT NULL, number INTEGER NOT NULL, name TEXT NOT NULL, value TEXT
+);
+CREATE INDEX IF NOT EXISTS complaints_vin ON complaints (vin);
+CREATE TABLE IF NOT EXISTS images (
+    vin TEXT NOT NULL, position INTEGER NOT NULL, url TEXT
+);
+CREATE INDEX IF NOT EXISTS images_vin ON images (vin);
+"""
+
+
+def attribute_name(name):
+    """Decoded details labels read e.g. "Make: ", strip them down to "Make"."""
+    return name.strip().rstrip(":").strip()
+
+
+def report_rows(vin_number, data):
+    """Flatten a vehicle data structure into rows of each table.
+
+    Args:
+        vin_number (str): VIN Number
+        data (dict|Report): Vehicle data structure or report
+
+    Returns:
+        dict: Rows, tuples in the column order of `TABLES`, keyed by table
+    """
+    report = data if isinstance(data, Report) else Report.from_dict(data)
+    rows = {table: [] for table in TABLES}
+    decoded = {}
+    for section, fields in (
+        (DECODED_DETAILS, report.decoded_details),
+        (ADDITIONAL_INFO, report.additional_info),
+    ):
+        for name, value in fields.items():
+            name = attribute_name(name)
+            rows["attributes"].append((vin_number, section, name, value))
+            if section == DECODED_DETAILS:
+                decoded.setdefault(name.lower(), value)
+    year = decoded.get("year", "")
+    rows["vehicles"].append(
+        (
+            vin_number,
+            decoded.get("make"),
+            decoded.get("model"),
+            int(year) if year.isdigit() else None,
+            decoded.get("trim"),
+            report.images.vehicle_logo,
+        )
+    )
+    for table, issues in (("recalls", report.recalls), ("complaints", report.complaints)):
+        for number, issue in enumerate(issues, 1):
+            for name, value in issue.items():
+                rows[table].append((vin_number, number, name, value))
+    for position, url in enumerate(report.images.vehicle_images or (), 1):
+        rows["images"].append((vin_number, position, url))
+    return rows
+
+
+class Exporter(abc.ABC):
+    def __init__(self, batch_size=1000):
+        """Write reports out in batches, the latest report of a VIN in a batch wins.
+
+        Args:
+            batch_size (int, optional): Reports to buffer before writing them out
+        """
+        self.batch_size = batch_size
+        self.exported = 0
+        self._pending = {}
+
+    def write(self, vin_number, data):
+        """Queue a report for export, the batch is written out once it is full.
+
+        Args:
+            vin_number (str): VIN Number
+            data (dict|Report): Vehicle data structure or report
+        """
+        self._pending[vin_number] = report_rows(vin_number, data)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write out the queued reports"""
+        if not self._pending:
+            return
+        tables = {table: [] for table in TABLES}
+        for rows in self._pending.values():
+            for table, table_rows in rows.items():
+                tables[table].extend(table_rows)
+        self._write_batch(list(self._pending), tables)
+        self.exported += len(self._pending)
+        logger.debug("Exported {} reports", self.exported)
+        self._pending.clear()
+
+    @abc.abstractmethod
+    def _write_batch(self, vin_numbers, tables):
+        """Write out a batch of reports.
+
+        Args:
+            vin_numbers (list): VIN Numbers in the batch
+            tables (dict): Rows of the batch keyed by table, see `report_rows`
+        """
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SQLiteExporter(Exporter):
+    def __init__(self, filename, batch_size=1000):
+        """Export into a SQLite database, indexed on VIN, make and model.
+
+        Exporting a VIN again replaces its rows.
+
+        Args:
+            filename (str): Database file, created if it does not exist
+            batch_size (int, optional): Reports per transaction
+        """
+        super().__init__(batch_size)
+        self.filename = filename
+        self._conn = sqlite3.connect(filename)
+        self._conn.executescript(SQLITE_SCHEMA)
+
+    def _write_batch(self, vin_numbers, tables):
+        with self._conn:
+            for table in TABLES:
+                self._conn.executemany(
+                    f"DELETE FROM {table} WHERE vin = ?",
+                    [(vin_number,) for vin_number in vin_numbers],
+                )
+            for table, rows in tables.items():
+                placeholders = ", ".join("?" * len(TABLES[table]))
+                self._conn.executemany(
+                    f"INSERT INTO {table} VALUES ({placeholders})", rows
+                )
+
+    def close(self):
+        super().close()
+        self._conn.close()
+
+
+class CSVExporter(Exporter):
+    def __init__(self, directory, batch_size=1000):
+        """Export into a CSV file per table, `<directory>/<table>.csv`.
+
+        Rows are appended, a VIN exported by several runs appears once per run.
+
+        Args:
+            directory (str): Directory for the files, created if it does not exist
+            batch_size (int, optional): Reports to buffer before writing them out
+        """
+        super().__init__(batch_size)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _write_batch(self, vin_numbers, tables):
+        for table, rows in tables.items():
+            filename = os.path.join(self.directory, f"{table}.csv")
+            new_file = not os.path.exists(filename)
+            with open(filename, "a", newline="", encoding="utf-8") as csv_file:
+                writer = csv.writer(csv_file)
+                if new_file:
+                    writer.writerow(TABLES[table])
+                writer.writerows(rows)
+
+
+class ParquetExporter(Exporter):
+    def __init__(self, directory, batch_size=10000):
+        """Export into Parquet, one file per table and run, with a row group per batch:
+        `<directory>/<table>/part-<time>-<pid>.parquet`.
+
+        Needs pyarrow, e.g. `pip install pyarrow`.
+
+        Args:
+            directory (str): Directory for the tables, created if it does not exist
+            batch_size (int, optional): Reports per row group
+        """
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError(
+                "Parquet export needs pyarrow, install it with `pip install pyarrow`."
+            ) from None
+
+        super().__init__(batch_size)
+        self.directory = directory
+        self._part = f"part-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}.parquet"
+        self._writers = {}
+        number = ("number", pa.int32())
+        self._schemas = {
+            "vehicles": pa.schema(
+                [
+                    ("vin", pa.string()),
+                    ("make", pa.string()),
+                    ("model", pa.string()),
+                    ("year", pa.int32()),
+                    ("trim", pa.string()),
+                    ("vehicle_logo", pa.string()),
+                ]
+            ),
+            "attributes": pa.schema(
+                [(column, pa.string()) for column in TABLES["attributes"]]
+            ),
+            "recalls": pa.schema(
+                [
+                    ("vin", pa.string()),
+                    number,
+                    ("name", pa.string()),
+                    ("value", pa.string()),
+                ]
+            ),
+            "complaints": pa.schema(
+                [
+                    ("vin", pa.string()),
+                    number,
+                    ("name", pa.string()),
+                    ("value", pa.string()),
+                ]
+            ),
+            "images": pa.schema(
+                [("vin", pa.string()), ("position", pa.int32()), ("url", pa.string())]
+            ),
+        }
+
+    def _write_batch(self, vin_numbers, tables):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        for table, rows in tables.items():
+            if table not in self._writers:
+                os.makedirs(os.path.join(self.directory, table), exist_ok=True)
+                self._writers[table] = pq.ParquetWriter(
+                    os.path.join(self.directory, table, self._part), self._schemas[table]
+                )
+            columns = list(zip(*rows)) if rows else [()] * len(TABLES[table])
+            self._writers[table].write_table(
+                pa.Table.from_arrays(
+                    [list(column) for column in columns], schema=self._schemas[table]
+                )
+            )
+
+    def close(self):
+        super().close()
+        for writer in self._writers.values():
+            writer.close()
+
+
+EXPORTERS = {"sqlite": SQLiteExporter, "csv": CSVExporter, "parquet": ParquetExporter}
+
+
+def export_results(results, exporter):
+    """Pass results through, exporting the successful ones on the way.
+
+    Args:
+        results (iterable): Results as yielded by `iter_reports`
+        exporter (Exporter): Where to export to
+
+    Yields:
+        dict: The results
+    """
+    for result in results:
+        if result.get("status") == "ok" and result.get("data"):
+            exporter.write(result["vin"], result["data"])
+        yield result
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+"""Look up VINs over plain HTTP, without a browser."""
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from vehicle_history_reports.log import logger
+from vehicle_history_reports.metrics import METRICS
+from vehicle_history_reports.parser import URL, ReportParser, VinNotFound, parse_report
+from vehicle_history_reports.proxy_pool import ProxySettings
+
+USER_AGENT = (
+    "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:68.0) Gecko/20100101 Firefox/68.0"
+)
+
+# Bot protection answers with one of these, and a page that runs a JavaScript check or
+# a captcha before letting a browser through.
+CHALLENGE_STATUSES = frozenset([403, 503])
+CHALLENGE_MARKERS = (b"<script", b"captcha", b"challenge", b"enable javascript")
+
+
+class NeedsBrowser(Exception):
+    """The page can not be scraped without running its JavaScript"""
+
+
+def is_challenge(response):
+    """Whether an error response is a bot check page, which a browser may pass"""
+    if response.status_code not in CHALLENGE_STATUSES:
+        return False
+    if response.headers.get("cf-mitigated") == "challenge":
+        return True
+    content = response.content.lower()
+    return any(marker in content for marker in CHALLENGE_MARKERS)
+
+
+class FetchBackend:
+    def __init__(
+        self,
+        url=URL,
+        method="GET",
+        field="vin",
+        timeout=60,
+        pool_size=10,
+        **kwargs,
+    ):
+        """Submit the VIN decoder form over HTTP, with pooled keep-alive connections.
+
+        Args:
+            url (str, optional): VIN decoder URL the form is submitted to
+            method (str, optional): HTTP method of the form
+            field (str, optional): Name of the form field holding the VIN
+            timeout (int, optional): Web time-out
+            pool_size (int, optional): Connections kept alive, at least the number of
+                concurrent lookups
+            **kwargs: Proxy `host`, `port`, `username` and `password`
+        """
+        self.url = url
+        self.method = method.upper()
+        self.field = field
+        self._timeout = timeout
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if kwargs.get("host"):
+            self.session.proxies = self._proxies(ProxySettings(**kwargs))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def _proxies(proxy):
+        credentials = ""
+        if proxy.username and proxy.password:
+            credentials = f"{proxy.username}:{proxy.password}@"
+        proxy_url = f"http://{credentials}{proxy.host}:{proxy.port}"
+        return {"http": proxy_url, "https": proxy_url}
+
+    def fetch(self, vin_number, proxy=None, timings=None):
+        """Look up a single VIN.
+
+        Args:
+            vin_number (str): VIN Number
+            proxy (ProxySettings, optional): Proxy to use instead of the session's one
+            timings (dict, optional): Add the seconds spent in each stage to this
+
+        Returns:
+            dict: Vehicle data structure
+
+        Raises:
+            VinNotFound: If the site has no information for the VIN
+            NeedsBrowser: If the results are only rendered by JavaScript, or the site
+                answered with a bot check page
+            requests.HTTPError: If the site answered with any other error
+        """
+        logger.info("Fetching VIN: '{}' information from {}", vin_number, self.url)
+        params = {self.field: vin_number}
+        with METRICS.time("fetch", timings):
+            response = self.session.request(
+                self.method,
+                self.url,
+                timeout=self._timeout,
+                proxies=self._proxies(proxy) if proxy else None,
+                **({"params": params} if self.method == "GET" else {"data": params}),
+            )
+        if not response.ok and is_challenge(response):
+            raise NeedsBrowser(
+                f"Bot check page ({response.status_code}) served for vin:{vin_number}"
+            )
+        response.raise_for_status()
+        with METRICS.time("parse", timings):
+            page_source = parse_report(response.content)
+
+        results = page_source.find(attrs={"id": "nhtsa-26"})
+        if results is not None and results.text.strip():
+            logger.info("Found VIN information, Scrapping data.")
+            with METRICS.time("extract", timings):
+                return ReportParser.parse(page_source, url=self.url)
+        error_report = page_source.find(attrs={"class": "error-report"})
+        if (
+            error_report is not None
+            and "we could not find information" in error_report.text
+        ):
+            msg = f"Could not find information for vin:{vin_number}"
+            logger.error(msg)
+            raise VinNotFound(msg)
+        raise NeedsBrowser(f"No VIN information in the page served for vin:{vin_number}")
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+
+"""Lean Firefox profile and options, skipping everything the scraper does not need."""
+
+import os
+
+# Content types that can be blocked and the preferences that block them.
+CONTENT_PREFERENCES = {
+    "image": {"permissions.default.image": 2},
+    "stylesheet": {"permissions.default.stylesheet": 2},
+    "font": {
+        "gfx.downloadable_fonts.enabled": False,
+        "browser.display.use_document_fonts": 0,
+    },
+    "media": {"media.autoplay.default": 5, "media.autoplay.blocking_policy": 2},
+    "flash": {
+        "dom.ipc.plugins.enabled.libflashplayer.so": "false",
+        "plugin.state.flash": 0,
+    },
+    "websocket": {"network.websocket.enabled": False},
+}
+
+DEFAULT_BLOCKED_CONTENT = ("image", "font", "media", "flash", "websocket")
+
+# Ads, analytics and other third parties the decoder page pulls in.
+DEFAULT_BLOCKED_DOMAINS = (
+    "adnxs.com",
+    "adservice.google.com",
+    "amazon-adsystem.com",
+    "doubleclick.net",
+    "facebook.com",
+    "facebook.net",
+    "google-analytics.com",
+    "googlesyndication.com",
+    "googletagmanager.com",
+    "googletagservices.com",
+    "hotjar.com",
+    "moatads.com",
+    "quantserve.com",
+    "scorecardresearch.com",
+    "taboola.com",
+    "twitter.com",
+    "youtube.com",
+)
+
+CACHE_PREFERENCES = {
+    "browser.cache.disk.enable": False,
+    "browser.cache.offline.enable": False,
+    "network.prefetch-next": False,
+    "network.dns.disablePrefetch": True,
+    "network.http.speculative-parallel-limit": 0,
+}
+
+TELEMETRY_PREFERENCES = {
+    "app.normandy.enabled": False,
+    "app.update.auto": False,
+    "app.update.enabled": False,
+    "browser.newtabpage.enabled": False,
+    "browser.ping-centre.telemetry": False,
+    "browser.safebrowsing.downloads.enabled": False,
+    "browser.safebrowsing.malware.enabled": False,
+    "browser.safebrowsing.phishing.enabled": False,
+    "browser.shell.checkDefaultBrowser": False,
+    "browser.startup.homepage": "about:blank",
+    "browser.startup.page": 0,
+    "datareporting.healthreport.uploadEnabled": False,
+    "datareporting.policy.dataSubmissionEnabled": False,
+    "extensions.update.enabled": False,
+    "privacy.trackingprotection.enabled": True,
+    "toolkit.telemetry.enabled": False,
+    "toolkit.telemetry.unified": False,
+}
+
+# Blocked domains are routed to this closed port by the proxy auto-config script.
+BLACKHOLE = "PROXY 127.0.0.1:9"
+
+
+class FirefoxSettings:
+    def __init__(
+        self,
+        blocked_content=DEFAULT_BLOCKED_CONTENT,
+        blocked_domains=DEFAULT_BLOCKED_DOMAINS,
+        page_load_strategy="eager",
+        disable_cache=True,
+        disable_telemetry=True,
+    ):
+        """Firefox profile and options for scraping, lean by default.
+
+        Args:
+            blocked_content (tuple, optional): Content types not to load, any of the
+                `CONTENT_PREFERENCES` keys
+            blocked_domains (tuple, optional): Domains, and their subdomains, not to
+                load anything from
+            page_load_strategy (str, optional): "normal" waits for the whole page to
+                load, "eager" for the DOM only, "none" does not wait
+            disable_cache (bool, optional): Disable the disk cache and prefetching
+            disable_telemetry (bool, optional): Disable telemetry, updates, safe
+                browsing and trackers
+
+        Raises:
+            ValueError: If a content type or the page load strategy is unknown
+        """
+        unknown = set(blocked_content) - set(CONTENT_PREFERENCES)
+        if unknown:
+            raise ValueError(f"Unknown content types: {', '.join(sorted(unknown))}")
+        if page_load_strategy not in ("normal", "eager", "none"):
+            raise ValueError(f"Unknown page load strategy: {page_load_strategy}")
+        self.blocked_content = tuple(blocked_content)
+        self.blocked_domains = tuple(blocked_domains)
+        self.page_load_strategy = page_load_strategy
+        self.disable_cache = disable_cache
+        self.disable_telemetry = disable_telemetry
+
+    @classmethod
+    def stock(cls):
+        """Settings of a stock Firefox, nothing blocked or disabled"""
+        return cls(
+            blocked_content=(),
+            blocked_domains=(),
+            page_load_strategy="normal",
+            disable_cache=False,
+            disable_telemetry=False,
+        )
+
+    def options(self, headless=False):
+        """Firefox options
+
+        Args:
+            headless (bool, optional): Run browser in headless mode
+        """
+        from selenium.webdriver.firefox.options import Options
+
+        options = Options()
+        options.headless = headless
+        options.set_capability("pageLoadStrategy", self.page_load_strategy)
+        return options
+
+    def profile(self, proxy=None):
+        """Firefox profile
+
+        Args:
+            proxy (ProxySettings, optional): Proxy to route the browser through
+        """
+        from selenium import webdriver
+
+        firefox_profile = webdriver.FirefoxProfile()
+        for content in self.blocked_content:
+            for preference, value in CONTENT_PREFERENCES[content].items():
+                firefox_profile.set_preference(preference, value)
+        if self.disable_cache:
+            for preference, value in CACHE_PREFERENCES.items():
+                firefox_profile.set_preference(preference, value)
+        if self.disable_telemetry:
+            for preference, value in TELEMETRY_PREFERENCES.items():
+                firefox_profile.set_preference(preference, value)
+
+        if self.blocked_domains:
+            self._set_proxy_autoconfig(firefox_profile, proxy)
+        elif proxy:
+            self._set_proxy(firefox_profile, proxy)
+        if proxy and proxy.username and proxy.password:
+            firefox_profile.set_preference("network.proxy.socks_username", proxy.username)
+            firefox_profile.set_preference("network.proxy.socks_password", proxy.password)
+        # Deprecated
+        # firefox_profile.add_extension('close_proxy_authentication-1.1.xpi')
+        # credentials = f"{self.proxy.username}:{self.proxy.password}"
+        # credentials = b64encode(credentials.encode("ascii")).decode("utf-8")
+        # firefox_profile.set_preference("extensions.closeproxyauth.authtoken", credentials)
+        firefox_profile.update_preferences()
+        return firefox_profile
+
+    @staticmethod
+    def _set_proxy(firefox_profile, proxy):
+        """Simplified Firefox Proxy settings"""
+        # Direct = 0, Manual = 1, PAC = 2, AUTODETECT = 4, SYSTEM = 5
+        firefox_profile.set_preference("network.proxy.type", 1)
+        firefox_profile.set_preference("signon.autologin.proxy", True)
+        firefox_profile.set_preference("network.proxy.http", proxy.host)
+        firefox_profile.set_preference("network.proxy.http_port", int(proxy.port))
+        firefox_profile.set_preference("network.proxy.ssl", proxy.host)
+        firefox_profile.set_preference("network.proxy.ssl_port", int(proxy.port))
+        # firefox_profile.set_preference("network.automatic-ntlm-auth.allow-proxies", False)
+        # firefox_profile.set_preference("network.negotiate-auth.allow-proxies", False)
+        firefox_profile.set_preference(
+            "network.proxy.no_proxies_on", "localhost, 127.0.0.1"
+        )
+
+    def _set_proxy_autoconfig(self, firefox_profile, proxy):
+        """Route blocked domains nowhere, and everything else through `proxy` if any,
+        with a proxy auto-config script kept in the profile"""
+        route = f"PROXY {proxy.host}:{proxy.port}" if proxy else "DIRECT"
+        blocked = " ||\n        ".join(
+            f'dnsDomainIs(host, ".{domain}") || host == "{domain}"'
+            for domain in self.blocked_domains
+        )
+        script = (
+            "function FindProxyForURL(url, host) {\n"
+            '    if (isPlainHostName(host) || host == "127.0.0.1") return "DIRECT";\n'
+            f"    if ({blocked}) return {BLACKHOLE!r};\n"
+            f"    return {route!r};\n"
+            "}\n"
+        )
+        pac_file = os.path.join(firefox_profile.path, "blocklist.pac")
+        with open(pac_file, "w") as autoconfig:
+            autoconfig.write(script)
+        # Direct = 0, Manual = 1, PAC = 2, AUTODETECT = 4, SYSTEM = 5
+        firefox_profile.set_preference("network.proxy.type", 2)
+        firefox_profile.set_preference(
+            "network.proxy.autoconfig_url", f"file://{pac_file}"
+        )
+        firefox_profile.set_preference("signon.autologin.proxy", True)
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+"""Checkpoint journal for resumable batch jobs."""
+
+import json
+import os
+
+from vehicle_history_reports.batch import iter_reports
+from vehicle_history_reports.log import logger
+from vehicle_history_reports.metrics import METRICS
+from vehicle_history_reports.vin import normalize
+
+# Looking up again a VIN the site has no information for, or an invalid one, would not
+# help.
+FINISHED = ("ok", "not_found", "rejected")
+
+
+def read_job_file(filename):
+    """Read VIN numbers from a job file, one per line.
+
+    Blank lines and lines starting with `#` are skipped.
+
+    Args:
+        filename (str): Job file
+
+    Yields:
+        str: VIN Number
+    """
+    with open(filename) as job_file:
+        for line in job_file:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+
+
+class Journal:
+    def __init__(self, filename):
+        """Append-only log of finished lookups, one JSON result per line.
+
+        Args:
+            filename (str): Journal file, created if it does not exist
+        """
+        self.filename = filename
+        self.done = set()
+        self.failed = set()
+        if os.path.exists(filename):
+            self._load()
+
+    def _load(self):
+        with open(self.filename, "rb+") as journal_file:
+            if journal_file.seek(0, os.SEEK_END):
+                journal_file.seek(-1, os.SEEK_END)
+                if journal_file.read(1) != b"\n":
+                    # Terminate the line cut short when the previous run died.
+                    journal_file.write(b"\n")
+        with open(self.filename) as journal_file:
+            for line_number, line in enumerate(journal_file, 1):
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    logger.warning("Skipping corrupt journal line {}", line_number)
+                    continue
+                if result["status"] in FINISHED:
+                    self.done.add(result["vin"])
+                    self.failed.discard(result["vin"])
+                elif result["vin"] not in self.done:
+                    self.failed.add(result["vin"])
+        logger.info(
+            "Journal {} has {} VINs done and {} failed",
+            self.filename,
+            len(self.done),
+            len(self.failed),
+        )
+
+    def pending(self, vin_numbers):
+        """VINs still to look up, i.e. never tried or failed before.
+
+        Args:
+            vin_numbers (iterable): VIN Numbers of the job
+
+        Yields:
+            str: Normalized VIN Number
+        """
+        for vin_number in map(normalize, vin_numbers):
+            if vin_number not in self.done:
+                if vin_number in self.failed:
+                    METRICS.inc("retries")
+                yield vin_number
+
+    def record(self, result):
+        """Append a finished lookup to the journal and make sure it hits the disk.
+
+        Args:
+            result (dict): Result as yielded by `iter_reports`
+        """
+        with open(self.filename, "a") as journal_file:
+            journal_file.write(json.dumps(result, sort_keys=True) + "\n")
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        if result["status"] in FINISHED:
+            self.done.add(result["vin"])
+            self.failed.discard(result["vin"])
+        else:
+            self.failed.add(result["vin"])
+
+    def results(self):
+        """Latest recorded result of every VIN in the journal.
+
+        Returns:
+            dict: Results keyed by VIN
+        """
+        results = {}
+        with open(self.filename) as journal_file:
+            for line in journal_file:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    continue
+                if results.get(result["vin"], {}).get("status") != "ok":
+                    results[result["vin"]] = result
+        return results
+
+
+def iter_job(vin_numbers, journal, **kwargs):
+    """Look up the VINs of a job that the journal does not have as done yet, and
+    record each result as it comes in.
+
+    Args:
+        vin_numbers (iterable): VIN Numbers of the job
+        journal (Journal): Checkpoint journal
+        **kwargs: Passed on to `iter_reports`
+
+    Yields:
+        dict: Result of each VIN looked up in this run, see `iter_reports`
+    """
+    for result in iter_reports(journal.pending(vin_numbers), **kwargs):
+        # The first result of a repeated VIN is the one that counts.
+        if result["status"] != "duplicate":
+            journal.record(result)
+        yield result
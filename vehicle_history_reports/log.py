@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+
+"""Package logger, loguru is only imported once something is logged."""
+
+
+class LazyLogger:
+    """Stand-in for `loguru.logger` that imports it on first use"""
+
+    def __getattr__(self, name):
+        from loguru import logger
+
+        return getattr(logger, name)
+
+    def __repr__(self):
+        return f"<LazyLogger for {self.__getattr__('__repr__')()}>"
+
+
+logger = LazyLogger()
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+"""Per-stage timings and counters, exported in the Prometheus text format."""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIX = "vehicle_history_reports"
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class Metrics:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """Thread-safe registry of stage duration histograms and event counters.
+
+        Args:
+            buckets (tuple, optional): Histogram bucket upper bounds in seconds
+        """
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    def observe(self, stage, seconds):
+        """Record how long a stage took"""
+        with self._lock:
+            if stage not in self._histograms:
+                self._histograms[stage] = Histogram(self.buckets)
+            self._histograms[stage].observe(seconds)
+
+    @contextmanager
+    def time(self, stage, timings=None):
+        """Time the `with` block as `stage`.
+
+        Args:
+            stage (str): Stage name, e.g. "open_site"
+            timings (dict, optional): Also add the seconds taken to `timings[stage]`
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe(stage, elapsed)
+            if timings is not None:
+                timings[stage] = timings.get(stage, 0.0) + elapsed
+
+    def inc(self, name, amount=1, **labels):
+        """Increment counter `name`, e.g. `inc("lookups", status="ok")`"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    @staticmethod
+    def _labels(labels):
+        if not labels:
+            return ""
+        return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+    def to_prometheus(self):
+        """Metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            if self._histograms:
+                name = f"{PREFIX}_stage_seconds"
+                lines.append(f"# HELP {name} Time spent in each lookup stage.")
+                lines.append(f"# TYPE {name} histogram")
+            for stage, histogram in sorted(self._histograms.items()):
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(
+                    f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}'
+                )
+                lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+            typed = set()
+            for (counter, labels), value in sorted(self._counters.items()):
+                name = f"{PREFIX}_{counter}_total"
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{self._labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, filename):
+        """Write the metrics to a file, atomically so that e.g. the node exporter
+        textfile collector never reads half of it.
+
+        Args:
+            filename (str): File to write to
+        """
+        tmp_filename = f"{filename}.{os.getpid()}.tmp"
+        with open(tmp_filename, "w") as metrics_file:
+            metrics_file.write(self.to_prometheus())
+        os.replace(tmp_filename, filename)
+
+
+# Default registry used by the lookups.
+METRICS = Metrics()
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+
+"""Extract vehicle data from a VIN decoder results page, no browser needed."""
+
+import importlib.util
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache, partial
+
+from vehicle_history_reports.log import logger
+from vehicle_history_reports.report import Fields, Report
+
+# BeautifulSoup and lxml are only imported once a page is parsed.
+HTML_PARSER = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
+URL = "https://driving-tests.org/vin-decoder/"
+
+# Nodes the data structure is extracted from, or that tell whether a page has results.
+REPORT_IDS = frozenset(
+    ["nhtsa-26", "report_extra", "recalls", "complaints", "vehicle_logo"]
+)
+REPORT_CLASSES = frozenset(["tableinfo", "table-striped", "slick-slide", "error-report"])
+
+
+class DataStructure:
+    @staticmethod
+    def asdict():
+        return {
+            "Additional Vehicle Info": {},
+            "Decoded Details": {},
+            "Images Links": {},
+            "Most Recent Complaints": {},
+            "Most Recent Recalls": {},
+        }
+
+
+class MissingPageSource(Exception):
+    pass
+
+
+class VinNotFound(MissingPageSource):
+    """The site has no information for the VIN"""
+
+
+def is_report_node(attrs):
+    """Whether a tag with these attributes is one of the report nodes"""
+    if attrs.get("id") in REPORT_IDS:
+        return True
+    classes = attrs.get("class") or ()
+    if isinstance(classes, str):
+        classes = classes.split()
+    return not REPORT_CLASSES.isdisjoint(classes)
+
+
+@lru_cache(maxsize=None)
+def report_nodes_class():
+    """`ReportNodes`, a `SoupStrainer` subclass, defined once bs4 is imported"""
+    from bs4 import SoupStrainer
+
+    class ReportNodes(SoupStrainer):
+        """
+        Only build the report nodes of a page, with everything in them, the rest of
+        the page is skipped while parsing.
+        """
+
+        wanted = staticmethod(is_report_node)
+
+        def search_tag(self, markup_name=None, markup_attrs={}):
+            # beautifulsoup4 < 4.13
+            return self.wanted(markup_attrs)
+
+        def allow_tag_creation(self, nsprefix, name, attrs):
+            # beautifulsoup4 >= 4.13
+            return self.wanted(attrs or {})
+
+    return ReportNodes
+
+
+def __getattr__(name):
+    if name == "ReportNodes":
+        return report_nodes_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def parse_report(page_source):
+    """Parse only the report nodes of a page.
+
+    Args:
+        page_source (str|bytes): Page HTML
+
+    Returns:
+        BeautifulSoup: The report nodes, in page order
+    """
+    from bs4 import BeautifulSoup
+
+    return BeautifulSoup(page_source, HTML_PARSER, parse_only=report_nodes_class()())
+
+
+class ReportParser:
+    def __init__(self, page_source, url=URL, report=None):
+        """Extract the vehicle report from a results page.
+
+        Args:
+            page_source (str|BeautifulSoup): Page HTML, of which only the report nodes
+                are parsed, or the already parsed page
+            url (str, optional): URL the page was served from, relative image links
+                are resolved against it
+            report (Report, optional): Report to update, defaults to a new one
+        """
+        if isinstance(page_source, (str, bytes)):
+            page_source = parse_report(page_source)
+        self.page_source = page_source
+        self.url = url
+        self.report = Report() if report is None else report
+
+    @property
+    def data_structure(self):
+        """Report as vehicle data structure dict"""
+        return self.report.to_dict()
+
+    @classmethod
+    def read(cls, page_source, url=URL):
+        """Extract every section of the report from a results page.
+
+        A section that cannot be extracted is logged and left empty.
+
+        Args:
+            page_source (str|BeautifulSoup): Page HTML, or the already parsed page
+            url (str, optional): URL the page was served from
+
+        Returns:
+            Report: Vehicle report
+        """
+        report = cls(page_source, url=url)
+        for extract in (
+            report.decoded_details,
+            report.additional_vehicle_info,
+            partial(report.recent_issues, "recalls"),
+            partial(report.recent_issues, "complaints"),
+            report.image_links,
+        ):
+            try:
+                extract()
+            except Exception as err:
+                logger.exception("ERROR Occurred: {}", err)
+        return report.report
+
+    @classmethod
+    def parse(cls, page_source, url=URL):
+        """Extract every section of the data structure from a results page, see `read`.
+
+        Returns:
+            dict: Vehicle data structure
+        """
+        return cls.read(page_source, url=url).to_dict()
+
+    @contextmanager
+    def _updating(self, section):
+        """Fields of a report section as dict to update, stored back into the report
+        even if the extraction fails half way"""
+        data = getattr(self.report, section).to_dict()
+        try:
+            yield data
+        finally:
+            setattr(self.report, section, Fields.from_dict(data))
+
+    def decoded_details(self):
+        """Update report with the decoded details tables"""
+        with self._updating("decoded_details") as decoded_details:
+            table_info = self.page_source.find(
+                "table", attrs={"class": "tableinfo"}
+            ).find("tbody")
+            for row in table_info.find_all("tr"):
+                for key, value in zip(row.find_all("span"), row.find_all("td")):
+                    # Each cell reads "<label><span>value</span>", the text of each
+                    # node is only gathered once.
+                    key_text, value_text = key.text, value.text
+                    decoded_details["".join(value_text.split(key_text))] = "".join(
+                        key_text.split(value_text)
+                    )
+            table_striped = self.page_source.find(
+                "table", attrs={"class": "table table-striped"}
+            ).find("tbody")
+            for row in table_striped.find_all("tr"):
+                cells = row.text.strip().split("\n")
+                if len(cells) == 2:
+                    key, value = cells
+                    decoded_details[key] = value
+
+    def additional_vehicle_info(self):
+        """Update report with the additional vehicle info table"""
+        with self._updating("additional_info") as additional_vehicle_info:
+            additional_infos = self.page_source.find(attrs={"id": "report_extra"}).find(
+                "tbody"
+            )
+            for row in additional_infos.find_all("tr"):
+                row_text, key_text = row.text, row.td.text
+                additional_vehicle_info["".join(key_text.split(row_text))] = "".join(
+                    row_text.split(key_text)
+                )
+
+    def recent_issues(self, recent_issues="recalls"):
+        """Update report with the recalls or complaints tables
+
+        Args:
+            recent_issues (str, optional): This can either be recalls or complaints
+        """
+        prefix = recent_issues.lower()
+        issues = [issue.to_dict() for issue in getattr(self.report, prefix)]
+        try:
+            table = self.page_source.find(attrs={"id": prefix})
+            tbodies = [node for node in table.descendants if node.name == "tbody"]
+            for count, tbody in enumerate(tbodies):
+                issue = {}
+                if count < len(issues):
+                    issues[count] = issue
+                else:
+                    issues.append(issue)
+                # Rows and their cells in a single walk over the tbody, a `find_all`
+                # per row costs more than the walk itself.
+                rows = []
+                for node in tbody.descendants:
+                    if node.name == "tr":
+                        rows.append([])
+                    elif node.name == "td" and rows:
+                        rows[-1].append("".join(node.text.strip("\n").split("\n")))
+                for cells in rows:
+                    key, value = cells
+                    issue[key] = value
+        finally:
+            setattr(self.report, prefix, [Fields.from_dict(issue) for issue in issues])
+
+    def image_links(self):
+        """Update report with the vehicle logo and image links"""
+        images = self.report.images
+        link = self.page_source.find("img", attrs={"id": "vehicle_logo"}).get("src", None)
+        images.vehicle_logo = "".join([self.url, link]) if link else ""
+        image_urls_class = self.page_source.find_all(
+            "img", attrs={"class": "slick-slide"}
+        )
+        images.vehicle_images = [
+            image_url.get("src", None) for image_url in image_urls_class
+        ]
+
+
+def parse_file(filename, url=URL):
+    """Extract the vehicle data structure from a saved results page.
+
+    Args:
+        filename (str): HTML file
+        url (str, optional): URL the page was served from
+
+    Returns:
+        dict: Vehicle data structure
+    """
+    with open(filename, "rb") as html_file:
+        return ReportParser.parse(html_file.read(), url=url)
+
+
+def parse_directory(directory, workers=None, url=URL, extension=".html"):
+    """Extract the vehicle data structures from a directory of saved results pages,
+    spread over a pool of processes.
+
+    Args:
+        directory (str): Directory with the saved pages, e.g. `<VIN>.html`
+        workers (int, optional): Number of processes, defaults to the number of CPUs
+        url (str, optional): URL the pages were served from
+        extension (str, optional): Only parse files with this extension
+
+    Returns:
+        dict: Vehicle data structures keyed by file name without extension
+    """
+    filenames = sorted(
+        os.path.join(directory, filename)
+        for filename in os.listdir(directory)
+        if filename.endswith(extension)
+    )
+    logger.info("Parsing {} pages from {}", len(filenames), directory)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        data = executor.map(
+            partial(parse_file, url=url),
+            filenames,
+            chunksize=max(1, len(filenames) // (4 * (workers or os.cpu_count() or 1))),
+        )
+        return {
+            os.path.splitext(os.path.basename(filename))[0]: data_structure
+            for filename, data_structure in zip(filenames, data)
+        }
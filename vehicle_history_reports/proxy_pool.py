@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+
+"""Proxy settings, and rotation over a pool of proxies scored by their health."""
+
+import itertools
+import random
+import threading
+import time
+
+from vehicle_history_reports.log import logger
+
+
+class ProxySettings:
+    """
+    Proxy contains information about proxy type and necessary proxy settings.
+
+    Attributes:
+        host (str): host
+        password (str): password
+        port (str): port
+        username (str): username
+    """
+
+    def __init__(self, **kwargs):
+        self.host = kwargs.get("host", None)
+        self.port = kwargs.get("port", None)
+        self.username = kwargs.get("username", None)
+        self.password = kwargs.get("password", None)
+
+    def __repr__(self):
+        return repr(
+            "<{}(host='{}', port='{}', username='{}', password='{}') at 0x{:x}>".format(
+                self.__class__.__name__,
+                self.host,
+                self.port,
+                self.username,
+                self.password,
+                id(self),
+            )
+        )
+
+    @property
+    def key(self):
+        """Hashable identity of the proxy configuration"""
+        return (self.host, self.port, self.username, self.password)
+
+    def asdict(self):
+        return {
+            "host": self.host,
+            "port": self.port,
+            "username": self.username,
+            "password": self.password,
+        }
+
+
+class ProxyStats:
+    """
+    Health of a proxy, as seen by the lookups that went through it.
+
+    Attributes:
+        proxy (ProxySettings): Proxy
+        weight (float): Configured weight
+        requests (int): Times handed out, for a lookup or for a browser to keep
+        successes (int): Lookups that found the VIN information
+        not_found (int): Lookups where the site had no information for the VIN
+        errors (int): Lookups that failed, e.g. time-outs, captchas or crashes
+        latency (float): Moving average of the seconds a successful lookup takes
+        strikes (int): Failures in a row, the bench time doubles with each one
+        benched_until (float): `time.monotonic()` until which the proxy is not used
+    """
+
+    def __init__(self, proxy, weight=1.0):
+        self.proxy = proxy
+        self.weight = weight
+        self.requests = 0
+        self.successes = 0
+        self.not_found = 0
+        self.errors = 0
+        self.latency = None
+        self.strikes = 0
+        self.benched_until = 0.0
+
+    @property
+    def completed(self):
+        return self.successes + self.not_found + self.errors
+
+    @property
+    def success_rate(self):
+        # Untried proxies get the benefit of the doubt.
+        return (self.successes + 1) / (self.completed + 1)
+
+    @property
+    def not_found_rate(self):
+        return self.not_found / self.completed if self.completed else 0.0
+
+    @property
+    def score(self):
+        """Higher is better, weight scaled by success rate over latency"""
+        return self.weight * self.success_rate / max(self.latency or 1.0, 0.1)
+
+    def asdict(self):
+        return {
+            "host": self.proxy.host,
+            "port": self.proxy.port,
+            "weight": self.weight,
+            "requests": self.requests,
+            "successes": self.successes,
+            "not_found": self.not_found,
+            "errors": self.errors,
+            "latency": self.latency,
+            "benched": self.benched_until > time.monotonic(),
+        }
+
+
+class ProxyPool:
+    def __init__(
+        self,
+        proxies,
+        strategy="round-robin",
+        backoff=30,
+        max_backoff=30 * 60,
+        not_found_threshold=0.5,
+        min_requests=5,
+    ):
+        """Hand out proxies round-robin or by weight, benching unhealthy ones.
+
+        A proxy is benched after a failed lookup, for `backoff` seconds doubling with
+        each failure in a row up to `max_backoff`. A proxy for which the site claims
+        to have no information unusually often, likely banned, is benched the same way.
+
+        Args:
+            proxies (list): `ProxySettings`, or `(ProxySettings, weight)` tuples
+            strategy (str, optional): "round-robin" or "weighted"
+            backoff (float, optional): Seconds a proxy is benched after a failure
+            max_backoff (float, optional): Maximum seconds a proxy is benched
+            not_found_threshold (float, optional): Bench a proxy once this share of
+                its lookups found no information
+            min_requests (int, optional): Finished lookups before the share above
+                counts
+
+        Raises:
+            ValueError: If the strategy is unknown or no proxies are given
+        """
+        if strategy not in ("round-robin", "weighted"):
+            raise ValueError(f"Unknown strategy: {strategy}")
+        if not proxies:
+            raise ValueError("No proxies given.")
+        self.strategy = strategy
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.not_found_threshold = not_found_threshold
+        self.min_requests = min_requests
+        self._stats = {}
+        for proxy in proxies:
+            proxy, weight = proxy if isinstance(proxy, tuple) else (proxy, 1.0)
+            self._stats[proxy.key] = ProxyStats(proxy, weight)
+        self._cycle = itertools.cycle(list(self._stats.values()))
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, filename, **kwargs):
+        """Load proxies from a file, one `host:port[:username:password] [weight]` per
+        line. Blank lines and lines starting with `#` are skipped.
+
+        Args:
+            filename (str): Proxy list file
+            **kwargs: Passed on to `ProxyPool`
+        """
+        proxies = []
+        with open(filename) as proxy_file:
+            for line in proxy_file:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                address, _, weight = line.partition(" ")
+                host, port, *credentials = address.split(":")
+                username, password = (credentials + [None, None])[:2]
+                proxy = ProxySettings(
+                    host=host, port=port, username=username, password=password
+                )
+                proxies.append((proxy, float(weight) if weight.strip() else 1.0))
+        logger.info("Loaded {} proxies from {}", len(proxies), filename)
+        return cls(proxies, **kwargs)
+
+    def __len__(self):
+        return len(self._stats)
+
+    def acquire(self):
+        """Pick a proxy for the next lookup.
+
+        If every proxy is benched, the one coming off the bench first is used.
+
+        Returns:
+            ProxySettings: Proxy
+        """
+        now = time.monotonic()
+        with self._lock:
+            healthy = [
+                stats for stats in self._stats.values() if stats.benched_until <= now
+            ]
+            if not healthy:
+                stats = min(self._stats.values(), key=lambda stats: stats.benched_until)
+                logger.warning("All proxies are benched, using {}", stats.proxy)
+            elif self.strategy == "weighted":
+                stats = random.choices(
+                    healthy, weights=[stats.score for stats in healthy]
+                )[0]
+            else:
+                stats = next(self._cycle)
+                while stats.benched_until > now:
+                    stats = next(self._cycle)
+            stats.requests += 1
+            return stats.proxy
+
+    def release(self, proxy):
+        """Give back a proxy from `acquire` that no lookup was finished through,
+        e.g. when a plain HTTP lookup hands over to the browser.
+
+        Args:
+            proxy (ProxySettings): Proxy returned by `acquire`
+        """
+        with self._lock:
+            self._stats[proxy.key].requests -= 1
+
+    def is_benched(self, proxy):
+        """Whether a proxy is benched after failing"""
+        with self._lock:
+            return self._stats[proxy.key].benched_until > time.monotonic()
+
+    def report(self, proxy, outcome, latency=None):
+        """Record the outcome of a lookup made through `proxy`.
+
+        Args:
+            proxy (ProxySettings): Proxy returned by `acquire`
+            outcome (str): "ok", "not_found" or "error"
+            latency (float, optional): Seconds the lookup took
+        """
+        with self._lock:
+            stats = self._stats[proxy.key]
+            if outcome == "ok":
+                stats.successes += 1
+                stats.strikes = 0
+                if latency is not None:
+                    stats.latency = (
+                        latency
+                        if stats.latency is None
+                        else 0.8 * stats.latency + 0.2 * latency
+                    )
+                return
+            if outcome == "not_found":
+                stats.not_found += 1
+                if (
+                    stats.completed < self.min_requests
+                    or stats.not_found_rate < self.not_found_threshold
+                ):
+                    return
+            else:
+                stats.errors += 1
+            stats.strikes += 1
+            bench = min(self.backoff * 2 ** (stats.strikes - 1), self.max_backoff)
+            stats.benched_until = time.monotonic() + bench
+            logger.warning("Benching proxy {} for {}s after a {}", proxy, bench, outcome)
+
+    def stats(self):
+        """Health of every proxy
+
+        Returns:
+            list: One dict per proxy
+        """
+        with self._lock:
+            return [stats.asdict() for stats in self._stats.values()]
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+
+"""Adaptive rate limiting of lookups, per target site and per proxy."""
+
+import threading
+import time
+from collections import deque
+
+from vehicle_history_reports.log import logger
+from vehicle_history_reports.metrics import METRICS
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=1):
+        """Let through `rate` requests a second on average, `burst` at once.
+
+        Args:
+            rate (float): Requests per second
+            burst (int, optional): Requests let through back to back after an idle
+                spell
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self):
+        """Take a token, borrowing it if there is none left.
+
+        Returns:
+            float: Seconds to wait before the request may go
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self):
+        """Wait for a token.
+
+        Returns:
+            float: Seconds waited
+        """
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def set_rate(self, rate):
+        with self._lock:
+            self._set_rate(rate)
+
+    def _set_rate(self, rate):
+        self._refill(time.monotonic())
+        self.rate = rate
+
+
+class AdaptiveBucket(TokenBucket):
+    def __init__(
+        self, rate, burst=1, min_rate=0.05, max_rate=None, increase=0.05, decrease=0.5
+    ):
+        """Token bucket whose rate goes up additively while requests succeed and down
+        multiplicatively when they fail (AIMD).
+
+        Args:
+            rate (float): Requests per second to start at
+            burst (int, optional): Requests let through back to back
+            min_rate (float, optional): Never go below this many requests per second
+            max_rate (float, optional): Never go above this many, unlimited by default
+            increase (float, optional): Requests per second added per success
+            decrease (float, optional): Factor the rate is cut by on a failure
+        """
+        super().__init__(rate, burst)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.decreased_at = 0.0
+
+    def succeeded(self):
+        with self._lock:
+            rate = self.rate + self.increase
+            self._set_rate(rate if self.max_rate is None else min(rate, self.max_rate))
+
+    def failed(self, started=None):
+        """Cut the rate, once for all the requests that were already under way.
+
+        Args:
+            started (float, optional): `time.monotonic()` the failed request went at
+
+        Returns:
+            bool: Whether the rate was cut
+        """
+        with self._lock:
+            if started is not None and started < self.decreased_at:
+                return False
+            self.decreased_at = time.monotonic()
+            self._set_rate(max(self.rate * self.decrease, self.min_rate))
+        return True
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        rate=1.0,
+        proxy_rate=None,
+        burst=1,
+        min_rate=0.05,
+        max_rate=None,
+        increase=0.05,
+        decrease=0.5,
+        window=20,
+        error_threshold=0.2,
+        not_found_threshold=0.5,
+    ):
+        """Space out lookups with an adaptive token bucket per target site and one per
+        proxy, backing off when the site starts failing them and ramping back up
+        while it serves them.
+
+        A failed lookup backs off once failures make up `error_threshold` of the last
+        `window` lookups, so that the odd time-out does not halve the rate. Lookups
+        where the site claims to have no information are normal on their own, only
+        once they make up `not_found_threshold`, typical of a site quietly refusing
+        service, do they back off too.
+
+        Args:
+            rate (float, optional): Lookups per second to start at, per target site
+            proxy_rate (float, optional): Lookups per second to start at, per proxy,
+                not limited by default
+            burst (int, optional): Lookups let through back to back
+            min_rate (float, optional): Never go below this many lookups per second
+            max_rate (float, optional): Never go above this many, unlimited by default
+            increase (float, optional): Lookups per second added per success
+            decrease (float, optional): Factor the rate is cut by on a failure
+            window (int, optional): Recent lookups the shares below are over
+            error_threshold (float, optional): Share of failed lookups to back off at,
+                e.g. time-outs, error pages or refused requests
+            not_found_threshold (float, optional): Share of "not found" lookups to
+                back off at
+        """
+        self.rate = rate
+        self.proxy_rate = proxy_rate
+        self._options = dict(
+            burst=burst,
+            min_rate=min_rate,
+            max_rate=max_rate,
+            increase=increase,
+            decrease=decrease,
+        )
+        self.window = window
+        self.thresholds = {"error": error_threshold, "not_found": not_found_threshold}
+        self._buckets = {}
+        self._recent = {}
+        self._lock = threading.Lock()
+
+    def _limits(self, target, proxy):
+        keys = [("target", target)]
+        if proxy is not None and self.proxy_rate:
+            keys.append(("proxy", proxy))
+        with self._lock:
+            for key in keys:
+                if key not in self._buckets:
+                    rate = self.rate if key[0] == "target" else self.proxy_rate
+                    self._buckets[key] = AdaptiveBucket(rate, **self._options)
+                    self._recent[key] = deque(maxlen=self.window)
+            return [(key, self._buckets[key], self._recent[key]) for key in keys]
+
+    def acquire(self, target, proxy=None):
+        """Wait until a lookup may go.
+
+        Args:
+            target (str): Site looked up, e.g. its host name
+            proxy (str, optional): Proxy the lookup goes through, e.g. its
+                "host:port"
+
+        Returns:
+            float: `time.monotonic()` the lookup went at, to pass on to `report`
+        """
+        wait = max(bucket.reserve() for _, bucket, _ in self._limits(target, proxy))
+        if wait:
+            time.sleep(wait)
+        return time.monotonic()
+
+    def report(self, target, proxy, outcome, started=None):
+        """Adjust the rates to the outcome of a lookup.
+
+        Only a successful lookup ramps the rate up, a failed one below the thresholds
+        leaves it as it is.
+
+        Args:
+            target (str): Site looked up
+            proxy (str): Proxy the lookup went through, or None
+            outcome (str): "ok", "not_found" or "error"
+            started (float, optional): What `acquire` returned for the lookup
+        """
+        for key, bucket, recent in self._limits(target, proxy):
+            with self._lock:
+                recent.append(outcome)
+                failed = (
+                    outcome in self.thresholds
+                    and len(recent) >= min(5, self.window)
+                    and recent.count(outcome) >= self.thresholds[outcome] * len(recent)
+                )
+            if not failed:
+                if outcome == "ok":
+                    bucket.succeeded()
+            elif bucket.failed(started):
+                METRICS.inc("rate_backoffs", scope=key[0])
+                logger.warning(
+                    "Backing off {} {} to {:.2f} lookups/s, too many {} lookups",
+                    key[0],
+                    key[1],
+                    bucket.rate,
+                    outcome,
+                )
+
+    def rates(self):
+        """Current lookups per second of every target and proxy
+
+        Returns:
+            dict: Rates keyed by `(scope, key)`, scope being "target" or "proxy"
+        """
+        with self._lock:
+            return {key: bucket.rate for key, bucket in self._buckets.items()}
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+
+"""Compact vehicle report model, convertible to and from the data structure dict."""
+
+import json
+import re
+import sys
+from functools import lru_cache
+
+# Sections of the data structure, in its order.
+ADDITIONAL_INFO = "Additional Vehicle Info"
+DECODED_DETAILS = "Decoded Details"
+IMAGES_LINKS = "Images Links"
+COMPLAINTS = "Most Recent Complaints"
+RECALLS = "Most Recent Recalls"
+
+# Field names of a table layout, shared by every table with that layout.
+_KEYS = {}
+
+
+@lru_cache(maxsize=None)
+def _orjson():
+    """orjson, imported on first use, or None if it is not installed"""
+    try:
+        import orjson
+    except ImportError:
+        return None
+    return orjson
+
+
+def dumps(data, sort_keys=False):
+    """Serialize to a JSON string, with orjson if it is installed.
+
+    orjson writes compact JSON, without spaces after separators, and leaves non-ASCII
+    characters unescaped, so the string differs from `json.dumps` with it.
+
+    Args:
+        data: JSON serializable data
+        sort_keys (bool, optional): Sort the keys of objects
+
+    Returns:
+        str: JSON
+    """
+    orjson = _orjson()
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SORT_KEYS if sort_keys else 0).decode(
+            "utf-8"
+        )
+    return json.dumps(data, sort_keys=sort_keys)
+
+
+class Fields:
+    """
+    Read-only table of named values, e.g. the decoded details or a recall.
+
+    Tables with the same field names share one interned tuple of names, each table
+    only holds its values.
+
+    Attributes:
+        keys (tuple): Field names
+        values (tuple): Values, in the order of `keys`
+    """
+
+    __slots__ = ("keys", "values")
+
+    def __init__(self, keys=(), values=()):
+        keys = tuple(sys.intern(key) for key in keys)
+        self.keys = _KEYS.setdefault(keys, keys)
+        self.values = tuple(values)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.keys(), data.values())
+
+    def to_dict(self):
+        return dict(zip(self.keys, self.values))
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def items(self):
+        return zip(self.keys, self.values)
+
+    def __getitem__(self, key):
+        try:
+            return self.values[self.keys.index(key)]
+        except ValueError:
+            raise KeyError(key) from None
+
+    def __iter__(self):
+        return iter(self.keys)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __eq__(self, other):
+        if not isinstance(other, Fields):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"Fields({self.to_dict()!r})"
+
+    def __getstate__(self):
+        return self.keys, self.values
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+
+class Images:
+    """
+    Vehicle image links.
+
+    Attributes:
+        vehicle_logo (str): Logo URL, None if not extracted
+        vehicle_images (list): Image URLs, None if not extracted
+    """
+
+    __slots__ = ("vehicle_logo", "vehicle_images")
+
+    def __init__(self, vehicle_logo=None, vehicle_images=None):
+        self.vehicle_logo = vehicle_logo
+        self.vehicle_images = vehicle_images
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("vehicle_logo"), data.get("vehicle_images"))
+
+    def to_dict(self):
+        images = {}
+        if self.vehicle_logo is not None:
+            images["vehicle_logo"] = self.vehicle_logo
+        if self.vehicle_images is not None:
+            images["vehicle_images"] = list(self.vehicle_images)
+        return images
+
+    def __eq__(self, other):
+        if not isinstance(other, Images):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"Images({self.to_dict()!r})"
+
+
+class Report:
+    """
+    Vehicle report, a compact stand-in for the nested data structure dict.
+
+    Attributes:
+        additional_info (Fields): Additional vehicle info
+        decoded_details (Fields): Decoded details
+        images (Images): Vehicle logo and image links
+        complaints (list): Most recent complaints, a `Fields` each
+        recalls (list): Most recent recalls, a `Fields` each
+    """
+
+    __slots__ = ("additional_info", "decoded_details", "images", "complaints", "recalls")
+
+    def __init__(
+        self,
+        additional_info=None,
+        decoded_details=None,
+        images=None,
+        complaints=None,
+        recalls=None,
+    ):
+        self.additional_info = additional_info or Fields()
+        self.decoded_details = decoded_details or Fields()
+        self.images = images or Images()
+        self.complaints = complaints or []
+        self.recalls = recalls or []
+
+    @staticmethod
+    def _issues_from_dict(section):
+        def number(key):
+            match = re.search(r"_(\d+)$", key)
+            return int(match.group(1)) if match else 0
+
+        # Cached sections may come back sorted as text, recalls_10 before recalls_2.
+        return [Fields.from_dict(section[key]) for key in sorted(section, key=number)]
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a report from a data structure dict, e.g. a cached one.
+
+        Args:
+            data (dict): Vehicle data structure
+
+        Returns:
+            Report: Vehicle report
+        """
+        return cls(
+            additional_info=Fields.from_dict(data.get(ADDITIONAL_INFO, {})),
+            decoded_details=Fields.from_dict(data.get(DECODED_DETAILS, {})),
+            images=Images.from_dict(data.get(IMAGES_LINKS, {})),
+            complaints=cls._issues_from_dict(data.get(COMPLAINTS, {})),
+            recalls=cls._issues_from_dict(data.get(RECALLS, {})),
+        )
+
+    def to_dict(self):
+        """Vehicle data structure, in the shape of `DataStructure.asdict()`"""
+        return {
+            ADDITIONAL_INFO: self.additional_info.to_dict(),
+            DECODED_DETAILS: self.decoded_details.to_dict(),
+            IMAGES_LINKS: self.images.to_dict(),
+            COMPLAINTS: {
+                f"complaints_{count}": complaint.to_dict()
+                for count, complaint in enumerate(self.complaints, 1)
+            },
+            RECALLS: {
+                f"recalls_{count}": recall.to_dict()
+                for count, recall in enumerate(self.recalls, 1)
+            },
+        }
+
+    def to_json(self, sort_keys=False):
+        """Vehicle data structure as JSON, see `dumps`"""
+        return dumps(self.to_dict(), sort_keys=sort_keys)
+
+    def __eq__(self, other):
+        if not isinstance(other, Report):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"Report({self.to_dict()!r})"
@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+
+"""Long running HTTP/JSON service keeping browsers warm between lookups."""
+
+import json
+import queue
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from vehicle_history_reports.batch import lookup_result, rejected_result, scrape_vin
+from vehicle_history_reports.log import logger
+from vehicle_history_reports.metrics import METRICS
+from vehicle_history_reports.parser import MissingPageSource
+from vehicle_history_reports.vin import InvalidVin, VinFilter, validate
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Lookup(Future):
+    """
+    Future of a lookup, resolves to the vehicle data structure.
+
+    Attributes:
+        vin_number (str): VIN Number as given
+        cached (bool): Whether the data was served from the cache
+        timings (dict): Seconds spent in each stage of the lookup
+    """
+
+    def __init__(self, vin_number):
+        super().__init__()
+        self.vin_number = vin_number
+        self.cached = False
+        self.timings = {}
+
+    def result_dict(self, timeout=None):
+        """Wait for the lookup, see `batch.lookup_result`.
+
+        Raises:
+            concurrent.futures.TimeoutError: If the lookup did not finish in time
+        """
+        try:
+            data = self.result(timeout=timeout)
+        except FutureTimeoutError:
+            raise
+        except Exception as err:
+            return lookup_result(self.vin_number, error=err, timings=self.timings)
+        return lookup_result(
+            self.vin_number, data, cached=self.cached, timings=self.timings
+        )
+
+
+class ReportService:
+    def __init__(
+        self,
+        workers=1,
+        queue_size=100,
+        request_timeout=300,
+        headless=True,
+        max_uses=50,
+        settings=None,
+        cache=None,
+        fetch=None,
+        check_digit=True,
+        **kwargs,
+    ):
+        """Queue VIN lookups for a fixed set of workers, each with a warm browser.
+
+        Args:
+            workers (int, optional): Number of concurrent lookups/browsers
+            queue_size (int, optional): Lookups waiting beyond this many are refused
+            request_timeout (int, optional): Seconds a request waits for its lookup
+            headless (bool, optional): Run browsers in headless mode
+            max_uses (int, optional): Restart a browser after this many lookups
+            settings (FirefoxSettings, optional): Profile and options to start the
+                browsers with, defaults to the lean ones
+            cache (ReportCache, optional): Serve VINs from and store them in this cache
+            fetch (FetchBackend, optional): Try plain HTTP lookups first
+            check_digit (bool, optional): Reject VINs with a wrong check digit
+            **kwargs: Passed on to `scrape_vin`, e.g. `proxy_pool` or `rate_limiter`,
+                and `VehicleHistoryReports`
+        """
+        from vehicle_history_reports.browser_pool import BrowserPool
+
+        self.workers = workers
+        self.request_timeout = request_timeout
+        self.queue_size = queue_size
+        self._cache = cache
+        self._fetch = fetch
+        self.check_digit = check_digit
+        self._kwargs = kwargs
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._pool = BrowserPool(
+            size=workers, headless=headless, max_uses=max_uses, settings=settings
+        )
+        self._busy = 0
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"vin-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, vin_number):
+        """Queue a lookup.
+
+        Args:
+            vin_number (str): VIN Number
+
+        Returns:
+            Lookup: Resolves to the vehicle data structure, or fails with `InvalidVin`
+                right away for an invalid VIN
+
+        Raises:
+            QueueFull: If too many lookups are already waiting
+        """
+        future = Lookup(vin_number)
+        try:
+            vin_number = validate(vin_number, self.check_digit)
+        except InvalidVin as err:
+            METRICS.inc("rejected", reason=err.reason)
+            future.set_exception(err)
+            return future
+        if self._cache is not None:
+            with METRICS.time("cache", future.timings):
+                data = self._cache.get(vin_number)
+            if data is not None:
+                METRICS.inc("cache_hits")
+                future.cached = True
+                future.set_result(data)
+                return future
+        try:
+            self._queue.put_nowait((vin_number, future))
+        except queue.Full:
+            raise QueueFull(f"Too many lookups queued, refused vin:{vin_number}")
+        return future
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            vin_number, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            with self._lock:
+                self._busy += 1
+            try:
+                data = scrape_vin(
+                    vin_number,
+                    pool=self._pool,
+                    fetch=self._fetch,
+                    timings=future.timings,
+                    **self._kwargs,
+                )
+            except Exception as err:
+                logger.error("Failed to look up vin:{}: {}", vin_number, err)
+                future.set_exception(err)
+            else:
+                if self._cache is not None:
+                    self._cache.set(vin_number, data)
+                future.set_result(data)
+            finally:
+                with self._lock:
+                    self._busy -= 1
+
+    def health(self):
+        """Service status"""
+        with self._lock:
+            busy = self._busy
+        return {
+            "status": "ok",
+            "workers": self.workers,
+            "busy": busy,
+            "queued": self._queue.qsize(),
+            "queue_size": self.queue_size,
+            **(
+                {"proxies": self._kwargs["proxy_pool"].stats()}
+                if self._kwargs.get("proxy_pool")
+                else {}
+            ),
+        }
+
+    def close(self):
+        """Stop the workers once the queue drains, then quit the browsers"""
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._pool.close()
+
+
+class ReportRequestHandler(BaseHTTPRequestHandler):
+    """`GET /vin/<vin>`, `POST /batch` with a JSON list of VINs, `GET /health` and
+    `GET /metrics` in the Prometheus text format"""
+
+    def _send_json(self, status, body, headers=None):
+        content = json.dumps(body, sort_keys=True).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        for header, value in (headers or {}).items():
+            self.send_header(header, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _send_metrics(self):
+        content = METRICS.to_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _busy(self, err):
+        self._send_json(503, {"error": str(err)}, headers={"Retry-After": "5"})
+
+    def do_GET(self):
+        service = self.server.service
+        if self.path == "/health":
+            return self._send_json(200, service.health())
+        if self.path == "/metrics":
+            return self._send_metrics()
+        if not self.path.startswith("/vin/"):
+            return self._send_json(404, {"error": f"Unknown path: {self.path}"})
+
+        vin_number = self.path[len("/vin/") :]
+        try:
+            future = service.submit(vin_number)
+        except QueueFull as err:
+            return self._busy(err)
+        try:
+            data = future.result(timeout=service.request_timeout)
+        except FutureTimeoutError:
+            # Nobody is left waiting for it, do not spend a browser on it.
+            future.cancel()
+            return self._send_json(504, {"error": f"Timed out on vin:{vin_number}"})
+        except InvalidVin as err:
+            return self._send_json(400, {"error": str(err)})
+        except MissingPageSource as err:
+            return self._send_json(404, {"error": str(err)})
+        except Exception as err:
+            return self._send_json(500, {"error": str(err)})
+        self._send_json(200, data)
+
+    def do_POST(self):
+        service = self.server.service
+        if self.path != "/batch":
+            return self._send_json(404, {"error": f"Unknown path: {self.path}"})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            vin_numbers = json.loads(self.rfile.read(length) or b"[]")
+            if isinstance(vin_numbers, dict):
+                vin_numbers = vin_numbers.get("vin_numbers", [])
+        except ValueError as err:
+            return self._send_json(400, {"error": str(err)})
+        if not isinstance(vin_numbers, list):
+            return self._send_json(400, {"error": "Expected a JSON list of VIN numbers."})
+
+        if len(vin_numbers) > service.queue_size:
+            return self._send_json(
+                413, {"error": f"Batches are limited to {service.queue_size} VINs."}
+            )
+        # Like `iter_reports`, invalid and repeated VINs are not looked up.
+        vin_filter = VinFilter(service.check_digit)
+        lookups = []
+        try:
+            for vin_number in vin_numbers:
+                try:
+                    lookups.append(service.submit(vin_filter(vin_number)))
+                except InvalidVin as err:
+                    lookups.append(rejected_result(err))
+        except QueueFull as err:
+            for future in lookups:
+                if isinstance(future, Future):
+                    future.cancel()
+            return self._busy(err)
+
+        results = []
+        for future in lookups:
+            if not isinstance(future, Future):
+                results.append(future)
+                continue
+            try:
+                results.append(future.result_dict(timeout=service.request_timeout))
+            except FutureTimeoutError:
+                future.cancel()
+                timed_out = FutureTimeoutError(f"Timed out on vin:{future.vin_number}")
+                results.append(lookup_result(future.vin_number, error=timed_out))
+        self._send_json(200, results)
+
+    def log_message(self, format, *args):
+        logger.info("{} - {}", self.address_string(), format % args)
+
+
+def serve(address="127.0.0.1:8000", **kwargs):
+    """Serve VIN lookups over HTTP until interrupted.
+
+    Args:
+        address (str, optional): `host:port` to listen on
+        **kwargs: Passed on to `ReportService`
+    """
+    host, _, port = address.rpartition(":")
+    service = ReportService(**kwargs)
+    httpd = ThreadingHTTPServer((host or "127.0.0.1", int(port)), ReportRequestHandler)
+    httpd.service = service
+    logger.info("Serving VIN lookups on http://{}:{}", *httpd.server_address)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        service.close()
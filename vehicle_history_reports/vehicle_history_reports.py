@@ -3,225 +3,289 @@
 """Main module."""
 
 import json
-import os
-import re
-import subprocess
-import sys
 import time
-from base64 import b64encode
 
-import psutil
-from bs4 import BeautifulSoup
-
-from loguru import logger
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.common.proxy import Proxy, ProxyType
-from selenium.webdriver.firefox.options import Options
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
-
-
-class ProxySettings:
-    """
-    Proxy contains information about proxy type and necessary proxy settings.
-
-    Attributes:
-        host (str): host
-        password (str): password
-        port (str): port
-        username (str): username
-    """
-
-    def __init__(self, **kwargs):
-        self.host = kwargs.get("host", None)
-        self.port = kwargs.get("port", None)
-        self.username = kwargs.get("username", None)
-        self.password = kwargs.get("password", None)
-
-    def __repr__(self):
-        return repr(
-            "<{}(host='{}', port='{}', username='{}', password='{}') at 0x{:x}>".format(
-                self.__class__.__name__,
-                self.host,
-                self.port,
-                self.username,
-                self.password,
-                id(self),
-            )
-        )
-
-
-class DataStructure:
-    @staticmethod
-    def asdict():
-        return {
-            "Additional Vehicle Info": {},
-            "Decoded Details": {},
-            "Images Links": {},
-            "Most Recent Complaints": {},
-            "Most Recent Recalls": {},
-        }
-
-
-class MissingPageSource(Exception):
-    pass
+from vehicle_history_reports.firefox import FirefoxSettings
+from vehicle_history_reports.log import logger
+from vehicle_history_reports.metrics import METRICS
+from vehicle_history_reports.parser import (
+    HTML_PARSER,
+    URL,
+    DataStructure,  # noqa: F401, still importable from here
+    MissingPageSource,
+    ReportParser,
+    VinNotFound,
+)
+from vehicle_history_reports.proxy_pool import ProxySettings
+from vehicle_history_reports.report import Report, dumps
+from vehicle_history_reports.vin import validate
 
 
 class VehicleHistoryReports:
-    def __init__(self, vin_number, log_level="INFO", timeout=60, **kwargs):
+    def __init__(
+        self,
+        vin_number,
+        log_level="INFO",
+        timeout=60,
+        poll_interval=0.25,
+        network_idle=None,
+        url=URL,
+        fast_json=False,
+        **kwargs,
+    ):
         """Summary
 
         Args:
             vin_number (str): VIN Number
             log_level (str, optional): Log Level
-            timeout (int, optional): Web time-out
+            timeout (int, optional): Web time-out, also the deadline for search results
+            poll_interval (float, optional): Seconds between checks for search results
+            network_idle (float, optional): Give up on a search once the page has made
+                no requests for this many seconds without showing results, disabled
+                by default
+            url (str, optional): VIN decoder page, e.g. a local copy to benchmark
+                against
+            fast_json (bool, optional): Serialize `data_as_json` and
+                `data_json_to_file` with orjson if it is installed, see `report.dumps`
             **kwargs:
+
+        Raises:
+            InvalidVin: If the VIN is not 17 characters or has characters VINs never have
         """
         self._timeout = timeout
+        self._poll_interval = poll_interval
+        self._network_idle = network_idle
+        self._network_activity = (None, 0)
         self._closed = False
-        self.data_structure = DataStructure.asdict()
-        self.vin_number = vin_number
+        self.report = Report()
+        self._data_structure = None
         # According to: https://en.wikipedia.org/wiki/Vehicle_identification_number
-        assert len(self.vin_number) == 17, "ERROR: VIN Number should be 17 Characters."
+        # Only the form is checked, batches screen check digits before they get here.
+        self.vin_number = validate(vin_number, check=False)
+        self.url = url
+        self.fast_json = fast_json
         self.logger = logger
         self.logger.level(log_level.upper())
         self.proxy = None
         self._page_source = None
+        self._current_url = None
+        self._html = None
+        self._report_parser = None
+        self._owns_driver = True
+        self.driver = None
+        # Seconds spent in each stage of this lookup, see `metrics.Metrics.time`
+        self.timings = {}
         if kwargs.get("host"):
             self.proxy = ProxySettings(**kwargs)
 
-    def _setup_proxy(self):
-        """Simplified Firefox Proxy settings"""
-        firefox_profile = webdriver.FirefoxProfile()
-        # Direct = 0, Manual = 1, PAC = 2, AUTODETECT = 4, SYSTEM = 5
-        firefox_profile.set_preference("network.proxy.type", 1)
-        firefox_profile.set_preference("signon.autologin.proxy", True)
-        firefox_profile.set_preference("network.websocket.enabled", False)
-        firefox_profile.set_preference("network.proxy.http", self.proxy.host)
-        firefox_profile.set_preference("network.proxy.http_port", int(self.proxy.port))
-        firefox_profile.set_preference("network.proxy.ssl", self.proxy.host)
-        firefox_profile.set_preference("network.proxy.ssl_port", int(self.proxy.port))
-        # firefox_profile.set_preference("network.automatic-ntlm-auth.allow-proxies", False)
-        # firefox_profile.set_preference("network.negotiate-auth.allow-proxies", False)
-        firefox_profile.set_preference(
-            "network.proxy.no_proxies_on", "localhost, 127.0.0.1"
-        )
-        # Disable images for website to load quicker
-        firefox_profile.set_preference("permissions.default.image", 2)
-        # Disable Flash for website to load quicker
-        firefox_profile.set_preference(
-            "dom.ipc.plugins.enabled.libflashplayer.so", "false"
-        )
-        if self.proxy.username and self.proxy.password:
-            firefox_profile.set_preference(
-                "network.proxy.socks_username", self.proxy.username
-            )
-            firefox_profile.set_preference(
-                "network.proxy.socks_password", self.proxy.password
-            )
-        # Deprecated
-        # firefox_profile.add_extension('close_proxy_authentication-1.1.xpi')
-        # credentials = f"{self.proxy.username}:{self.proxy.password}"
-        # credentials = b64encode(credentials.encode("ascii")).decode("utf-8")
-        # firefox_profile.set_preference("extensions.closeproxyauth.authtoken", credentials)
-        firefox_profile.update_preferences()
-        return firefox_profile
-
-    def open_site(self, headless=False):
-        """Simple selenium webdriver to open a known url"""
-        options = Options()
-        options.headless = headless
-        profile = None
-        if self.proxy:
-            self.logger.info("Accessing URL using proxy settings: {}", self.proxy)
-            profile = self._setup_proxy()
-
-        self.driver = webdriver.Firefox(
-            options=options, firefox_profile=profile, timeout=self._timeout
+    @staticmethod
+    def new_driver(proxy=None, headless=False, timeout=60, settings=None):
+        """Start a new Firefox webdriver.
+
+        Args:
+            proxy (ProxySettings, optional): Proxy settings to bake into the profile
+            headless (bool, optional): Run browser in headless mode
+            timeout (int, optional): Web time-out
+            settings (FirefoxSettings, optional): Profile and options to start with,
+                defaults to the lean ones
+
+        Returns:
+            webdriver.Firefox: Running browser
+        """
+        from selenium import webdriver
+
+        settings = settings or FirefoxSettings()
+        if proxy:
+            logger.info("Accessing URL using proxy settings: {}", proxy)
+        return webdriver.Firefox(
+            options=settings.options(headless),
+            firefox_profile=settings.profile(proxy),
+            timeout=timeout,
         )
-        url = "https://driving-tests.org/vin-decoder/"
-        self.logger.info("Accessing: {}", url)
-        self.driver.get(url)
-        self.logger.info("Successfully opened: {}", url)
+
+    def attach(self, driver):
+        """Use an already running browser, e.g. one borrowed from a `BrowserPool`.
+
+        The browser is not quit by `close_session`, it belongs to whoever lent it.
+
+        Args:
+            driver (webdriver.Firefox): Running browser
+        """
+        self.driver = driver
+        self._owns_driver = False
+
+    def open_site(self, headless=False, settings=None):
+        """Simple selenium webdriver to open a known url
+
+        Args:
+            headless (bool, optional): Run browser in headless mode
+            settings (FirefoxSettings, optional): Profile and options to start the
+                browser with, defaults to the lean ones
+        """
+        if self.driver is None:
+            with METRICS.time("open_site", self.timings):
+                self.driver = self.new_driver(
+                    self.proxy, headless, self._timeout, settings
+                )
+        self.logger.info("Accessing: {}", self.url)
+        with METRICS.time("get", self.timings):
+            self.driver.get(self.url)
+        self.logger.info("Successfully opened: {}", self.url)
 
     def navigate_site(self):
-        """Navigate through the website"""
-        form_id = "vin_input"
-        # VIN inputform
-        vin_input_form = WebDriverWait(self.driver, self._timeout).until(
-            EC.presence_of_element_located((By.ID, form_id))
+        """Navigate through the website
+
+        Raises:
+            VinNotFound: If the search shows no information for the VIN
+            MissingPageSource: If nothing shows up before the time-out
+        """
+        from selenium.common.exceptions import (
+            StaleElementReferenceException,
+            TimeoutException,
         )
-        vin_input_form = self.driver.find_element_by_id(form_id)
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.common.keys import Keys
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        wait = WebDriverWait(
+            self.driver,
+            self._timeout,
+            poll_frequency=self._poll_interval,
+            ignored_exceptions=(StaleElementReferenceException,),
+        )
+        # VIN inputform
+        vin_input_form = wait.until(EC.element_to_be_clickable((By.ID, "vin_input")))
         vin_input_form.send_keys(self.vin_number)
         # Press Enter key
-        time.sleep(1)  # Wait a second before hitting the Enter
         self.logger.info("Searching for VIN: '{}' information.", self.vin_number)
         vin_input_form.send_keys(Keys.RETURN)
-        retry = 0
-        while True:
-            # Wait until page is loaded!
-            if (
-                WebDriverWait(self.driver, self._timeout)
-                .until(EC.presence_of_element_located((By.XPATH, '//*[@id="nhtsa-26"]')))
-                .text
-                != ""
-            ):
-                self.logger.info("Found VIN information, Scrapping data.")
-                break
-            retry += 1
-            # wait arbitrary 5 seconds for page to load
-            time.sleep(5)
-            if retry >= 10:
-                msg = f"Failed to retrieve VIN number information after {retry} retries."
-                self.close_session()
-                self.logger.error(msg)
-                raise MissingPageSource(msg)
-            self._no_vin_info()
-
-    def _no_vin_info(self):
-        """No data on website checker"""
-        error_text = "we could not find information"
-        if error_text in self.page_source.find(attrs={"class": "error-report"}).text:
-            self.logger.error(self.page_source.find(attrs={"class": "error-report"}).text)
+        self._network_activity = (None, time.monotonic())
+        try:
+            with METRICS.time("navigate", self.timings):
+                outcome = wait.until(self._search_outcome)
+        except TimeoutException:
+            outcome = None
+
+        if outcome == "found":
+            self.logger.info("Found VIN information, Scrapping data.")
+            self.refresh()
+            return
+        if outcome == "no_info":
+            msg = f"Could not find information for vin:{self.vin_number}"
             self.close_session()
+            self.logger.error(msg)
+            raise VinNotFound(msg)
+        if outcome == "network_idle":
+            msg = f"Page settled without information for vin:{self.vin_number}"
+        else:
+            msg = f"Failed to retrieve VIN number information after {self._timeout}s."
+        self.close_session()
+        self.logger.error(msg)
+        raise MissingPageSource(msg)
+
+    def _search_outcome(self, driver):
+        """Wait condition for the search results.
+
+        Returns:
+            str: "found" once `#nhtsa-26` has text, "no_info" once the error report
+                appears, "network_idle" if enabled and the page stopped loading without
+                either, else False to keep waiting
+        """
+        for element in driver.find_elements_by_id("nhtsa-26"):
+            if element.text.strip():
+                return "found"
+        for element in driver.find_elements_by_class_name("error-report"):
+            if "we could not find information" in element.text:
+                self.logger.error(element.text)
+                return "no_info"
+        if self._network_idle and self._is_network_idle(driver):
+            return "network_idle"
+        return False
+
+    def _is_network_idle(self, driver):
+        """True once the page is loaded and has made no new requests for
+        `network_idle` seconds"""
+        ready_state, requests = driver.execute_script(
+            "return [document.readyState, "
+            "window.performance.getEntriesByType('resource').length];"
+        )
+        last_requests, since = self._network_activity
+        now = time.monotonic()
+        if ready_state != "complete" or requests != last_requests:
+            self._network_activity = (requests, now)
+            return False
+        return now - since >= self._network_idle
+
+    def refresh(self):
+        """Re-read the rendered HTML from the browser and parse its report nodes once.
+
+        The parsed nodes are kept as a snapshot which is shared by all the extractors,
+        call this only when the page is known to have changed.
+
+        Returns:
+            ReportParser: Parser of the snapshot
+        """
+        self._html = self.driver.page_source
+        self._current_url = self.driver.current_url
+        self._page_source = None
+        with METRICS.time("parse", self.timings):
+            self._report_parser = ReportParser(
+                self._html, url=self._current_url, report=self.report
+            )
+        return self._report_parser
 
     @property
     def page_source(self):
-        """Get page source as object"""
-        self._page_source = BeautifulSoup(self.driver.page_source, "html.parser")
+        """Get the whole page source snapshot as object, parsed on first access"""
+        if self._html is None:
+            self.refresh()
+        if self._page_source is None:
+            from bs4 import BeautifulSoup
+
+            self._page_source = BeautifulSoup(self._html, HTML_PARSER)
         return self._page_source
 
-    def get_vehicle_details(self):
-        """Get all vehicle details.
+    def save_page_source(self, filename):
+        """Save the page source snapshot, e.g. to re-extract it later with
+        `ReportParser` without a browser.
+
+        Args:
+            filename (str): Filename to save as.
+        """
+        if self._html is None:
+            self.refresh()
+        with open(filename, "w") as html_file:
+            html_file.write(self._html)
+
+    def _report(self, close_session=True):
+        """Parser for the page source snapshot
 
         Raises:
             MissingPageSource: If missing page source, raises error and closes browser
         """
-        if not self.page_source:
+        if self._report_parser is None:
+            self.refresh()
+        # The report is about to change, `data_structure` is rebuilt from it.
+        self._data_structure = None
+        if not self._html:
             msg = f"Missing page source for vin:{self.vin_number}"
             self.logger.error(msg)
-            self.close_session()
+            if close_session:
+                self.close_session()
             raise MissingPageSource(msg)
+        return self._report_parser
+
+    def get_vehicle_details(self):
+        """Get all vehicle details.
+
+        Raises:
+            MissingPageSource: If missing page source, raises error and closes browser
+        """
+        report = self._report()
         try:
             self.logger.info("Scrapping Decoded Details for vin: {}", self.vin_number)
-            table_info = self._page_source.find(
-                "table", attrs={"class": "tableinfo"}
-            ).find("tbody")
-            # Decoded Details
-            for row in table_info.find_all("tr"):
-                for key, value in zip(row.find_all("span"), row.find_all("td")):
-                    self.data_structure["Decoded Details"][
-                        "".join(value.text.split(key.text))
-                    ] = "".join(key.text.split(value.text))
-            table_striped = self._page_source.find(
-                "table", attrs={"class": "table table-striped"}
-            ).find("tbody")
-            for row in table_striped.find_all("tr"):
-                if len((row.text.strip().split("\n"))) == 2:
-                    key, value = row.text.strip().split("\n")
-                    self.data_structure["Decoded Details"][key] = value
+            report.decoded_details()
             self.logger.info(
                 "Updated data structure with table data for vehicle decoded details."
             )
@@ -229,13 +293,7 @@ class VehicleHistoryReports:
             self.logger.info(
                 "Scrapping additional vehicle info for vin: {}", self.vin_number
             )
-            additional_infos = self._page_source.find(attrs={"id": "report_extra"}).find(
-                "tbody"
-            )
-            for row in additional_infos.find_all("tr"):
-                self.data_structure["Additional Vehicle Info"][
-                    "".join(row.td.text.split(row.text))
-                ] = "".join(row.text.split(row.td.text))
+            report.additional_vehicle_info()
             self.logger.info(
                 "Updated data structure with table data for additional vehicle info."
             )
@@ -252,35 +310,17 @@ class VehicleHistoryReports:
         Raises:
             MissingPageSource: If missing page source, raises error and closes browser
         """
-        if not self.page_source:
-            msg = f"Missing page source for vin:{self.vin_number}"
-            self.logger.error(msg)
-            self.close_session()
-            raise MissingPageSource(msg)
+        report = self._report()
 
         if not recent_issues:
             recent_issues = "recalls"
 
         try:
-            table = self._page_source.find(attrs={"id": f"{recent_issues.lower()}"})
-            table_bodies = table.find_all("tbody")
+            self.logger.info("Scrapping table containing all {}", recent_issues)
+            report.recent_issues(recent_issues)
         except Exception as err:
             self.logger.exception("ERROR Occurred: {}", err)
         else:
-            self.logger.info("Scrapping table containing all {}", recent_issues)
-            for count, tbody in enumerate(table_bodies, 1):
-                rows = tbody.find_all("tr")
-                self.data_structure[f"Most Recent {recent_issues.title()}"][
-                    f"{recent_issues.lower()}_{count}"
-                ] = {}
-                for row in rows:
-                    cols = row.find_all("td")
-                    key, value = [
-                        "".join(ele.text.strip("\n").split("\n")) for ele in cols
-                    ]
-                    self.data_structure[f"Most Recent {recent_issues.title()}"][
-                        f"{recent_issues.lower()}_{count}"
-                    ].update({key: value})
             self.logger.info(
                 "Updated data structure with table data for {}", recent_issues
             )
@@ -295,34 +335,44 @@ class VehicleHistoryReports:
 
     def get_image_links(self):
         """Extract image links and update data structure"""
-        if not self.page_source:
-            msg = f"Missing page source for vin:{self.vin_number}"
-            self.logger.error(msg)
-            raise MissingPageSource(msg)
+        report = self._report(close_session=False)
 
         try:
-            link = self.page_source.find("img", attrs={"id": "vehicle_logo"}).get(
-                "src", None
-            )
-            vehicle_logo_url = "".join([self.driver.current_url, link]) if link else ""
-            if vehicle_logo_url:
-                self.logger.info("Found Vehicle Logo URL: {}", vehicle_logo_url)
-            self.data_structure["Images Links"]["vehicle_logo"] = vehicle_logo_url
+            report.image_links()
         except Exception as err:
             self.logger.exception("ERROR Occurred: {}", err)
         else:
-            image_urls_class = self.page_source.find_all(
-                "img", attrs={"class": "slick-slide"}
-            )
-            image_urls = [image_url.get("src", None) for image_url in image_urls_class]
-            self.data_structure["Images Links"]["vehicle_images"] = image_urls
-            if not image_urls:
+            vehicle_logo_url = self.report.images.vehicle_logo
+            if vehicle_logo_url:
+                self.logger.info("Found Vehicle Logo URL: {}", vehicle_logo_url)
+            if not self.report.images.vehicle_images:
                 self.logger.info("Found NO Vehicle image links")
             self.logger.info("Updated data structure with vehicle and logo images.")
 
+    @property
+    def data_structure(self):
+        """Report as vehicle data structure dict.
+
+        The dict is built on first access and kept, changes made to it show up in
+        `data_as_json` and `data_json_to_file`. Extracting a section again rebuilds
+        it from `report`, dropping such changes.
+        """
+        if self._data_structure is None:
+            self._data_structure = self.report.to_dict()
+        return self._data_structure
+
+    @data_structure.setter
+    def data_structure(self, data):
+        self._data_structure = data
+        self.report = Report.from_dict(data)
+        if self._report_parser is not None:
+            self._report_parser.report = self.report
+
     @property
     def data_as_json(self):
         """Output in the form of json file"""
+        if self.fast_json:
+            return dumps(self.data_structure, sort_keys=True)
         return json.dumps(self.data_structure, sort_keys=True)
 
     def data_json_to_file(self, filename="data_structure.json"):
@@ -333,22 +383,79 @@ class VehicleHistoryReports:
         """
         self.logger.info("Writing data to json")
         with open(filename, "w") as json_file:
-            json.dump(self.data_structure, json_file)
+            if self.fast_json:
+                json_file.write(dumps(self.data_structure))
+            else:
+                json.dump(self.data_structure, json_file)
 
     def close_session(self):
         """Close browser and cleanup"""
+        if not self._closed and not self._owns_driver:
+            # Borrowed browser, leave it running for its owner.
+            self._closed = True
         if not self._closed:
             self.logger.info("Closing the browser...")
             self.driver.close()
-            self.driver.quit()
-            time.sleep(1)
-
-            PROCNAME = "geckodriver"
-            self.logger.info("Cleaning up by killing {} process", PROCNAME)
-            _ = [
-                proc.terminate()
-                for proc in psutil.process_iter()
-                if proc.name() == PROCNAME
-            ]
+            self.logger.info("Cleaning up the browser's geckodriver process")
+            quit_driver(self.driver)
             self._closed = True
             self.logger.info("Done...")
+
+
+def quit_driver(driver, timeout=3):
+    """Quit the browser and terminate what is left of its own geckodriver process
+    and children, geckodrivers belonging to other sessions are left alone.
+
+    Args:
+        driver (webdriver.Firefox): Running browser
+        timeout (int, optional): Seconds to wait for the processes to exit
+    """
+    import psutil
+
+    procs = []
+    try:
+        service = psutil.Process(driver.service.process.pid)
+        procs = [service] + service.children(recursive=True)
+    except (AttributeError, psutil.Error):
+        logger.debug("Could not find the geckodriver process of {}", driver)
+    try:
+        driver.quit()
+    finally:
+        _, alive = psutil.wait_procs(procs, timeout=timeout)
+        for proc in alive:
+            logger.info("Terminating left over process {}", proc)
+            try:
+                proc.terminate()
+            except psutil.NoSuchProcess:
+                pass
+
+
+def reap_orphans(procname="geckodriver"):
+    """Terminate orphaned `procname` processes owned by the current user.
+
+    Opt-in cleanup for processes left behind by crashed sessions, i.e. whose parent
+    process is gone. Running sessions are not touched.
+
+    Args:
+        procname (str, optional): Process name to look for
+
+    Returns:
+        list: Terminated processes
+    """
+    import psutil
+
+    username = psutil.Process().username()
+    reaped = []
+    for proc in psutil.process_iter(attrs=["name", "ppid", "username"]):
+        if proc.info["name"] != procname or proc.info["username"] != username:
+            continue
+        if proc.info["ppid"] == 1 or not psutil.pid_exists(proc.info["ppid"]):
+            logger.info("Reaping orphaned {} process {}", procname, proc.pid)
+            try:
+                for child in proc.children(recursive=True):
+                    child.terminate()
+                proc.terminate()
+            except psutil.NoSuchProcess:
+                continue
+            reaped.append(proc)
+    return reaped
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+"""VIN normalization and validation, to reject bad VINs before any lookup."""
+
+import operator
+import re
+
+# Letters I, O and Q are never used, they read too much like 1 and 0.
+VIN_PATTERN = re.compile(r"[A-HJ-NPR-Z0-9]{17}")
+
+# Value of each character and weight of each position for the check digit (ISO 3779,
+# 49 CFR 565).
+VALUES = dict(
+    zip("0123456789", range(10)),
+    **dict(zip("ABCDEFGH", range(1, 9))),
+    **dict(zip("JKLMN", range(1, 6))),
+    P=7,
+    R=9,
+    **dict(zip("STUVWXYZ", range(2, 10))),
+)
+WEIGHTS = (8, 7, 6, 5, 4, 3, 2, 10, 0, 9, 8, 7, 6, 5, 4, 3, 2)
+
+# Weighted value of every character at every position, so that the check sum of a VIN
+# is a plain sum of lookups.
+_PRODUCTS = tuple(
+    {char: value * weight for char, value in VALUES.items()} for weight in WEIGHTS
+)
+
+
+class InvalidVin(ValueError):
+    def __init__(self, vin_number, reason, message):
+        """VIN rejected before looking it up.
+
+        Args:
+            vin_number (str): VIN Number as given
+            reason (str): "length", "characters", "check_digit" or "duplicate"
+            message (str): What is wrong with it
+        """
+        super().__init__(f"Invalid vin:{vin_number}: {message}")
+        self.vin_number = vin_number
+        self.reason = reason
+
+
+def normalize(vin_number):
+    """Upper case VIN without the spaces and dashes it is often written with"""
+    return str(vin_number).strip().replace(" ", "").replace("-", "").upper()
+
+
+def check_digit(vin_number):
+    """Expected check digit, the 9th character, of a normalized 17 character VIN"""
+    remainder = sum(map(operator.getitem, _PRODUCTS, vin_number)) % 11
+    return "X" if remainder == 10 else str(remainder)
+
+
+def wmi(vin_number):
+    """World Manufacturer Identifier, e.g. "JN8" for a Nissan SUV.
+
+    Manufacturers of fewer than 1000 vehicles a year share a WMI ending in "9", told
+    apart by the 12th to 14th characters, which are included for them.
+    """
+    vin_number = normalize(vin_number)
+    if vin_number[2:3] == "9":
+        return vin_number[:3] + vin_number[11:14]
+    return vin_number[:3]
+
+
+def validate(vin_number, check=True):
+    """Normalize a VIN and make sure it is well formed.
+
+    Args:
+        vin_number (str): VIN Number
+        check (bool, optional): Verify the check digit too. It is mandatory in North
+            America, VINs from elsewhere may not have one
+
+    Returns:
+        str: Normalized VIN Number
+
+    Raises:
+        InvalidVin: If it is not 17 characters long, has characters VINs never have
+            or, with `check`, a wrong check digit
+    """
+    normalized = normalize(vin_number)
+    if not VIN_PATTERN.fullmatch(normalized):
+        if len(normalized) != 17:
+            raise InvalidVin(
+                vin_number, "length", f"{len(normalized)} characters instead of 17"
+            )
+        invalid = sorted(set(normalized) - set(VALUES))
+        raise InvalidVin(
+            vin_number, "characters", f"invalid characters {', '.join(invalid)}"
+        )
+    if check:
+        expected = check_digit(normalized)
+        if normalized[8] != expected:
+            raise InvalidVin(
+                vin_number,
+                "check_digit",
+                f"check digit is {normalized[8]}, expected {expected}",
+            )
+    return normalized
+
+
+class VinFilter:
+    def __init__(self, check=True):
+        """Validate a stream of VINs and reject the ones already seen.
+
+        Every distinct VIN is remembered, about 100 bytes each.
+
+        Args:
+            check (bool, optional): Verify check digits, see `validate`
+        """
+        self.check = check
+        self.seen = set()
+
+    def __call__(self, vin_number):
+        """Normalized VIN Number, see `validate`.
+
+        Raises:
+            InvalidVin: If it is invalid or a duplicate of an earlier one
+        """
+        normalized = validate(vin_number, self.check)
+        if normalized in self.seen:
+            raise InvalidVin(vin_number, "duplicate", "repeats an earlier VIN")
+        self.seen.add(normalized)
+        return normalized
+
+
+def screen(vin_numbers, check=True):
+    """Split VINs into the ones to look up and the rejected ones.
+
+    Args:
+        vin_numbers (iterable): VIN Numbers
+        check (bool, optional): Verify check digits, see `validate`
+
+    Returns:
+        tuple: Normalized distinct valid VINs in input order, and the `InvalidVin`
+            error of each rejected one, with its `vin_number` and `reason`
+    """
+    vin_filter = VinFilter(check)
+    valid, rejected = [], []
+    for vin_number in vin_numbers:
+        try:
+            valid.append(vin_filter(vin_number))
+        except InvalidVin as err:
+            rejected.append(err)
+    return valid, rejected
@@ -0,0 +1,459 @@
+# -*- coding: utf-8 -*-
+
+"""Work queue of VINs shared by many worker nodes, kept in SQLite on shared storage."""
+
+import contextlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from vehicle_history_reports.batch import result_status, scrape_vin
+from vehicle_history_reports.log import logger
+from vehicle_history_reports.metrics import METRICS
+from vehicle_history_reports.vin import InvalidVin, screen, validate
+
+# queued: waiting for a worker, leased: a worker is on it, done: result recorded,
+# dead: given up on after too many attempts, invalid, or not found on the site.
+STATES = ("queued", "leased", "done", "dead")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    vin TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    lease_id TEXT,
+    leased_by TEXT,
+    lease_expires REAL,
+    error TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, available_at);
+CREATE TABLE IF NOT EXISTS results (
+    vin TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    worker TEXT NOT NULL,
+    recorded_at REAL NOT NULL
+);
+"""
+
+
+def worker_name():
+    """Name of this worker, unique across nodes"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class Lease:
+    """
+    A job handed out to a worker.
+
+    Attributes:
+        vin_number (str): VIN Number
+        lease_id (str): Identifies this lease, only its holder may fail the job
+        attempts (int): Attempts so far, including this one
+        expires (float): `time.time()` after which other workers may take the job
+    """
+
+    __slots__ = ("vin_number", "lease_id", "attempts", "expires")
+
+    def __init__(self, vin_number, lease_id, attempts, expires):
+        self.vin_number = vin_number
+        self.lease_id = lease_id
+        self.attempts = attempts
+        self.expires = expires
+
+    def __repr__(self):
+        return f"Lease(vin:{self.vin_number}, attempt {self.attempts})"
+
+
+class WorkQueue:
+    def __init__(
+        self,
+        filename,
+        visibility_timeout=600,
+        max_attempts=3,
+        retry_delay=60,
+        timeout=60,
+    ):
+        """Queue of VIN lookups with leases, retries and a dead letter state.
+
+        A worker leases a job for `visibility_timeout` seconds. If it dies, the lease
+        runs out and another worker takes the job over. A failed job is retried
+        after `retry_delay` seconds, doubling with each attempt, and is dead after
+        `max_attempts`. The result of a VIN is recorded once, by the first worker to
+        finish it, in the same transaction that marks the job done.
+
+        Keep the file on storage every worker node can lock, and their clocks in
+        sync: leases expire by wall clock time.
+
+        Args:
+            filename (str): SQLite file, created if it does not exist
+            visibility_timeout (float, optional): Seconds a lease lasts, longer than
+                the slowest lookup
+            max_attempts (int, optional): Attempts before a job is dead
+            retry_delay (float, optional): Seconds before a failed job is retried
+            timeout (float, optional): Seconds to wait for other workers' locks
+        """
+        self.filename = filename
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        # Transactions are begun explicitly, see `_transaction`.
+        self._conn = sqlite3.connect(
+            filename, timeout=timeout, isolation_level=None, check_same_thread=False
+        )
+        with self._lock:
+            self._conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers never read the
+        # same queued job and then both lease it.
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._conn
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def enqueue(self, vin_numbers, check_digit=True):
+        """Add VINs to the queue, skipping invalid ones and ones queued before.
+
+        Args:
+            vin_numbers (iterable): VIN Numbers
+            check_digit (bool, optional): Skip VINs with a wrong check digit too
+
+        Returns:
+            tuple: Number of VINs added, and the `InvalidVin` error of each skipped
+                invalid or repeated one
+        """
+        valid, rejected = screen(vin_numbers, check_digit)
+        now = time.time()
+        with self._lock, self._transaction() as conn:
+            added = conn.executemany(
+                "INSERT OR IGNORE INTO jobs (vin, state, available_at, updated_at) "
+                "VALUES (?, 'queued', ?, ?)",
+                [(vin_number, now, now) for vin_number in valid],
+            ).rowcount
+        logger.info(
+            "Queued {} VINs, {} were queued before, {} rejected",
+            added,
+            len(valid) - added,
+            len(rejected),
+        )
+        return added, rejected
+
+    def lease(self, worker=None, count=1):
+        """Take jobs for a worker: queued ones due for a try, and ones whose lease ran
+        out. A job whose lease ran out on its last attempt is dead instead.
+
+        Args:
+            worker (str, optional): Name of the worker, defaults to `worker_name()`
+            count (int, optional): Jobs to take at most
+
+        Returns:
+            list: `Lease` of each job taken, none if there is nothing to do
+        """
+        worker = worker or worker_name()
+        now = time.time()
+        leases = []
+        with self._lock, self._transaction() as conn:
+            expired = conn.execute(
+                "UPDATE jobs SET state = 'dead', updated_at = ?, "
+                "error = 'Lease ran out on the last attempt' "
+                "WHERE state = 'leased' AND lease_expires <= ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            ).rowcount
+            rows = conn.execute(
+                "SELECT vin, attempts FROM jobs "
+                "WHERE (state = 'queued' AND available_at <= ?) "
+                "OR (state = 'leased' AND lease_expires <= ?) "
+                "ORDER BY available_at LIMIT ?",
+                (now, now, count),
+            ).fetchall()
+            for vin_number, attempts in rows:
+                lease = Lease(
+                    vin_number,
+                    uuid.uuid4().hex,
+                    attempts + 1,
+                    now + self.visibility_timeout,
+                )
+                conn.execute(
+                    "UPDATE jobs SET state = 'leased', attempts = ?, lease_id = ?, "
+                    "leased_by = ?, lease_expires = ?, updated_at = ? WHERE vin = ?",
+                    (
+                        lease.attempts,
+                        lease.lease_id,
+                        worker,
+                        lease.expires,
+                        now,
+                        vin_number,
+                    ),
+                )
+                leases.append(lease)
+        if expired:
+            METRICS.inc("queue_jobs", expired, outcome="dead")
+        return leases
+
+    def complete(self, lease, data, worker=None):
+        """Record the result of a job, unless another worker already did.
+
+        A worker whose lease ran out may still finish first, its result counts then.
+
+        Args:
+            lease (Lease): Lease of the job
+            data (dict): Vehicle data structure
+            worker (str, optional): Name of the worker, defaults to `worker_name()`
+
+        Returns:
+            bool: Whether this result was recorded
+        """
+        now = time.time()
+        with self._lock, self._transaction() as conn:
+            recorded = conn.execute(
+                "INSERT OR IGNORE INTO results VALUES (?, ?, ?, ?)",
+                (lease.vin_number, json.dumps(data), worker or worker_name(), now),
+            ).rowcount
+            if recorded:
+                conn.execute(
+                    "UPDATE jobs SET state = 'done', lease_id = NULL, error = NULL, "
+                    "updated_at = ? WHERE vin = ?",
+                    (now, lease.vin_number),
+                )
+        METRICS.inc("queue_jobs", outcome="done" if recorded else "duplicate")
+        if not recorded:
+            logger.info("vin:{} was already done by another worker", lease.vin_number)
+        return bool(recorded)
+
+    def fail(self, lease, error, retry=True):
+        """Put a failed job back for a later retry, or make it dead.
+
+        Only the current holder of the lease may, a stale failure is ignored.
+
+        Args:
+            lease (Lease): Lease of the job
+            error (str): What went wrong
+            retry (bool, optional): False for errors a retry can not fix
+
+        Returns:
+            str: New state of the job, or None if the lease was no longer held
+        """
+        now = time.time()
+        dead = not retry or lease.attempts >= self.max_attempts
+        state = "dead" if dead else "queued"
+        delay = self.retry_delay * 2 ** (lease.attempts - 1)
+        with self._lock, self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE jobs SET state = ?, available_at = ?, lease_id = NULL, "
+                "error = ?, updated_at = ? "
+                "WHERE vin = ? AND state = 'leased' AND lease_id = ?",
+                (state, now + delay, error, now, lease.vin_number, lease.lease_id),
+            ).rowcount
+        if not updated:
+            logger.info("Lost the lease on vin:{}, not failing it", lease.vin_number)
+            return None
+        METRICS.inc("queue_jobs", outcome="dead" if dead else "retried")
+        return state
+
+    def requeue_dead(self):
+        """Give the dead jobs a fresh set of attempts.
+
+        Returns:
+            int: Number of jobs requeued
+        """
+        now = time.time()
+        with self._lock, self._transaction() as conn:
+            return conn.execute(
+                "UPDATE jobs SET state = 'queued', attempts = 0, available_at = ?, "
+                "updated_at = ? WHERE state = 'dead'",
+                (now, now),
+            ).rowcount
+
+    def counts(self):
+        """Number of jobs in each state
+
+        Returns:
+            dict: Counts keyed by state
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT state, COUNT(*) FROM jobs GROUP BY state"
+            ).fetchall()
+        return dict({state: 0 for state in STATES}, **dict(rows))
+
+    def dead_letters(self):
+        """Dead jobs, with the error of their last attempt
+
+        Returns:
+            list: One dict per job, with keys `vin`, `attempts` and `error`
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT vin, attempts, error FROM jobs WHERE state = 'dead' ORDER BY vin"
+            ).fetchall()
+        return [
+            {"vin": vin_number, "attempts": attempts, "error": error}
+            for vin_number, attempts, error in rows
+        ]
+
+    def results(self, worker=None, since=None):
+        """Recorded results, in the order they were recorded.
+
+        Args:
+            worker (str, optional): Only the ones this worker recorded
+            since (float, optional): Only the ones recorded from this `time.time()` on
+
+        Yields:
+            dict: Result with keys `vin`, `status` ("ok"), `data`, `error` and `worker`
+        """
+        query = "SELECT vin, data, worker FROM results WHERE 1"
+        params = []
+        if worker is not None:
+            query += " AND worker = ?"
+            params.append(worker)
+        if since is not None:
+            query += " AND recorded_at >= ?"
+            params.append(since)
+        with self._lock:
+            rows = self._conn.execute(f"{query} ORDER BY recorded_at", params).fetchall()
+        for vin_number, data, worker in rows:
+            yield {
+                "vin": vin_number,
+                "status": "ok",
+                "data": json.loads(data),
+                "error": None,
+                "worker": worker,
+            }
+
+    def close(self):
+        self._conn.close()
+
+
+def work(
+    work_queue,
+    workers=1,
+    headless=True,
+    max_uses=50,
+    settings=None,
+    cache=None,
+    refresh=False,
+    fetch=None,
+    check_digit=True,
+    wait=False,
+    poll_interval=5,
+    **kwargs,
+):
+    """Look up VINs from a work queue until it is drained, one browser per worker.
+
+    Run this on as many nodes as needed against the same queue file.
+
+    Args:
+        work_queue (WorkQueue): Queue to take jobs from and record results in
+        workers (int, optional): Number of concurrent lookups/browsers
+        headless (bool, optional): Run browsers in headless mode
+        max_uses (int, optional): Restart a browser after this many lookups
+        settings (FirefoxSettings, optional): Profile and options to start the browsers
+            with, defaults to the lean ones
+        cache (ReportCache, optional): Serve VINs from and store them in this cache
+        refresh (bool, optional): Ignore cached data, but still update the cache
+        fetch (FetchBackend, optional): Try plain HTTP lookups first
+        check_digit (bool, optional): Make VINs with a wrong check digit dead
+        wait (bool, optional): Keep waiting for new jobs once the queue is drained
+        poll_interval (float, optional): Seconds between looks at an idle queue
+        **kwargs: Passed on to `scrape_vin`, e.g. `proxy_pool` or `rate_limiter`,
+            and `VehicleHistoryReports`
+
+    Returns:
+        dict: Number of jobs this node finished, keyed by "done", "duplicate",
+            "retried" and "dead"
+    """
+    name = worker_name()
+    tally = {"done": 0, "duplicate": 0, "retried": 0, "dead": 0}
+    tally_lock = threading.Lock()
+    pools = []
+    pool_lock = threading.Lock()
+
+    def browser_pool():
+        with pool_lock:
+            if not pools:
+                from vehicle_history_reports.browser_pool import BrowserPool
+
+                pools.append(
+                    BrowserPool(
+                        size=workers,
+                        headless=headless,
+                        max_uses=max_uses,
+                        settings=settings,
+                    )
+                )
+            return pools[0]
+
+    def failed(lease, error, retry=True):
+        state = work_queue.fail(lease, error, retry)
+        return {"queued": "retried", "dead": "dead"}.get(state)
+
+    def finish(lease):
+        try:
+            vin_number = validate(lease.vin_number, check_digit)
+        except InvalidVin as err:
+            return failed(lease, str(err), retry=False)
+        data = cache.get(vin_number) if cache is not None and not refresh else None
+        if data is None:
+            try:
+                data = scrape_vin(vin_number, pool=browser_pool(), fetch=fetch, **kwargs)
+            except Exception as err:
+                logger.error("Failed to look up vin:{}: {}", vin_number, err)
+                # The site has no information on the VIN, asking again will not help.
+                retry = result_status(err) != "not_found"
+                return failed(lease, str(err) or err.__class__.__name__, retry)
+            if cache is not None:
+                cache.set(vin_number, data)
+        return "done" if work_queue.complete(lease, data, name) else "duplicate"
+
+    def worker():
+        while True:
+            leases = work_queue.lease(name)
+            if not leases:
+                counts = work_queue.counts()
+                if not wait and not counts["queued"] and not counts["leased"]:
+                    return
+                time.sleep(poll_interval)
+                continue
+            try:
+                outcome = finish(leases[0])
+            except Exception as err:
+                # The lease runs out and the job is retried, by this worker or another.
+                logger.error("Failed to finish {}: {}", leases[0], err)
+                time.sleep(poll_interval)
+                continue
+            if outcome is not None:
+                with tally_lock:
+                    tally[outcome] += 1
+
+    logger.info("Worker {} taking jobs from {}", name, work_queue.filename)
+    threads = [
+        threading.Thread(target=worker, name=f"vin-worker-{i}", daemon=True)
+        for i in range(workers)
+    ]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        if pools:
+            pools[0].close()
+    logger.info("Worker {} finished: {}", name, tally)
+    return tally